@@ -1,26 +1,8 @@
-import sys
-import toml
-import json
-import scipy
-import millify
-import gspread
-import requests
-import calendar
-import numpy as np
-import pandas as pd
 import polars as pl
-import datetime as dt
+import plotly.colors
 import streamlit as st
-from pathlib import Path
 from millify import prettify
-import plotly.express as px
-from lxml.html import fromstring
-import plotly.graph_objects as go
-from streamlit_gsheets import GSheetsConnection
-from google.oauth2.service_account import Credentials
-from oauth2client.service_account import ServiceAccountCredentials
-from src import utils, schemas, chart_functions as chart
-from plotly.subplots import make_subplots
+from src import utils, schemas, snapshots, meetup, aggregates, engine, panels, tracing, countries, tenants, chart_functions as chart
 
 
 # command to run: streamlit run Welcome.py
@@ -32,107 +14,200 @@ st.set_page_config(
     initial_sidebar_state="expanded",
 )
 
-row1 = st.columns((2, 4.5, 1.5), gap='medium')
-row2 = st.columns((1,1), gap='medium')
-row3 = st.columns((0.25,0.25,1), gap='large')
+# The year selection only reruns its own fragment, the all-time stats and the map are drawn once per full run
+selection_area, all_time_area = st.columns((6.5, 1.5), gap='medium')
 row4 = st.columns((1))
 
-ENV = toml.load('.streamlit/secrets.toml')
-WORKBOOK = utils.authenticate(
-    ENV['connections']['gsheets'],
-    ENV['scopes']['scope'], 
-    'NLFB'
+ENV = utils.load_config()
+TRACER = tracing.from_config(ENV.get('tracing', {}))
+# The club is picked by ?club=, everything below is read from its view of the secrets
+CLUB = tenants.from_query_params(ENV)
+CLUB_ENV = CLUB.env
+WORKBOOK = CLUB.workbook
+SNAPSHOTS = snapshots.SnapshotStore(
+    CLUB.directory,
+    max_age=CLUB.cache.ttl,
+    incremental={'Main': 'Number'}
 )
-main_df = utils.load_data('Main', schema=schemas.get_main_schema(), workbook=WORKBOOK)
-author_df = utils.load_data('Authors', schema=schemas.get_author_schema(), workbook=WORKBOOK)
-countries_df = utils.load_data('Data', schema=schemas.get_data_schema(), workbook=WORKBOOK)
-
-month_num_from_name_dict = {name:num for num, name in enumerate(calendar.month_name) if num}
-
-main_df = (
-    main_df
-    .with_columns(pl.col('Month').replace_strict(month_num_from_name_dict).alias("Month Num"))
-    .with_columns(pl.date(pl.col('Year'), pl.col('Month Num'), 1).alias("Date"))
-    .filter(pl.col("Score") > 0.0)
-    .filter(~pl.col("Title").is_null())
+TIMEOUTS = CLUB_ENV.get('timeouts', {})
+MAX_SCATTER_POINTS = CLUB_ENV.get('charts', {}).get('max_scatter_points', 5000)
+HEATMAP = {
+    'max_rows': CLUB_ENV.get('charts', {}).get('heatmap_max_topics', 40),
+    'max_columns': CLUB_ENV.get('charts', {}).get('heatmap_max_publishers', 30),
+    'min_count': CLUB_ENV.get('charts', {}).get('heatmap_min_count', 1),
+    'order': CLUB_ENV.get('charts', {}).get('heatmap_order', 'label'),
+}
+ENGINE = engine.get_engine(CLUB_ENV.get('engine', {}))
+dashboard_schemas = {
+    'Main': schemas.get_main_schema(),
+    'Authors': schemas.get_author_schema(),
+}
+resources_schema = {'Resources': schemas.get_resources_schema()}
+
+# Independent fetches run concurrently so the page waits for the slowest one rather than the sum.
+# The Meetup refresher only needs the small Resources sheet, so it starts while the big batch is still loading.
+# Only remote sources are worth snapshotting, local ones are read directly.
+loader = SNAPSHOTS.load_many if WORKBOOK.remote else utils.load_many
+sheets_future = utils.IO_POOL.submit(utils.load_many_cached, WORKBOOK, dashboard_schemas, cache=CLUB.cache, loader=loader)
+resources_future = utils.IO_POOL.submit(utils.load_many_cached, WORKBOOK, resources_schema, cache=CLUB.cache, loader=loader)
+
+with TRACER.span('wait', on='resources'):
+    resources_data = utils.result_or_default(
+        resources_future,
+        TIMEOUTS.get('sheets', 20),
+        lambda: SNAPSHOTS.read_many(resources_schema) or resources_future.result()
+    )['Resources']
+meetup_url = resources_data.filter(pl.col('Resource') == 'Meetup Page')['URL'][0]
+members_refresher = meetup.get_refresher(
+    meetup_url,
+    SNAPSHOTS.directory / 'members.json',
+    timeout=TIMEOUTS.get('meetup', 5)
 )
 
-resources_data = utils.load_data('Resources', schema=schemas.get_resources_schema(), workbook=WORKBOOK)
-meetup_url = resources_data.filter(pl.col('Resource') == 'Meetup Page')['URL'][0]
+with TRACER.span('wait', on='sheets'):
+    sheets = utils.result_or_default(
+        sheets_future,
+        TIMEOUTS.get('sheets', 20),
+        lambda: SNAPSHOTS.read_many(dashboard_schemas) or sheets_future.result()
+    )
+main_df = sheets['Main']
+author_df = sheets['Authors']
 
-text = utils.get_text_from_html_element(meetup_url, "member-count-link")
-members = utils.get_number_of_members(text, 6000)
+main_df = panels.prepare_main(main_df)
+
+with TRACER.span('wait', on='meetup'):
+    members = members_refresher.get(wait=TIMEOUTS.get('meetup', 5))
+year_aggregates = aggregates.get_year_aggregates(main_df, name=CLUB.scoped('Main'))
+if ENGINE is not None:
+    ENGINE.sync({'Main': main_df})
 
 with st.sidebar:
-    st.title("London's Friendly Bookclub")
-    st.write(f"This is a dashboard presenting some data on books chosen to read, and subsquently discussed and scored by London's Friendly Bookclub which has {members} members")
-    year_list = list(main_df['Year'].unique().sort())
-    multi_select_year = st.multiselect('Select Year(s)', year_list, default=year_list)
-    df_selected_year = main_df.filter(pl.col('Year').is_in(multi_select_year))
+    st.title(CLUB.title)
+    st.write(f"This is a dashboard presenting some data on books chosen to read, and subsquently discussed and scored by {CLUB.title} which has {members} members")
     st.link_button(label="Meetup", url=meetup_url)
 
-unpivot_topics_df = (
-    df_selected_year
-    .with_columns(pl.col("Topics").str.split(", "))
-    .explode("Topics")
-    )
 
-with row1[1]:
+@st.fragment
+def selection_panels(main_df, year_aggregates, engine):
+    """Panels that depend on the year selection
 
-    st.markdown('### Analysis 📉')
-    st.markdown('#### Mean Score & Book Count by Publisher 📚')
+    Changing the selection reruns only this function, with the inputs passed on the last full
+    run, so the rest of the page is neither recomputed nor redrawn. Widgets in a fragment can't
+    go in the sidebar, so the year picker sits above the panels.
+    """
+    year_list = year_aggregates.years
+    multi_select_year = st.multiselect('Select Year(s)', year_list, default=year_list, key=CLUB.scoped('years'))
 
-    grouped_selected_year = df_selected_year.group_by('Publisher').agg(pl.col("Score").mean(), pl.col("Title").count())
-    grouped_selected_year = grouped_selected_year.sort(by="Score", descending=True)
+    dashboard = panels.collect_panels(main_df, year_aggregates, multi_select_year, engine=engine, scopes=('selection',))
+    df_selected_year = dashboard['scatter']
 
-    bar = chart.make_bar_group(grouped_selected_year, 'Publisher', 'Score', 'Title', 'Score', 'Book Count')
-    chart.display_plotly(bar)
+    row1 = st.columns((2, 4.5), gap='medium')
+    row2 = st.columns((1,1), gap='medium')
+    row3 = st.columns((0.25,0.25,1), gap='large')
 
-with row2[1]:
-    st.markdown('---')
-    hm_data = (
-        unpivot_topics_df
-        .group_by([pl.col("Publisher"), pl.col("Topics")])
-        .agg(pl.col("Title").count().alias("Count"))
-        .pivot(index='Topics', on='Publisher')
-        .fill_null(0).sort(by="Topics")
-    )
-    st.markdown('#### Heatmap - Publisher & Topics')
-    chart.display_plotly(chart.make_heatmap(hm_data))
+    with row1[1], TRACER.span('panel', panel='publisher_stats'):
 
+        st.markdown('### Analysis 📉')
+        st.markdown('#### Mean Score & Book Count by Publisher 📚')
 
-with row2[0]:
-    st.markdown('---')
-    st.markdown('#### London Bookclub Score vs Goodreads')
-    st.markdown('Scores *above* the "equal score" line indicate Goodreads has scored the book more highly than the bookclub.')
-    scatter2 = chart.make_scatter(df_selected_year, 'Our score conversion', 'Goodreads score', trend=True, tooltip=['Title', 'Author', 'Month', 'Year'])
-    scatter2 = scatter2.add_trace(go.Scatter(x=[0,5], y=[0,5], name="Equal Score", line_shape='linear'))
+        grouped_selected_year = dashboard['publisher_stats']
 
-    chart.display_plotly(scatter2)
-    if not df_selected_year.is_empty():
-        r = round(scipy.stats.pearsonr(df_selected_year['Our score conversion'], df_selected_year['Goodreads score'])[0], 3)
-        msg = utils.describe_pearsons_r(r)
-        st.markdown(f'$r = {r}$ {msg}')
+        bar = chart.cached_figure(chart.make_bar_group, grouped_selected_year, 'Publisher', 'Score', 'Title', 'Score', 'Book Count')
+        chart.display_plotly(bar)
 
-    st.markdown('---')
-    st.markdown('#### Score vs Number of Pages 📃')
-    scatter = chart.make_scatter(df_selected_year, 'Score', 'Pages', trend=True, tooltip=['Title', 'Author', 'Month', 'Year'])
-    chart.display_plotly(scatter)
-
-    if not df_selected_year.is_empty():
-        r = round(scipy.stats.pearsonr(df_selected_year['Score'], df_selected_year['Pages'])[0], 3)
-        msg = utils.describe_pearsons_r(r)
-        st.markdown(f'$r = {r}$ {msg}')
-        st.markdown(
-            '<font size=2> ' +
-            'The Pearson correlation coefficient $r$ measures the linear relationship between two datasets.' + '<br>'
-            'The value of $r$ varies between $-1$ and $+1$ with $0$ implying no correlation',
-            unsafe_allow_html=True
+    with row2[1], TRACER.span('panel', panel='heatmap'):
+        st.markdown('---')
+        hm_data = dashboard['heatmap']
+        st.markdown('#### Heatmap - Publisher & Topics')
+        chart.display_plotly(chart.cached_figure(chart.make_heatmap, hm_data, **HEATMAP))
+
+
+    with row2[0], TRACER.span('panel', panel='scatter'):
+        st.markdown('---')
+        st.markdown('#### London Bookclub Score vs Goodreads')
+        st.markdown('Scores *above* the "equal score" line indicate Goodreads has scored the book more highly than the bookclub.')
+        scatter2 = chart.cached_figure(
+            chart.make_scatter, df_selected_year, 'Our score conversion', 'Goodreads score',
+            trend=dashboard['score_fit'], tooltip=['Title', 'Author', 'Month', 'Year'], reference_line=([0,5], [0,5], "Equal Score"),
+            max_points=MAX_SCATTER_POINTS
+        )
+
+        chart.display_plotly(scatter2)
+        if dashboard['score_fit'].r is not None:
+            r = round(dashboard['score_fit'].r, 3)
+            msg = utils.describe_pearsons_r(r)
+            st.markdown(f'$r = {r}$ {msg}')
+
+        st.markdown('---')
+        st.markdown('#### Score vs Number of Pages 📃')
+        scatter = chart.cached_figure(chart.make_scatter, df_selected_year, 'Score', 'Pages', trend=dashboard['pages_fit'], tooltip=['Title', 'Author', 'Month', 'Year'], max_points=MAX_SCATTER_POINTS)
+        chart.display_plotly(scatter)
+
+        if dashboard['pages_fit'].r is not None:
+            r = round(dashboard['pages_fit'].r, 3)
+            msg = utils.describe_pearsons_r(r)
+            st.markdown(f'$r = {r}$ {msg}')
+            st.markdown(
+                '<font size=2> ' +
+                'The Pearson correlation coefficient $r$ measures the linear relationship between two datasets.' + '<br>'
+                'The value of $r$ varies between $-1$ and $+1$ with $0$ implying no correlation',
+                unsafe_allow_html=True
+            )
+
+    with row1[0], TRACER.span('panel', panel='selected_books'):
+        st.markdown('### Selected Books')
+        st.dataframe(
+            dashboard['selected_books'],
+            height=525,
+            column_config = {
+                'Date': st.column_config.DateColumn(format="YYYY-MM")
+            },
+            hide_index=True,
+            use_container_width=True
         )
 
-with row1[2]:
+    new_new = dashboard['topic_counts']
+
+    # with row2[0]:
+    #     st.markdown('---')
+    #     topics_bar = px.bar(new_new, y="Topics", x="Title", orientation='h') # use colour?
+    #     topics_bar.update_layout(yaxis={"dtick":1},margin={"t":10,"b":100},height=900)
+    #     topics_bar.update_layout(dragmode='pan')
+    #     st.markdown('#### Hot Topics')
+    #     st.plotly_chart(topics_bar, use_container_width=True)
+
+    with row3[0], TRACER.span('panel', panel='gender'):
+        st.markdown('---')
+        st.markdown('#### Author Gender')
+        pie = chart.cached_figure(chart.make_pie, dashboard['gender_counts'], 'Author gender', 'count', plotly.colors.qualitative.Pastel2)
+        chart.display_plotly(pie)
+
+    with row3[1], TRACER.span('panel', panel='debut'):
+
+        st.markdown('---')
+        st.markdown('#### Debut Novel?')
+        debut_pie = chart.cached_figure(chart.make_pie, dashboard['debut_counts'], 'Debut?', 'count', plotly.colors.qualitative.Pastel2[2:])
+        chart.display_plotly(debut_pie)
+
+    with row3[2], TRACER.span('panel', panel='distributions'):
+        st.markdown('---')
+        st.markdown('#### Distributions')
+        histogram_fig = chart.cached_figure(chart.make_histograms, {
+            "Number of Pages Distribution": (*dashboard['pages_histogram'], "Pages"),
+            "Score Distribution": (*dashboard['score_histogram'], "Score"),
+        })
+
+        chart.display_plotly(histogram_fig)
+
+
+with selection_area:
+    selection_panels(main_df, year_aggregates, ENGINE)
+
+with all_time_area, TRACER.span('panel', panel='metrics'):
+    all_time = panels.collect_panels(main_df, year_aggregates, None, engine=ENGINE, scopes=('all_time',))
     st.markdown('#### All-time stats')
-    top_scorer = main_df.select(pl.col("Title"), pl.col('Date'), pl.col("Score"), pl.col('Author')).top_k(2, by='Score')
+    top_scorer = all_time['top_scorers']
+    metrics = all_time['metrics']
     
     st.metric(
         label = f"**Highest Score**  \nTitle: {top_scorer['Title'][0]}  \nBy: {str(top_scorer['Author'][0])}  \nDate read: {top_scorer['Date'][0].strftime('%d-%m-%Y')}",
@@ -142,23 +217,23 @@ with row1[2]:
     
     st.metric(
         label="Total pages read",
-        value=prettify(main_df['Pages'].sum()),
-        delta=main_df.top_k(1, by='Date')['Pages'][0], 
+        value=prettify(metrics['total_pages']),
+        delta=metrics['latest_pages'], 
         # delta_color="inverse"
     )
     st.metric(
         label = "Total books read",
-        value=main_df['Title'].count(),
+        value=metrics['books'],
         delta=None
     )
     st.metric(
         label = "Total Authors",
-        value=main_df['Author'].n_unique(),
+        value=metrics['authors'],
         delta=None
     )
     st.metric(
         label = "Total Publishers",
-        value=main_df['Publisher'].n_unique(),
+        value=metrics['publishers'],
         delta=None
     )
     # st.metric(
@@ -168,63 +243,7 @@ with row1[2]:
     # )
 
 
-with row1[0]:
-    st.markdown('### Selected Books')
-    st.dataframe(
-        df_selected_year.sort("Date", descending=True).select(pl.col("Title"), pl.col('Date'), pl.col("Score")),
-        height=525,
-        column_config = {
-            'Date': st.column_config.DateColumn(format="YYYY-MM")
-        },
-        hide_index=True,
-        use_container_width=True
-    )
-
-new_new = unpivot_topics_df.group_by([pl.col("Topics")]).agg(pl.col("Title").count()).sort(pl.col("Title"), descending=False)
-
-# with row2[0]:
-#     st.markdown('---')
-#     topics_bar = px.bar(new_new, y="Topics", x="Title", orientation='h') # use colour?
-#     topics_bar.update_layout(yaxis={"dtick":1},margin={"t":10,"b":100},height=900)
-#     topics_bar.update_layout(dragmode='pan')
-#     st.markdown('#### Hot Topics')
-#     st.plotly_chart(topics_bar, use_container_width=True)
-
-with row3[0]:
-    st.markdown('---')
-    st.markdown('#### Author Gender')
-    pie = fig = px.pie(df_selected_year, names='Author gender', color_discrete_sequence=px.colors.qualitative.Pastel2)
-    pie.update_layout(margin={"t":0,"b":10}, legend=dict(
-    yanchor="bottom",
-    y=0.8,
-    xanchor="center",
-    x=0.01
-    ))
-    chart.display_plotly(pie)
-
-with row3[1]:
-
-    st.markdown('---')
-    st.markdown('#### Debut Novel?')
-    debut_pie = px.pie(df_selected_year, names='Debut?', color_discrete_sequence=px.colors.qualitative.Pastel2[2:])
-    debut_pie.update_layout(margin={"t":0,"b":10}, legend=dict(
-    yanchor="bottom",
-    y=0.8,
-    xanchor="center",
-    x=0.01
-    ))
-    chart.display_plotly(debut_pie)
-
-with row3[2]:
-    st.markdown('---')
-    st.markdown('#### Distributions')
-    histogram_fig = make_subplots(rows=2, cols=1, subplot_titles=("Number of Pages Distribution", "Score Distribution"))
-    histogram_fig.add_trace(go.Histogram(x=df_selected_year['Pages'], name="Pages"), row=1, col=1)
-    histogram_fig.add_trace(go.Histogram(x=df_selected_year['Score'], name="Score"), row=2, col=1)
-
-    chart.display_plotly(histogram_fig)
-
-with row4[0]:
+with row4[0], TRACER.span('panel', panel='countries'):
     st.markdown('---')
     st.markdown('#### Author Country of Birth')
     # country_group = author_df.group_by('Country of Birth').agg(pl.col("Country of Birth").count().alias('Count'))
@@ -232,16 +251,12 @@ with row4[0]:
     # birth_bar = px.bar(sorted_country_group, y='Country of Birth', x='Count', color_discrete_sequence=px.colors.qualitative.Pastel2[4:], orientation='h')
     # chart.display_plotly(birth_bar)
 
-    map_df = author_df.join(countries_df, left_on='Country of Birth', right_on='column_0', how='left')
-    map_group = map_df.group_by([pl.col('Country of Birth'), pl.col('column_2').alias('Alpha3Code')]).agg(pl.col('Author Name').count().alias('Count'))
-    map_group = map_group.with_columns(
-        pl.col('Count').cast(int)
-    )
+    # Counted once per change of 'Authors', against the bundled country table rather than the 'Data' sheet
+    map_group = countries.get_country_counts(author_df, name=CLUB.scoped('Authors')).frame
+
+    map_fig = chart.cached_figure(chart.make_choropleth, map_group, "Alpha3Code", "Count", "Country of Birth")
 
-    map_fig = px.choropleth(map_group, locations="Alpha3Code",
-                color="Count",
-                hover_name="Country of Birth",
-                color_continuous_scale=px.colors.sequential.Viridis)
-    map_fig.update_layout(margin={"t":0,"b":0})
+    chart.display_plotly(map_fig)
 
-    chart.display_plotly(map_fig)
\ No newline at end of file
+if TRACER.enabled and ENV.get('tracing', {}).get('sidebar', True):
+    tracing.debug_sidebar(TRACER)
@@ -0,0 +1,62 @@
+import sys
+import time
+import statistics
+import polars as pl
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src import utils, schemas, aggregates, panels
+from benchmarks import synthetic
+
+# command to run: python benchmarks/bench_panels.py [rows ...]
+
+
+def eager_panels(main_df: pl.DataFrame, years: list) -> dict:
+    """The per-panel eager polars chains Welcome.py used before the shared lazy plan"""
+    df_selected_year = main_df.filter(pl.col('Year').is_in(years))
+    unpivot_topics_df = df_selected_year.with_columns(pl.col("Topics").str.split(", ")).explode("Topics", empty_as_null=True)
+    return {
+        'publisher_stats': df_selected_year.group_by('Publisher').agg(pl.col("Score").mean(), pl.col("Title").count()).sort(by="Score", descending=True),
+        'heatmap': (
+            unpivot_topics_df.group_by([pl.col("Publisher"), pl.col("Topics")]).agg(pl.col("Title").count().alias("Count"))
+            .pivot(index='Topics', on='Publisher').fill_null(0).sort(by="Topics")
+        ),
+        'topic_counts': unpivot_topics_df.group_by([pl.col("Topics")]).agg(pl.col("Title").count()).sort(pl.col("Title")),
+        'gender_counts': df_selected_year.group_by('Author gender').len(),
+        'debut_counts': df_selected_year.group_by('Debut?').len(),
+        'pages': df_selected_year['Pages'].to_numpy(),
+        'score': df_selected_year['Score'].to_numpy(),
+        'selected_books': df_selected_year.sort("Date", descending=True).select(pl.col("Title"), pl.col('Date'), pl.col("Score")),
+        'top_scorers': main_df.select(pl.col("Title"), pl.col('Date'), pl.col("Score"), pl.col('Author')).top_k(2, by='Score'),
+        'metrics': (main_df['Pages'].sum(), main_df.top_k(1, by='Date')['Pages'][0], main_df['Title'].count(), main_df['Author'].n_unique(), main_df['Publisher'].n_unique()),
+    }
+
+
+def best_of(function, repeat: int = 5) -> tuple[float, float]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings), statistics.median(timings)
+
+
+def main(sizes: list[int]) -> None:
+    for rows in sizes:
+        values = synthetic.to_values(synthetic.main_sheet(rows))
+        main_df = panels.prepare_main(utils.frame_from_values(values, schemas.get_main_schema()))
+        years = main_df['Year'].unique().sort().to_list()
+        selections = {'all years': years, 'half the years': years[::2]}
+        start = time.perf_counter()
+        year_aggregates = aggregates.YearAggregates(main_df)
+        build = time.perf_counter() - start
+        print(f'{rows:>10,} rows  aggregate build {build * 1000:8.1f} ms')
+        for label, selected in selections.items():
+            eager = best_of(lambda: eager_panels(main_df, selected))
+            lazy = best_of(lambda: panels.collect_panels(main_df, year_aggregates, selected))
+            print(f'{"":>16}{label:<16} eager {eager[0] * 1000:8.1f} ms   lazy plan {lazy[0] * 1000:8.1f} ms   ({eager[0] / lazy[0]:.1f}x)')
+
+
+if __name__ == '__main__':
+    main([int(size) for size in sys.argv[1:]] or [1_000, 100_000])
@@ -0,0 +1,121 @@
+import os
+import ast
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks import synthetic
+
+ROOT = Path(__file__).parent.parent
+PAGES = ['Welcome.py', 'pages/Resources.py', 'pages/Suggest 💡.py']
+
+# command to run: python benchmarks/bench_startup.py [--import-budget SECONDS] [--render-budget SECONDS]
+# Exits with status 1 when the median import time of any page or the time to first render is over budget.
+
+IMPORT_SCRIPT = """
+import sys, time
+import streamlit  # already loaded by the server before any page runs
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+{imports}
+print(time.perf_counter() - start)
+"""
+
+RENDER_SCRIPT = """
+import sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+from src import utils
+
+# Offline data comes from the fake Sheets backend configured in the secrets, the Meetup count is fixed
+utils.get_text_from_html_element = lambda *args, **kwargs: '6,000 members'
+
+app = AppTest.from_file({page!r}, default_timeout=120)
+app.run()
+if app.exception:
+    raise SystemExit(app.exception[0].value)
+print(time.perf_counter() - start)
+"""
+
+
+def page_imports(page: str) -> str:
+    """The top-level import statements of a page, i.e. what it costs to start running it"""
+    tree = ast.parse((ROOT / page).read_text(encoding='utf-8'))
+    nodes = [node for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+    return '\n'.join(ast.unparse(node) for node in nodes)
+
+
+def run_python(script: str, env: dict | None = None) -> float:
+    result = subprocess.run([sys.executable, '-c', script], cwd=ROOT, capture_output=True, text=True, env=env)
+    if result.returncode:
+        raise RuntimeError(result.stderr)
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(page: str, top: int = 10) -> list[tuple[str, float]]:
+    script = IMPORT_SCRIPT.format(root=str(ROOT), imports=page_imports(page))
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', script], cwd=ROOT, capture_output=True, text=True)
+    timings = []
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, cumulative, name = line.split('|')
+            if cumulative.strip().isdigit():
+                timings.append((name.strip(), int(cumulative) / 1e6))
+    return sorted(timings, key=lambda timing: timing[1], reverse=True)[:top]
+
+
+def measure_imports(repeat: int) -> dict[str, float]:
+    return {
+        page: statistics.median(run_python(IMPORT_SCRIPT.format(root=str(ROOT), imports=page_imports(page))) for _ in range(repeat))
+        for page in PAGES
+    }
+
+
+def measure_first_render(rows: int, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as directory:
+            synthetic.write_sheets(Path(directory) / 'sheets', rows)
+            secrets = Path(directory) / 'secrets.toml'
+            secrets.write_text(
+                f'[source]\nbackend = "fake"\npath = {json.dumps(str(Path(directory) / "sheets"))}\n'
+                f'[snapshots]\ndirectory = {json.dumps(str(Path(directory) / "snapshots"))}\n'
+            )
+            env = dict(os.environ, NLFB_SECRETS=str(secrets))
+            timings.append(run_python(RENDER_SCRIPT.format(root=str(ROOT), rows=rows, page='Welcome.py'), env=env))
+    return statistics.median(timings)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--import-budget', type=float, default=1.0, help='max median seconds to import any page')
+    parser.add_argument('--render-budget', type=float, default=8.0, help='max median seconds to first render of Welcome.py')
+    parser.add_argument('--rows', type=int, default=1_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    failed = False
+    for page, seconds in measure_imports(args.repeat).items():
+        over = seconds > args.import_budget
+        failed |= over
+        print(f'import   {page:<24} {seconds:6.3f} s  {"OVER BUDGET" if over else "ok"}')
+        if over:
+            for name, cumulative in slowest_imports(page):
+                print(f'           {cumulative:6.3f} s  {name}')
+
+    seconds = measure_first_render(args.rows, args.repeat)
+    over = seconds > args.render_budget
+    failed |= over
+    print(f'render   {"Welcome.py":<24} {seconds:6.3f} s  {"OVER BUDGET" if over else "ok"}')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""Times the ingestion, aggregation and figure hot paths on seeded synthetic sheets and records the results as JSON"""
+import sys
+import json
+import atexit
+import shutil
+import time
+import argparse
+import tempfile
+import platform
+import subprocess
+import datetime as dt
+import polars as pl
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src import utils, schemas, sources, aggregates, engine, panels, countries, chart_functions as chart
+from benchmarks import synthetic
+from benchmarks.bench_panels import best_of
+
+# command to run: python benchmarks/bench_suite.py [--sizes 1000 100000 10000000] [--compare results/previous.json]
+
+RESULTS_DIR = Path(__file__).parent / 'results'
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def cases(rows: int, seed: int, max_grid_rows: int) -> dict:
+    """Name -> zero-argument callable for every hot path, set up for one sheet size"""
+    main_frame = synthetic.main_sheet(rows, seed=seed)
+    author_frame = synthetic.authors_sheet(max(rows // 2, 1), seed=seed)
+    benchmarks = {}
+
+    if rows <= max_grid_rows:
+        # The API hands back a list of lists of strings, so ingestion is timed from that form
+        workbook = synthetic.fake_source({'Main': main_frame, 'Authors': author_frame, 'Data': synthetic.countries_sheet()})
+        values = workbook.sheets['Main']
+        main_schema = schemas.get_main_schema()
+        benchmarks['ingest.pad_data'] = lambda: utils.pad_data(values[1:], len(values[0]))
+        benchmarks['ingest.load_data'] = lambda: utils.load_data('Main', main_schema, workbook)
+        benchmarks['ingest.load_many'] = lambda: utils.load_many(workbook, {
+            'Main': main_schema, 'Authors': schemas.get_author_schema(), 'Data': schemas.get_data_schema(),
+        })
+        main_df = utils.load_data('Main', main_schema, workbook)
+        author_df = utils.load_data('Authors', schemas.get_author_schema(), workbook)
+    else:
+        # Typed the way the loaders type an already tabular sheet
+        main_df = utils.cast_frame(main_frame, schemas.get_main_schema())
+        author_df = utils.cast_frame(author_frame, schemas.get_author_schema())
+    countries_df = synthetic.countries_sheet()
+
+    # The same sheets from the local columnar backends, as typed tables
+    directory = Path(tempfile.mkdtemp(prefix='nlfb-bench-'))
+    atexit.register(shutil.rmtree, directory, True)
+    typed = {'Main': main_df, 'Authors': author_df, 'Data': countries_df}
+    del main_frame, author_frame
+    parquet_source = sources.LocalSource(directory / 'parquet')
+    duckdb_source = sources.DuckDBSource(directory / 'sheets.duckdb')
+    parquet_source.write_frames(typed)
+    duckdb_source.write_frames(typed)
+    dashboard_schemas = {'Main': schemas.get_main_schema(), 'Authors': schemas.get_author_schema(), 'Data': schemas.get_data_schema()}
+    benchmarks['ingest.parquet'] = lambda: utils.load_many(parquet_source, dashboard_schemas)
+    benchmarks['ingest.duckdb'] = lambda: utils.load_many(duckdb_source, dashboard_schemas)
+
+    main_df = panels.prepare_main(main_df)
+    years = main_df['Year'].unique().sort().to_list()
+    year_aggregates = aggregates.YearAggregates(main_df)
+    dashboard = panels.collect_panels(main_df, year_aggregates, years)
+    country_table = countries.get_country_table()
+    map_group = countries.CountryCounts(author_df, country_table).frame
+
+    benchmarks['topics.explode'] = lambda: main_df.select('Publisher', pl.col('Topics').str.split(', ')).explode('Topics', empty_as_null=True)
+    benchmarks['aggregates.build'] = lambda: aggregates.YearAggregates(main_df)
+    benchmarks['topics.filter'] = lambda: year_aggregates.topic_index.rows(['Love', 'Crime'], years[::2])
+    benchmarks['heatmap.sparse'] = lambda: year_aggregates.heatmap(years)
+    benchmarks['heatmap.prune'] = lambda: dashboard['heatmap'].prune(40, 30).similarity_order()
+    benchmarks['panels.collect'] = lambda: panels.collect_panels(main_df, year_aggregates, years)
+    benchmarks['country.counts'] = lambda: countries.CountryCounts(author_df, country_table)
+    benchmarks['country.table'] = lambda: countries.CountryTable()
+    duckdb_engine = engine.DuckDBEngine(directory / 'engine.duckdb')
+    engine_sheets = {'Main': main_df}
+    benchmarks['engine.sync'] = lambda: (duckdb_engine.connection.execute('DELETE FROM sync_state'), duckdb_engine.sync(engine_sheets))
+    benchmarks['engine.panels'] = lambda: panels.collect_panels(main_df, year_aggregates, years, engine=duckdb_engine)
+    benchmarks['figure.scatter'] = lambda: chart.make_scatter(
+        dashboard['scatter'], 'Score', 'Pages', trend=dashboard['pages_fit'], tooltip=['Title', 'Author', 'Month', 'Year'], max_points=5000,
+    )
+    benchmarks['figure.heatmap'] = lambda: chart.make_heatmap(dashboard['heatmap'], max_rows=40, max_columns=30)
+    benchmarks['figure.histograms'] = lambda: chart.make_histograms({
+        'Pages': (*dashboard['pages_histogram'], 'Pages'), 'Score': (*dashboard['score_histogram'], 'Score'),
+    })
+    benchmarks['figure.choropleth'] = lambda: chart.make_choropleth(map_group, 'Alpha3Code', 'Count', 'Country of Birth')
+    return benchmarks
+
+
+def run(sizes: list[int], seed: int, repeat: int, max_grid_rows: int) -> dict:
+    results = []
+    for rows in sizes:
+        start = time.perf_counter()
+        benchmarks = cases(rows, seed, max_grid_rows)
+        print(f'{rows:>12,} rows  setup {time.perf_counter() - start:8.2f} s')
+        for name, function in benchmarks.items():
+            best, median = best_of(function, repeat)
+            results.append({'case': name, 'rows': rows, 'min': best, 'median': median, 'repeat': repeat})
+            print(f'{"":>14}{name:<20} min {best * 1000:10.2f} ms   median {median * 1000:10.2f} ms')
+    return {
+        'meta': {
+            'created_at': dt.datetime.now(dt.timezone.utc).isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'polars': pl.__version__,
+            'machine': platform.machine(),
+            'seed': seed,
+            'max_grid_rows': max_grid_rows,
+        },
+        'results': results,
+    }
+
+
+def compare(current: dict, previous: dict) -> None:
+    """Print the ratio of each case's best time against an earlier run"""
+    before = {(result['case'], result['rows']): result['min'] for result in previous['results']}
+    print(f'compared with {previous["meta"].get("revision")} ({previous["meta"]["created_at"]})')
+    for result in current['results']:
+        old = before.get((result['case'], result['rows']))
+        if old:
+            print(f'{result["rows"]:>12,}  {result["case"]:<20} {result["min"] / old:6.2f}x')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 100_000, 10_000_000])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--max-grid-rows', type=int, default=2_000_000,
+                        help='sizes above this skip the ingestion cases, whose list-of-lists input alone needs several GB')
+    parser.add_argument('--output', type=Path, help='defaults to benchmarks/results/suite-<timestamp>.json')
+    parser.add_argument('--compare', type=Path, help='earlier results file to compare against')
+    args = parser.parse_args()
+
+    current = run(args.sizes, args.seed, args.repeat, args.max_grid_rows)
+    output = args.output or RESULTS_DIR / f'suite-{dt.datetime.now():%Y%m%d-%H%M%S}.json'
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(current, indent=2))
+    print(f'results written to {output}')
+    if args.compare:
+        compare(current, json.loads(args.compare.read_text()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+import sys
+import calendar
+import argparse
+import numpy as np
+import polars as pl
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src import sources
+
+# Seeded generator for sheet-shaped test data, in the same string form the Sheets API returns
+
+TOPICS = [
+    'Crime', 'Love', 'War', 'Family', 'Identity', 'Climate', 'Race', 'Class', 'Grief', 'Science fiction',
+    'History', 'Politics', 'Religion', 'Migration', 'Friendship', 'Coming of age', 'Technology', 'Art',
+]
+GENDERS = ['Female', 'Male', 'Non-binary']
+
+
+def main_sheet(rows: int, seed: int = 0, publishers: int = 40, start_year: int = 2015, chunk_size: int = 1_000_000) -> pl.DataFrame:
+    """A 'Main' sheet of `rows` books as string columns, with roughly one book per month per club
+
+    Rows are generated in chunks with numeric numpy arrays and turned into strings by polars, so
+    10M-row sheets fit in a few GB of memory.
+    """
+    rng = np.random.default_rng(seed)
+    chunks = [
+        main_chunk(rng, first, min(first + chunk_size, rows), rows, publishers, start_year)
+        for first in range(0, rows, chunk_size)
+    ]
+    return pl.concat(chunks, rechunk=False) if chunks else main_chunk(rng, 0, 0, 0, publishers, start_year)
+
+
+def main_chunk(rng: np.random.Generator, first: int, stop: int, rows: int, publishers: int, start_year: int) -> pl.DataFrame:
+    size = stop - first
+    number = np.arange(first + 1, stop + 1)
+    years = start_year + (number - 1) * 10 // max(rows, 1)
+    score = np.round(rng.uniform(3, 9.5, size), 1)
+    goodreads = np.round(np.clip(score / 2 + rng.normal(0, 0.4, size), 1, 5), 2)
+    topic_count = rng.integers(1, 4, size)
+    topic_ids = rng.integers(0, len(TOPICS), (size, 3))
+    topic_names = pl.Series(TOPICS)
+    month_names = pl.Series(calendar.month_name[1:])
+
+    def topic(position: int) -> pl.Expr:
+        ids = topic_ids[:, position]
+        # Each topic appears once per book, as in the real sheet
+        repeated = (ids == topic_ids[:, 0]) if position else np.zeros(size, dtype=bool)
+        if position == 2:
+            repeated |= ids == topic_ids[:, 1]
+        keep = (topic_count > position) & ~repeated
+        return pl.when(pl.Series(keep)).then(pl.lit(topic_names.gather(ids)))
+
+    frame = pl.DataFrame({
+        'number': number,
+        'isbn': 9780000000000 + rng.integers(0, 10**9, size),
+        'year': years,
+        'score': score,
+        'author': rng.integers(0, max(rows // 2, 1), size),
+        'publisher': rng.integers(0, publishers, size),
+        'pages': rng.integers(120, 900, size),
+        'gender': rng.integers(0, len(GENDERS), size),
+        'pub_year': years - rng.integers(0, 3, size),
+        'goodreads': goodreads,
+        'debut': rng.random(size) < 0.3,
+        'translated': rng.random(size) < 0.2,
+    })
+    yes_no = lambda column: pl.when(pl.col(column)).then(pl.lit('Yes')).otherwise(pl.lit('No'))
+    return frame.select(
+        pl.col('number').cast(pl.String).alias('Number'),
+        pl.col('isbn').cast(pl.String).alias('ISBN'),
+        pl.lit(month_names.gather((number - 1) % 12)).alias('Month'),
+        pl.col('year').cast(pl.String).alias('Year'),
+        pl.format('Title {}', 'number').alias('Title'),
+        pl.col('score').cast(pl.String).alias('Score'),
+        pl.format('Author {}', 'author').alias('Author'),
+        pl.format('Publisher {}', 'publisher').alias('Publisher'),
+        pl.col('pages').cast(pl.String).alias('Pages'),
+        pl.lit(pl.Series(GENDERS).gather(frame['gender'])).alias('Author gender'),
+        pl.col('pub_year').cast(pl.String).alias('Pub year'),
+        pl.col('goodreads').cast(pl.String).alias('Goodreads score'),
+        (pl.col('score') / 2).round(2).cast(pl.String).alias('Our score conversion'),
+        (pl.col('goodreads') - pl.col('score') / 2).round(2).cast(pl.String).alias('variance'),
+        yes_no('debut').alias('Debut?'),
+        yes_no('translated').alias('Translated?'),
+        pl.concat_str(topic(0), topic(1), topic(2), separator=', ', ignore_nulls=True).alias('Topics'),
+    )
+
+
+def to_values(frame: pl.DataFrame) -> list[list]:
+    """Header + rows grid, as returned by `Worksheet.get` or a batched values request"""
+    return [frame.columns] + [list(row) for row in frame.iter_rows()]
+
+
+COUNTRIES = [
+    ('United Kingdom', 'GB', 'GBR'), ('United States', 'US', 'USA'), ('France', 'FR', 'FRA'), ('Nigeria', 'NG', 'NGA'),
+    ('Japan', 'JP', 'JPN'), ('India', 'IN', 'IND'), ('Ireland', 'IE', 'IRL'), ('Canada', 'CA', 'CAN'),
+    ('South Korea', 'KR', 'KOR'), ('Argentina', 'AR', 'ARG'), ('Norway', 'NO', 'NOR'), ('Egypt', 'EG', 'EGY'),
+]
+
+
+def authors_sheet(rows: int = 200, seed: int = 0) -> pl.DataFrame:
+    """An 'Authors' sheet whose names match the authors generated by `main_sheet`"""
+    rng = np.random.default_rng(seed)
+    countries = pl.Series([country for country, _, _ in COUNTRIES])
+    birth = rng.integers(1900, 2000, rows)
+    frame = pl.DataFrame({
+        'number': np.arange(rows),
+        'birth': birth,
+        'dead': rng.random(rows) < 0.2,
+        'books': rng.integers(0, 10, rows),
+        'title': rng.integers(1, rows + 1, rows),
+    })
+    return frame.select(
+        pl.lit('Author').alias('Forename'),
+        pl.col('number').cast(pl.String).alias('Surname'),
+        pl.format('Author {}', 'number').alias('Author Name'),
+        pl.lit(pl.Series(GENDERS).gather(rng.integers(0, len(GENDERS), rows))).alias('Gender'),
+        pl.lit(countries.gather(rng.integers(0, len(countries), rows))).alias('Country of Birth'),
+        pl.col('birth').cast(pl.String).alias('Year of Birth'),
+        pl.when(pl.col('dead')).then((pl.col('birth') + 70).cast(pl.String)).otherwise(pl.lit('')).alias('Year of death'),
+        pl.col('books').cast(pl.String).alias('Books since last bookclub pick'),
+        pl.format('Title {}', 'title').alias('Book title'),
+    )
+
+
+def countries_sheet() -> pl.DataFrame:
+    """The 'Data' sheet: country name, alpha-2 and alpha-3 codes in untyped columns"""
+    return pl.DataFrame({
+        'column_0': [country for country, _, _ in COUNTRIES],
+        'column_1': [alpha2 for _, alpha2, _ in COUNTRIES],
+        'column_2': [alpha3 for _, _, alpha3 in COUNTRIES],
+        **{f'column_{index}': [''] * len(COUNTRIES) for index in range(3, 7)},
+    })
+
+
+def resources_sheet() -> pl.DataFrame:
+    return pl.DataFrame({
+        'Resource': ['Meetup Page'],
+        'Description': ['Our Meetup group'],
+        'URL': ['https://www.meetup.com/example-bookclub/'],
+    })
+
+
+def workbook_sheets(rows: int, seed: int = 0) -> dict[str, pl.DataFrame]:
+    """Every sheet the app reads, with 'Main' at `rows` books"""
+    return {
+        'Main': main_sheet(rows, seed=seed),
+        'Authors': authors_sheet(max(rows // 2, 1), seed=seed),
+        'Data': countries_sheet(),
+        'Resources': resources_sheet(),
+    }
+
+
+def fake_source(sheets: dict[str, pl.DataFrame], **kwargs) -> sources.FakeSheetsSource:
+    """An offline Sheets stand-in serving the generated sheets; kwargs set its latency and quota"""
+    return sources.FakeSheetsSource({name: to_values(frame) for name, frame in sheets.items()}, workbook_id='synthetic', **kwargs)
+
+
+def write_sheets(directory: str | Path, rows: int, seed: int = 0, file_format: str = 'parquet') -> None:
+    """Write a synthetic workbook as the sheet files read by the local and fake backends"""
+    sources.LocalSource(directory, file_format).write_frames(workbook_sheets(rows, seed))
+
+
+if __name__ == '__main__':
+    # Writes a synthetic workbook for the offline backends, e.g. [source] backend = "fake", path = ".offline"
+    parser = argparse.ArgumentParser(description='Write synthetic sheets as Parquet or CSV files')
+    parser.add_argument('directory', type=Path)
+    parser.add_argument('--rows', type=int, default=1_000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--format', choices=('parquet', 'csv'), default='parquet')
+    args = parser.parse_args()
+    write_sheets(args.directory, args.rows, args.seed, args.format)
@@ -0,0 +1,49 @@
+"""Precompute the dashboard into a static HTML/JSON bundle for a CDN, rewriting only what changed since the last export"""
+import sys
+import argparse
+import polars as pl
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from src import utils, schemas, snapshots, meetup, panels, tenants, static_export
+
+# command to run: python export_static.py --out site [--club nlfb] [--combinations --max-views 256]
+# Serve manifest.json with a short cache lifetime; every other file is requested with its digest and can be cached for long
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--out', type=Path, required=True, help='bundle directory, updated in place')
+    parser.add_argument('--club', help='club from the [clubs] section of the secrets, the default club if omitted')
+    parser.add_argument('--combinations', action='store_true', help='also export smaller year selections, fewest years first')
+    parser.add_argument('--max-views', type=int, default=256, help='most year selections to export, the all-years view included')
+    args = parser.parse_args()
+
+    env = utils.load_config()
+    club = tenants.get_tenant(env, args.club)
+    workbook = club.workbook
+    store = snapshots.SnapshotStore(club.directory, max_age=club.cache.ttl, incremental={'Main': 'Number'})
+    loader = store.load_many if workbook.remote else utils.load_many
+    sheets = loader(workbook, {
+        'Main': schemas.get_main_schema(),
+        'Authors': schemas.get_author_schema(),
+        'Resources': schemas.get_resources_schema(),
+    })
+
+    timeout = club.env.get('timeouts', {}).get('meetup', 5)
+    meetup_url = sheets['Resources'].filter(pl.col('Resource') == 'Meetup Page')['URL'][0]
+    members = meetup.get_refresher(meetup_url, club.directory / 'members.json', timeout=timeout).get(wait=timeout)
+
+    result = static_export.export_bundle(
+        args.out, panels.prepare_main(sheets['Main']), sheets['Authors'], title=club.title, charts=club.env.get('charts', {}),
+        combinations=args.combinations, max_views=args.max_views, members=members, meetup_url=meetup_url,
+    )
+    print(f'{args.out}: {len(result.written)} files written, {result.unchanged} views unchanged, {len(result.removed)} removed')
+    for path in result.written + result.removed:
+        print(f'  {path}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
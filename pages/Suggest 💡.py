@@ -1,22 +1,7 @@
-import toml
-import time
-import json
-import millify
-import gspread
-import requests
-import calendar
-import numpy as np
-import pandas as pd
-import polars as pl
 import datetime as dt
 import streamlit as st
-from millify import prettify
-from lxml.html import fromstring
-from streamlit_gsheets import GSheetsConnection
-from google.oauth2.service_account import Credentials
-from oauth2client.service_account import ServiceAccountCredentials
 
-from src import utils
+from src import utils, suggestions, tracing, tenants
 
 st.set_page_config(
     page_title="Suggest a book",
@@ -25,21 +10,24 @@ st.set_page_config(
     initial_sidebar_state="expanded",
 )
 
-ENV = toml.load('.streamlit/secrets.toml')
-WORKBOOK = utils.authenticate(
-    ENV['connections']['gsheets'],
-    ENV['scopes']['scope'], 
-    'NLFB'
+ENV = utils.load_config()
+tracing.from_config(ENV.get('tracing', {}))
+CLUB = tenants.from_query_params(ENV)
+WORKBOOK = CLUB.workbook
+SPOOL = suggestions.get_spool(
+    CLUB.directory / 'suggestions.sqlite3',
+    WORKBOOK,
+    cache=CLUB.cache,
 )
 
 def add_suggestion(data):
-    sh = WORKBOOK.worksheet('Suggestions') 
-    sh.append_row(data)
+    # Queued durably and sent to the sheet in the background, so the form returns straight away
+    SPOOL.enqueue(data, suggestions.submission_key(data[:5] + data[6:]))
 
 with st.sidebar:
-    st.title("London's Friendly Bookclub")
+    st.title(CLUB.title)
     st.subheader("Suggest a title!")
-    st.write("Use this form to suggest a future booklub pick for London's Friendly Bookclub.")
+    st.write(f"Use this form to suggest a future booklub pick for {CLUB.title}.")
     st.write("Please keep in mind, that although any book is considered, we tend towards choosing books published in the last 2 or 3 years and typically around 300-400 pages.")
 
 page_columns = st.columns((5,3), gap='medium')
@@ -90,9 +78,7 @@ with page_columns[0]:
                     user_email
                 ]
                 add_suggestion(data)
-                st.write("Thank you for your suggestion of: " + book_title + " for the bookclub pick")
-                time.sleep(2)
-                st.switch_page('Welcome.py')
+                st.success("Thank you for your suggestion of: " + book_title + " for the bookclub pick")
         
         
 
@@ -0,0 +1,124 @@
+import numpy as np
+import polars as pl
+from . import utils, tracing
+from .registry import Registry
+from .topic_index import TopicIndex
+from .heatmap import SparseCounts
+
+
+def frame_fingerprint(df: pl.DataFrame) -> tuple:
+    """Cheap content key for a frame, used to decide when precomputed data is stale"""
+    return (df.height, tuple(df.columns), int(df.hash_rows(seed=0).sum()) if df.height else 0)
+
+
+class YearAggregates:
+    """Additive per-year partial aggregates of the 'Main' sheet
+
+    Every statistic the dashboard shows for a year selection is stored as sums and counts per
+    `Year`, so a selection is answered by filtering the partials to the chosen years and summing
+    them, without touching the book-level rows again. Topics are kept in a TopicIndex.
+    """
+
+    def __init__(self, main_df: pl.DataFrame, histogram_columns: tuple = ('Pages', 'Score'), bins: int | str = 'auto',
+                 correlation_pairs: tuple = (('Our score conversion', 'Goodreads score'), ('Score', 'Pages'))):
+        self.fingerprint = frame_fingerprint(main_df)
+        self.years = main_df['Year'].unique().sort().to_list()
+
+        self.publisher = main_df.group_by('Year', 'Publisher').agg(
+            pl.col('Score').sum().alias('score_sum'),
+            (pl.col('Score') ** 2).sum().alias('score_sq_sum'),
+            pl.col('Score').count().alias('score_count'),
+            pl.col('Title').count().alias('book_count'),
+        )
+        self.topic_index = TopicIndex(main_df)
+        self.category_counts = {
+            column: main_df.group_by('Year', column).agg(pl.len().alias('count'))
+            for column in ('Author gender', 'Debut?')
+        }
+
+        self.correlations = {
+            (x_col, y_col): utils.pair_accumulators(main_df, x_col, y_col)
+            for x_col, y_col in correlation_pairs
+        }
+
+        self.histograms = {}
+        for column in histogram_columns:
+            binned = main_df.select('Year', column).drop_nulls()
+            values = binned[column].to_numpy()
+            edges = np.histogram_bin_edges(values, bins=bins) if len(values) else np.array([0.0, 1.0])
+            # Same bin assignment as np.histogram: half-open bins, with the last bin closed on the right
+            bin_index = np.clip(np.searchsorted(edges, values, side='right') - 1, 0, len(edges) - 2)
+            counts = (
+                binned.select('Year', pl.Series('bin', bin_index, dtype=pl.Int64))
+                .group_by('Year', 'bin').agg(pl.len().alias('count'))
+            )
+            self.histograms[column] = (edges, counts)
+
+    def select(self, frame: pl.DataFrame, years: list) -> pl.LazyFrame:
+        return frame.lazy().filter(pl.col('Year').is_in(years))
+
+    def publisher_stats_plan(self, years: list) -> pl.LazyFrame:
+        return (
+            self.select(self.publisher, years)
+            .group_by('Publisher')
+            .agg(pl.col('score_sum', 'score_sq_sum', 'score_count', 'book_count').sum())
+            .with_columns(
+                (pl.col('score_sum') / pl.col('score_count')).alias('Score'),
+                ((pl.col('score_sq_sum') - pl.col('score_sum') ** 2 / pl.col('score_count')) / (pl.col('score_count') - 1))
+                .sqrt().alias('Score std'),
+            )
+            .select('Publisher', 'Score', 'Score std', pl.col('book_count').alias('Title'))
+            .sort(by=['Score', 'Publisher'], descending=[True, False])
+        )
+
+    def publisher_stats(self, years: list) -> pl.DataFrame:
+        """Mean score, score standard deviation and book count per publisher"""
+        return self.publisher_stats_plan(years).collect()
+
+    def topic_publisher_counts(self, years: list) -> pl.DataFrame:
+        return self.topic_index.topic_publisher_counts(years)
+
+    def topic_counts(self, years: list) -> pl.DataFrame:
+        return self.topic_index.topic_counts(years)
+
+    def heatmap(self, years: list) -> SparseCounts:
+        return SparseCounts.from_long(self.topic_publisher_counts(years))
+
+    def counts_plan(self, column: str, years: list) -> pl.LazyFrame:
+        return (
+            self.select(self.category_counts[column], years)
+            .drop_nulls(column)
+            .group_by(column).agg(pl.col('count').sum())
+            .sort(column)
+        )
+
+    def counts(self, column: str, years: list) -> pl.DataFrame:
+        return self.counts_plan(column, years).collect()
+
+    def fit_plan(self, x_col: str, y_col: str, years: list) -> pl.LazyFrame:
+        return utils.merge_accumulators(self.correlations[(x_col, y_col)].lazy(), years)
+
+    def fit(self, x_col: str, y_col: str, years: list) -> utils.LinearFit:
+        """Least-squares line and Pearson r of two columns over the selected years"""
+        return utils.fit_from_accumulators(self.fit_plan(x_col, y_col, years).collect().row(0, named=True))
+
+    def histogram_plan(self, column: str, years: list) -> pl.LazyFrame:
+        return self.select(self.histograms[column][1], years).group_by('bin').agg(pl.col('count').sum())
+
+    def histogram_from_counts(self, column: str, bin_counts: pl.DataFrame) -> tuple[np.ndarray, np.ndarray]:
+        edges = self.histograms[column][0]
+        total = np.zeros(len(edges) - 1, dtype=np.int64)
+        total[bin_counts['bin'].to_numpy()] = bin_counts['count'].to_numpy()
+        return edges, total
+
+    def histogram(self, column: str, years: list) -> tuple[np.ndarray, np.ndarray]:
+        return self.histogram_from_counts(column, self.histogram_plan(column, years).collect())
+
+
+AGGREGATES = Registry()
+
+@tracing.traced()
+def get_year_aggregates(main_df: pl.DataFrame, name: str = 'Main') -> YearAggregates:
+    """Aggregates for `main_df`, rebuilt only when its contents change"""
+    fingerprint = frame_fingerprint(main_df)
+    return AGGREGATES.get(name, lambda: YearAggregates(main_df), stale=lambda aggregates: aggregates.fingerprint != fingerprint)
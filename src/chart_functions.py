@@ -1,9 +1,113 @@
-import plotly.express as px
+import sys
+import hashlib
+import threading
+import numpy as np
+import polars as pl
+import plotly.colors
 import plotly.graph_objects as go
 from typing import Callable
+from collections import OrderedDict
+from plotly.subplots import make_subplots
 import streamlit as st
+from . import utils, tracing
 
+def content_hash(value) -> str:
+    """Stable hash of a chart input: frames and arrays by content, everything else by repr"""
+    digest = hashlib.sha1()
+    if isinstance(value, pl.DataFrame):
+        digest.update(repr(value.schema).encode())
+        digest.update(value.hash_rows(seed=0).to_numpy().tobytes() if value.height else b'')
+    elif isinstance(value, pl.Series):
+        digest.update(repr((value.name, value.dtype)).encode())
+        digest.update(value.hash(seed=0).to_numpy().tobytes())
+    elif isinstance(value, np.ndarray):
+        digest.update(repr((value.dtype, value.shape)).encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            digest.update(content_hash(item).encode())
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            digest.update(repr(key).encode())
+            digest.update(content_hash(item).encode())
+    else:
+        digest.update(repr(value).encode())
+    return digest.hexdigest()
+
+def estimated_size(value) -> int:
+    """Rough size in bytes of a chart input, used to bound the figure cache without encoding figures"""
+    if isinstance(value, (pl.DataFrame, pl.Series)):
+        return value.estimated_size()
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(estimated_size(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(estimated_size(item) for item in value)
+    return sys.getsizeof(value)
+
+class FigureCache:
+    """LRU cache of built figures, bounded by the estimated size of the inputs they were drawn from
+
+    Figures are kept as objects; st.plotly_chart encodes its own JSON, so none is stored here.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key: tuple, builder: Callable[[], go.Figure], size: int = 0) -> go.Figure:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+        figure = builder()
+        figure.update_layout(dragmode='pan')
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = (figure, size)
+                self.total_bytes += size
+            while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+        return figure
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            requests_made = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / requests_made if requests_made else 0.0,
+                'entries': len(self._entries),
+                'bytes': self.total_bytes,
+            }
+
+FIGURE_CACHE = FigureCache()
+tracing.TRACER.register('cache', {'cache': 'figures'}, FIGURE_CACHE.stats)
+
+def figure_key(builder: Callable, args: tuple, kwargs: dict) -> tuple:
+    return (builder.__name__, content_hash(args), content_hash(sorted(kwargs.items())))
+
+def cached_figure(builder: Callable, *args, cache: FigureCache = FIGURE_CACHE, **kwargs) -> go.Figure:
+    """Build a figure through `builder`, reusing the cached one when the inputs have the same content"""
+    return cache.get_or_build(figure_key(builder, args, kwargs), lambda: builder(*args, **kwargs), estimated_size((args, kwargs)))
+
+@tracing.traced()
 def make_bar(input_df, x_col, y_col, colour_col=None):
+    import plotly.express as px
+
     bar = px.bar(input_df, x=x_col, y=y_col, color=colour_col)
     bar.update_layout(
         template='plotly_dark',
@@ -14,12 +118,59 @@ def make_bar(input_df, x_col, y_col, colour_col=None):
     )
     return bar
 
-def make_scatter(input_df, x_col, y_col, tooltip=None, colour_col=None, trend=False):
+WEBGL_THRESHOLD = 1000
 
-    if trend:
-        scatter = px.scatter(input_df, x=x_col, y=y_col, trendline="ols", hover_data=tooltip)
-    else:
-        scatter = px.scatter(input_df, x=x_col, y=y_col, hover_data=tooltip)
+def downsample_points(input_df: pl.DataFrame, x_col: str, y_col: str, max_points: int, grid: int = 64, seed: int = 0) -> pl.DataFrame:
+    """Stratified sample of at most about `max_points` rows that keeps the shape of the point cloud
+
+    Points are bucketed on a grid x grid lattice and every occupied cell keeps the same fraction
+    of its points, rounded up, so dense regions stay dense and isolated points are never dropped.
+    """
+    if input_df.height <= max_points:
+        return input_df
+    fraction = max_points / input_df.height
+
+    def cell(col):
+        low, high = pl.col(col).min(), pl.col(col).max()
+        return ((pl.col(col) - low) / (high - low) * (grid - 1)).fill_nan(0).floor().cast(pl.Int64)
+
+    return (
+        input_df
+        .drop_nulls([x_col, y_col])
+        .with_columns((cell(x_col) * grid + cell(y_col)).alias('_cell'))
+        .filter(
+            pl.int_range(pl.len()).shuffle(seed=seed).over('_cell')
+            < (pl.len().over('_cell') * fraction).ceil()
+        )
+        .drop('_cell')
+    )
+
+def make_trendline(fit, x_range, name='OLS trendline'):
+    """Straight line trace for a fitted slope and intercept across `x_range`"""
+    x = np.asarray(x_range, dtype=float)
+    return go.Scatter(
+        x=x, y=fit.intercept + fit.slope * x, mode='lines', name=name,
+        hovertemplate=f'y = {fit.slope:.4g}x + {fit.intercept:.4g}<br>n = {fit.n}<extra></extra>',
+    )
+
+@tracing.traced()
+def make_scatter(input_df, x_col, y_col, tooltip=None, colour_col=None, trend=False, reference_line=None, max_points=None):
+    """Scatter plot; `trend` is True to fit a least-squares line to the plotted data, or a precomputed utils.LinearFit"""
+    import plotly.express as px
+
+    if trend is True:
+        trend = utils.fit_line(input_df, x_col, y_col)
+    x_range = (input_df[x_col].min(), input_df[x_col].max()) if len(input_df) else None
+
+    if max_points is not None:
+        input_df = downsample_points(input_df, x_col, y_col, max_points)
+    render_mode = 'webgl' if len(input_df) > WEBGL_THRESHOLD else 'svg'
+    scatter = px.scatter(input_df, x=x_col, y=y_col, hover_data=tooltip, render_mode=render_mode)
+    if trend and trend.slope is not None and x_range is not None:
+        scatter.add_trace(make_trendline(trend, x_range))
+    if reference_line:
+        x, y, name = reference_line
+        scatter.add_trace(go.Scatter(x=x, y=y, name=name, line_shape='linear'))
     scatter.update_layout(
         template='plotly_dark',
         plot_bgcolor='rgba(0, 0, 0, 0)',
@@ -29,10 +180,11 @@ def make_scatter(input_df, x_col, y_col, tooltip=None, colour_col=None, trend=Fa
     )
     return scatter
 
+@tracing.traced()
 def make_bar_group(df, x_col, y_col_1, y_col_2, y1_title, y2_title):
     figure = go.Figure(data=[
         go.Bar(name='Score', x=df[x_col], y=df[y_col_1], yaxis='y1', offsetgroup=1, marker=dict(color="#FF4B4B")),
-        go.Bar(name='Book Count', x=df[x_col], y=df[y_col_2], yaxis='y2', offsetgroup=2, marker=dict(color=px.colors.qualitative.Pastel1[4]))
+        go.Bar(name='Book Count', x=df[x_col], y=df[y_col_2], yaxis='y2', offsetgroup=2, marker=dict(color=plotly.colors.qualitative.Pastel1[4]))
     ],
     layout={
             'yaxis': {'title': y1_title},
@@ -41,24 +193,84 @@ def make_bar_group(df, x_col, y_col_1, y_col_2, y1_title, y2_title):
     )
     return figure
 
-def make_heatmap(data):
-    heatmap = px.imshow(data,
-            labels=dict(x="Topic", y="Publisher", color="Count"),
-            y=data['Topics'],
-            x=data.columns,
-            # color_continuous_scale='YlOrRd',
-            color_continuous_scale='RdPu',
-            #text_auto=True
-            #height=300
-            height=1000,
-            width=500
-            )
-    heatmap.update_xaxes(side="top", title="", automargin=False)
-    heatmap.update_yaxes(side="left", title="", automargin=False)
-    heatmap.update_layout(margin={"t":150,"b":0,"l":90,"r":0}, yaxis={"dtick":1},  xaxis={"dtick":1}, xaxis_tickangle=-45)
-    heatmap.layout.coloraxis.showscale = False
+def make_histogram_trace(edges, counts, name=None):
+    """Histogram drawn from precomputed bin edges and counts, so only the counts reach the browser"""
+    edges = np.asarray(edges)
+    return go.Bar(x=(edges[:-1] + edges[1:]) / 2, y=counts, width=np.diff(edges), name=name)
+
+@tracing.traced()
+def make_histograms(histograms):
+    """Stacked histogram subplots from {title: (edges, counts, name)}"""
+    figure = make_subplots(rows=len(histograms), cols=1, subplot_titles=tuple(histograms))
+    for row, (edges, counts, name) in enumerate(histograms.values(), start=1):
+        figure.add_trace(make_histogram_trace(edges, counts, name=name), row=row, col=1)
+    return figure
+
+@tracing.traced()
+def make_pie(input_df, names_col, values_col, colours):
+    import plotly.express as px
+
+    pie = px.pie(input_df, names=names_col, values=values_col, color_discrete_sequence=colours)
+    pie.update_layout(margin={"t":0,"b":10}, legend=dict(
+    yanchor="bottom",
+    y=0.8,
+    xanchor="center",
+    x=0.01
+    ))
+    return pie
+
+@tracing.traced()
+def make_choropleth(input_df, locations_col, colour_col, hover_col):
+    # Built from the columns directly rather than through plotly express, the same figure without its frame handling
+    map_fig = go.Figure(go.Choropleth(
+        locations=input_df[locations_col].to_list(),
+        z=input_df[colour_col].to_numpy(),
+        hovertext=input_df[hover_col].to_list(),
+        hovertemplate=f'<b>%{{hovertext}}</b><br><br>{locations_col}=%{{location}}<br>{colour_col}=%{{z}}<extra></extra>',
+        coloraxis='coloraxis',
+        geo='geo',
+        name='',
+    ))
+    map_fig.update_layout(
+        geo={'domain': {'x': [0.0, 1.0], 'y': [0.0, 1.0]}},
+        coloraxis={'colorbar': {'title': {'text': colour_col}}, 'colorscale': plotly.colors.sequential.Viridis, 'autocolorscale': False},
+        legend={'tracegroupgap': 0},
+        margin={"t":0,"b":0},
+    )
+    return map_fig
+
+HEATMAP_ROW_HEIGHT = 20
+
+@tracing.traced()
+def make_heatmap(counts, max_rows=None, max_columns=None, min_count=1, order='label'):
+    """Topic x publisher heatmap of a heatmap.SparseCounts
+
+    Only the submatrix left after keeping the `max_rows` topics and `max_columns` publishers with
+    the most books, without counts under `min_count`, is densified and sent to the browser.
+    `order='similarity'` groups topics and publishers that share books, otherwise both are alphabetical.
+    """
+    visible = counts.prune(max_rows, max_columns, min_count)
+    if order == 'similarity':
+        visible = visible.similarity_order()
+    heatmap = go.Figure(go.Heatmap(
+        z=visible.dense(),
+        x=visible.column_labels,
+        y=visible.row_labels,
+        coloraxis='coloraxis',
+        hovertemplate='Publisher: %{x}<br>Topic: %{y}<br>Count: %{z}<extra></extra>',
+    ))
+    heatmap.update_xaxes(side="top", title="", automargin=False, dtick=1, tickangle=-45)
+    heatmap.update_yaxes(side="left", title="", automargin=False, dtick=1, autorange='reversed')
+    heatmap.update_layout(
+        coloraxis={'colorscale': plotly.colors.sequential.RdPu, 'showscale': False},
+        margin={"t":150,"b":0,"l":90,"r":0},
+        height=max(300, 150 + HEATMAP_ROW_HEIGHT * visible.shape[0]),
+        width=500,
+    )
     return heatmap
 
+@tracing.traced()
 def display_plotly(fig):
-    fig.update_layout(dragmode='pan')
+    if fig.layout.dragmode != 'pan':
+        fig.update_layout(dragmode='pan')
     return st.plotly_chart(fig, use_container_width=True)
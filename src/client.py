@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import re
+import time
+import datetime as dt
+import threading
+from typing import TYPE_CHECKING
+from collections import OrderedDict
+from . import utils, tracing
+from .sources import DataSource
+
+if TYPE_CHECKING:
+    import gspread
+
+SPREADSHEET_KEY = re.compile(r'/spreadsheets/d/([a-zA-Z0-9-_]+)')
+
+
+def spreadsheet_key(spreadsheet: str | None) -> str | None:
+    """Workbook key from a spreadsheet URL or bare key, as given in [connections.gsheets] spreadsheet"""
+    if not spreadsheet:
+        return None
+    match = SPREADSHEET_KEY.search(spreadsheet)
+    return match.group(1) if match else spreadsheet
+
+
+class SharedClient:
+    """An authorised gspread client for one service account, shared by all of its workbooks
+
+    Authenticating is deferred until a workbook first needs the network, and happens once per
+    account rather than once per workbook, so serving another club's workbook only costs opening
+    it. Once connected, a background thread refreshes the access token before it expires.
+    """
+
+    def __init__(self, connection_values: dict, scope: list, refresh_margin: float = 300):
+        self.connection_values = dict(connection_values)
+        self.scope = scope
+        self.refresh_margin = refresh_margin
+        self.client = None
+        self._lock = threading.Lock()
+        self._refresher = None
+
+    def get(self) -> gspread.Client:
+        with self._lock:
+            if self.client is None:
+                self.client = utils.make_client(self.connection_values, self.scope)
+                self.start_token_refresher()
+            return self.client
+
+    def seconds_until_refresh(self) -> float:
+        expiry = getattr(self.client.auth, 'expiry', None)
+        if expiry is None or not self.client.auth.valid:
+            return 0
+        # google-auth keeps expiry as a naive UTC datetime
+        remaining = (expiry - dt.datetime.now(dt.timezone.utc).replace(tzinfo=None)).total_seconds()
+        return max(remaining - self.refresh_margin, 0)
+
+    def refresh_token(self) -> None:
+        from google.auth.transport.requests import Request
+
+        self.client.auth.refresh(Request())
+
+    def refresh_tokens(self) -> None:
+        failures = 0
+        while True:
+            time.sleep(self.seconds_until_refresh() if not failures else min(2 ** failures, self.refresh_margin))
+            try:
+                self.refresh_token()
+                failures = 0
+            except Exception:
+                # The client still refreshes on demand before a request, so a failure here only costs latency
+                failures += 1
+
+    def start_token_refresher(self) -> None:
+        if self._refresher is None and hasattr(self.client.auth, 'refresh'):
+            self._refresher = threading.Thread(target=self.refresh_tokens, name='gsheets-token-refresher', daemon=True)
+            self._refresher.start()
+
+
+class SharedWorkbook(DataSource):
+    """A workbook handle shared by every page and session in the process
+
+    Connecting is deferred until the first request that needs the network, so pages served
+    entirely from cached or snapshotted data never authenticate. The workbook is opened by key,
+    skipping the Drive lookup by name, and worksheet handles are cached. `close` drops the
+    handles; the next request opens the workbook again.
+    """
+
+    remote = True
+
+    def __init__(self, connection_values: dict, scope: list, workbook_name: str, refresh_margin: float = 300,
+                 shared_client: SharedClient | None = None):
+        self.connection_values = dict(connection_values)
+        self.scope = scope
+        self.workbook_name = workbook_name
+        self.key = spreadsheet_key(self.connection_values.get('spreadsheet'))
+        self.shared_client = shared_client or SharedClient(connection_values, scope, refresh_margin)
+        self._spreadsheet = None
+        self._worksheets = {}
+        self._lock = threading.RLock()
+
+    @property
+    def id(self) -> str:
+        return self.key or self.workbook_name
+
+    @property
+    def client(self) -> gspread.Client | None:
+        return self.shared_client.client
+
+    @property
+    def spreadsheet(self) -> gspread.spreadsheet.Spreadsheet:
+        with self._lock:
+            if self._spreadsheet is None:
+                client = self.shared_client.get()
+                if self.key:
+                    self._spreadsheet = client.open_by_key(self.key)
+                else:
+                    self._spreadsheet = client.open(self.workbook_name)
+            return self._spreadsheet
+
+    def worksheet(self, sheet_name: str) -> gspread.worksheet.Worksheet:
+        with self._lock:
+            if sheet_name not in self._worksheets:
+                self._worksheets[sheet_name] = self.spreadsheet.worksheet(sheet_name)
+            return self._worksheets[sheet_name]
+
+    @tracing.traced('client.values_batch_get')
+    def values_batch_get(self, ranges: list[str], params: dict | None = None) -> dict:
+        return self.spreadsheet.values_batch_get(ranges, params=params)
+
+    def close(self) -> None:
+        with self._lock:
+            self._spreadsheet = None
+            self._worksheets.clear()
+
+
+class WorkbookPool:
+    """Process-wide pool of SharedWorkbooks, one per service account and workbook, bounded in number
+
+    Workbooks of the same service account share one SharedClient. Past `max_workbooks`, the least
+    recently used workbook is closed and dropped; sessions still holding it reconnect on their
+    next request, so eviction only costs a reopen.
+    """
+
+    def __init__(self, max_workbooks: int = 16):
+        self.max_workbooks = max_workbooks
+        self.workbooks = OrderedDict()
+        self.clients = {}
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, connection_values: dict, scope: list, workbook_name: str) -> SharedWorkbook:
+        account = connection_values.get('client_email')
+        key = (account, spreadsheet_key(connection_values.get('spreadsheet')) or workbook_name)
+        with self._lock:
+            if key in self.workbooks:
+                self.workbooks.move_to_end(key)
+                return self.workbooks[key]
+            shared_client = self.clients.get(account)
+            if shared_client is None:
+                shared_client = self.clients[account] = SharedClient(connection_values, scope)
+            workbook = self.workbooks[key] = SharedWorkbook(connection_values, scope, workbook_name, shared_client=shared_client)
+            self.evict()
+            return workbook
+
+    def resize(self, max_workbooks: int) -> None:
+        with self._lock:
+            self.max_workbooks = max_workbooks
+            self.evict()
+
+    def evict(self) -> None:
+        while len(self.workbooks) > self.max_workbooks:
+            _, workbook = self.workbooks.popitem(last=False)
+            workbook.close()
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'workbooks': len(self.workbooks), 'clients': len(self.clients), 'evictions': self.evictions,
+                    'max_workbooks': self.max_workbooks}
+
+
+WORKBOOKS = WorkbookPool()
+tracing.TRACER.register('pool', {'pool': 'workbooks'}, WORKBOOKS.stats)
+
+def get_shared_workbook(connection_values: dict, scope: list, workbook_name: str) -> SharedWorkbook:
+    """The pooled SharedWorkbook for a service account and workbook, created on first use"""
+    return WORKBOOKS.get(connection_values, scope, workbook_name)
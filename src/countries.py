@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import re
+import unicodedata
+import polars as pl
+from pathlib import Path
+from . import tracing
+from .aggregates import frame_fingerprint
+from .registry import Registry
+
+COUNTRIES_PATH = Path(__file__).parent / 'data' / 'countries.csv'
+DROPPED = re.compile(r"[.'’]")
+SEPARATORS = re.compile(r'[^a-z0-9]+')
+
+
+def normalize_name(name: str) -> str:
+    """Lookup key of a country spelling, ignoring accents, case, punctuation, a leading 'the' and 'St' for 'Saint'"""
+    plain = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode('ascii').casefold()
+    words = SEPARATORS.sub(' ', DROPPED.sub('', plain.replace('&', ' and '))).split()
+    if words[:1] == ['the']:
+        words = words[1:]
+    return ' '.join('saint' if word == 'st' else word for word in words)
+
+
+class CountryTable:
+    """The bundled ISO 3166 country list, with a lookup from any known spelling to the alpha-3 code
+
+    Each country has a display name, its alpha-2 and alpha-3 codes and a ';'-separated list of
+    aliases (formal ISO names, former names, common short forms). Names, aliases and codes are
+    normalised once into a dict, so resolving a spelling is a single hash lookup.
+    """
+
+    def __init__(self, path: str | Path = COUNTRIES_PATH):
+        table = pl.read_csv(path, schema={'name': pl.String, 'alpha2': pl.String, 'alpha3': pl.String, 'aliases': pl.String})
+        self.alpha3_type = pl.Enum(table['alpha3'].to_list())
+        self.frame = table.select('name', 'alpha2', pl.col('alpha3').cast(self.alpha3_type))
+        self.names = dict(zip(table['alpha3'], table['name']))
+        self.lookup = {}
+        for name, alpha2, alpha3, aliases in table.iter_rows():
+            for spelling in (name, alpha2, alpha3, *(aliases or '').split(';')):
+                if spelling:
+                    self.lookup.setdefault(normalize_name(spelling), alpha3)
+
+    def alpha3(self, name: str | None) -> str | None:
+        return self.lookup.get(normalize_name(name)) if name else None
+
+
+class CountryCounts:
+    """Authors per country of birth, resolved through a CountryTable and ready for the choropleth
+
+    Spellings of the same country are counted together under the table's display name; names
+    the table doesn't know keep their own text and get no code. `frame` has the 'Country of
+    Birth', 'Alpha3Code' and 'Count' columns the map is drawn from.
+    """
+
+    def __init__(self, author_df: pl.DataFrame, table: CountryTable):
+        self.fingerprint = frame_fingerprint(author_df)
+        per_name = author_df.group_by('Country of Birth').agg(pl.col('Author Name').count().alias('Count'))
+        codes = [table.alpha3(name) for name in per_name['Country of Birth']]
+        self.frame = (
+            per_name.with_columns(
+                pl.Series('Alpha3Code', codes, dtype=pl.String),
+                pl.Series('name', [table.names.get(code) for code in codes], dtype=pl.String),
+            )
+            .group_by(pl.coalesce('name', 'Country of Birth').alias('Country of Birth'), 'Alpha3Code')
+            .agg(pl.col('Count').sum().cast(pl.Int64))
+            .sort('Country of Birth')
+        )
+
+
+TABLES = Registry()
+COUNTS = Registry()
+
+def get_country_table(path: str | Path = COUNTRIES_PATH) -> CountryTable:
+    """The CountryTable for a reference file, read once"""
+    return TABLES.get(str(Path(path).resolve()), lambda: CountryTable(path))
+
+@tracing.traced()
+def get_country_counts(author_df: pl.DataFrame, name: str = 'Authors') -> CountryCounts:
+    """Country counts for `author_df`, recounted only when its contents change"""
+    table = get_country_table()
+    fingerprint = frame_fingerprint(author_df)
+    return COUNTS.get(name, lambda: CountryCounts(author_df, table), stale=lambda counts: counts.fingerprint != fingerprint)
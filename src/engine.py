@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import json
+import threading
+import polars as pl
+from pathlib import Path
+from typing import TYPE_CHECKING, Collection
+from . import tracing
+from .aggregates import frame_fingerprint
+from .registry import Registry
+
+# duckdb is only imported once an engine is created, so the default polars path never loads it
+if TYPE_CHECKING:
+    import duckdb
+
+TABLES = {'Main': 'main', 'Authors': 'authors'}
+
+
+class DuckDBEngine:
+    """Runs the dashboard's aggregations as SQL over a persistent DuckDB copy of the sheets
+
+    `sync` loads the typed sheets into tables once per change of their contents, and with them
+    per-year partial sums for the year-filtered panels, indexed on `Year`. Queries return Arrow
+    tables that polars wraps without copying, cast to the dtypes of the polars panel queries and
+    sorted by polars the way they are, so `panels.collect_panels` can take the panels in `PANELS`
+    from here instead without their types or tie order depending on the [engine] config.
+    """
+
+    PANELS = ('publisher_stats', 'topic_publisher_counts', 'topic_counts', 'gender_counts', 'debut_counts', 'metrics')
+
+    def __init__(self, path: str | Path = '.snapshots/engine.duckdb'):
+        import duckdb
+
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = duckdb.connect(str(self.path))
+        self.connection.execute('CREATE TABLE IF NOT EXISTS sync_state (name VARCHAR PRIMARY KEY, fingerprint VARCHAR)')
+        self._lock = threading.Lock()
+        # Polars schemas of the synced sheets, to give query results the dtypes the polars path has
+        self.schemas = {}
+
+    def cursor(self) -> duckdb.DuckDBPyConnection:
+        # A cursor is a separate connection to the same database, safe to use from one script thread
+        return self.connection.cursor()
+
+    # Integer sums in the queries below are cast to BIGINT, DuckDB widens them to HUGEINT which polars reads as a decimal
+    def query(self, sql: str, parameters: list | None = None, schema: dict | None = None) -> pl.DataFrame:
+        with self.cursor() as cursor:
+            frame = pl.from_arrow(cursor.execute(sql, parameters or []).arrow(), rechunk=False)
+        return frame.cast(schema) if schema else frame
+
+    def main_dtype(self, column: str) -> pl.DataType:
+        return self.schemas.get('Main', {}).get(column, pl.String)
+
+    @tracing.traced('engine.sync')
+    def sync(self, sheets: dict[str, pl.DataFrame]) -> bool:
+        """Reload the tables whose sheet changed since the last sync; returns whether anything was loaded"""
+        with self._lock, self.cursor() as cursor:
+            self.schemas.update((name, frame.schema) for name, frame in sheets.items())
+            stored = dict(cursor.execute('SELECT name, fingerprint FROM sync_state').fetchall())
+            changed = {
+                name: frame for name, frame in sheets.items()
+                if stored.get(name) != json.dumps(frame_fingerprint(frame))
+            }
+            if not changed:
+                return False
+            cursor.execute('BEGIN TRANSACTION')
+            for name, frame in changed.items():
+                table = TABLES[name]
+                cursor.register('incoming', frame.to_arrow())
+                cursor.execute(f'CREATE OR REPLACE TABLE {table} AS SELECT * FROM incoming')
+                cursor.unregister('incoming')
+                cursor.execute('INSERT OR REPLACE INTO sync_state VALUES (?, ?)', [name, json.dumps(frame_fingerprint(frame))])
+            if 'Main' in changed:
+                self.build_partials(cursor)
+            cursor.execute('COMMIT')
+            if 'Main' in changed:
+                # Built after the commit, building them inside the load transaction makes the commit many times slower
+                for table in ('publisher_year', 'topic_year', 'category_year'):
+                    cursor.execute(f'CREATE INDEX IF NOT EXISTS {table}_year ON {table} (Year)')
+            return True
+
+    def build_partials(self, cursor: duckdb.DuckDBPyConnection) -> None:
+        """Per-year partial sums of the 'Main' table, as `aggregates.YearAggregates` keeps in polars"""
+        cursor.execute(
+            'CREATE OR REPLACE TABLE publisher_year AS '
+            'SELECT Year, Publisher, sum(Score) AS score_sum, sum(Score * Score) AS score_sq_sum, '
+            'count(Score) AS score_count, count(Title) AS book_count FROM main GROUP BY Year, Publisher ORDER BY Year'
+        )
+        # Books without topics keep one null topic, as exploding a null list does in polars
+        cursor.execute(
+            'CREATE OR REPLACE TABLE topic_year AS '
+            'SELECT Year, Publisher, Topics, count(Title) AS count FROM ('
+            'SELECT Year, Publisher, Title, unnest(coalesce(string_split(Topics, \', \'), [NULL::VARCHAR])) AS Topics FROM main'
+            ') GROUP BY Year, Publisher, Topics ORDER BY Year'
+        )
+        cursor.execute(
+            'CREATE OR REPLACE TABLE category_year AS '
+            'SELECT Year, \'Author gender\' AS category, "Author gender"::VARCHAR AS value, count(*) AS count FROM main GROUP BY Year, value '
+            'UNION ALL '
+            'SELECT Year, \'Debut?\' AS category, "Debut?"::VARCHAR AS value, count(*) AS count FROM main GROUP BY Year, value '
+            'ORDER BY Year'
+        )
+        cursor.execute(
+            'CREATE OR REPLACE TABLE metrics AS '
+            'SELECT sum(Pages)::BIGINT AS total_pages, arg_max(Pages, Date) AS latest_pages, count(Title) AS books, '
+            'count(DISTINCT Author) AS authors, count(DISTINCT Publisher) AS publishers FROM main'
+        )
+
+    def publisher_stats(self, years: list) -> pl.DataFrame:
+        # NaN rather than NULL for single-book publishers, as the polars query gives
+        return self.query(
+            'SELECT Publisher, Score, coalesce(sqrt((score_sq_sum - score_sum * score_sum / score_count) / (score_count - 1)), \'NaN\'::DOUBLE) AS "Score std", Title '
+            'FROM ('
+            'SELECT Publisher, sum(score_sum) / sum(score_count) AS Score, sum(score_sum) AS score_sum, sum(score_sq_sum) AS score_sq_sum, '
+            'sum(score_count) AS score_count, sum(book_count)::BIGINT AS Title FROM publisher_year WHERE list_contains(?, Year) GROUP BY Publisher'
+            ')',
+            [years],
+            {'Publisher': self.main_dtype('Publisher'), 'Score': pl.Float64, 'Score std': pl.Float64, 'Title': pl.UInt32},
+        ).sort(by=['Score', 'Publisher'], descending=[True, False])
+
+    def topic_publisher_counts(self, years: list) -> pl.DataFrame:
+        return self.query(
+            'SELECT Publisher, Topics, sum(count)::BIGINT AS count FROM topic_year WHERE list_contains(?, Year) GROUP BY Publisher, Topics',
+            [years],
+            {'Publisher': pl.String, 'Topics': pl.String, 'count': pl.UInt32},
+        ).sort('Publisher', 'Topics')
+
+    def topic_counts(self, years: list) -> pl.DataFrame:
+        return self.query(
+            'SELECT Topics, sum(count)::BIGINT AS Title FROM topic_year WHERE list_contains(?, Year) GROUP BY Topics',
+            [years],
+            {'Topics': pl.String, 'Title': pl.UInt32},
+        ).sort('Title', 'Topics')
+
+    def counts(self, column: str, years: list) -> pl.DataFrame:
+        return self.query(
+            f'SELECT value AS "{column}", sum(count)::BIGINT AS count FROM category_year '
+            'WHERE category = ? AND list_contains(?, Year) AND value IS NOT NULL GROUP BY value',
+            [column, years],
+            {column: self.main_dtype(column), 'count': pl.UInt32},
+        ).sort(column)
+
+    def metrics(self) -> pl.DataFrame:
+        return self.query('SELECT * FROM metrics')
+
+    @tracing.traced('engine.panels')
+    def panels(self, years: list | None, names: Collection[str] = PANELS) -> dict[str, pl.DataFrame]:
+        """The raw frames for `names` out of `PANELS`, as `panels.dashboard_plan` would collect them"""
+        queries = {
+            'publisher_stats': lambda: self.publisher_stats(years),
+            'topic_publisher_counts': lambda: self.topic_publisher_counts(years),
+            'topic_counts': lambda: self.topic_counts(years),
+            'gender_counts': lambda: self.counts('Author gender', years),
+            'debut_counts': lambda: self.counts('Debut?', years),
+            'metrics': self.metrics,
+        }
+        return {name: queries[name]() for name in names}
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+ENGINES = Registry()
+
+def get_engine(config: dict) -> DuckDBEngine | None:
+    """The engine chosen by the [engine] section of the secrets, one per database file, or None for plain polars"""
+    if config.get('backend', 'polars') == 'polars':
+        return None
+    if config['backend'] != 'duckdb':
+        raise ValueError(f"Unknown engine backend {config['backend']!r}")
+    path = str(Path(config.get('path', '.snapshots/engine.duckdb')).resolve())
+    return ENGINES.get(path, lambda: DuckDBEngine(path))
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import numpy as np
+import polars as pl
+from typing import NamedTuple
+from .topic_index import dictionary_encode
+
+
+class SparseCounts(NamedTuple):
+    """Non-zero cells of a labelled count matrix in coordinate (COO) form
+
+    Built from one row per non-zero pair, e.g. the sparse sums of `TopicIndex.topic_publisher_counts`
+    or the engine's group_by, so memory tracks the pairs that occur rather than rows x columns;
+    `dense` builds the full matrix only for what is left after `prune`, the part that is drawn. Row and column
+    labels are sorted, with null (e.g. books without topics) first, as the old pivot was.
+    """
+
+    row_labels: list
+    column_labels: list
+    rows: np.ndarray
+    columns: np.ndarray
+    counts: np.ndarray
+
+    @classmethod
+    def from_long(cls, frame: pl.DataFrame, row: str = 'Topics', column: str = 'Publisher', value: str = 'count') -> SparseCounts:
+        """From one row per non-zero cell, e.g. `TopicIndex.topic_publisher_counts`"""
+        frame = frame.filter(pl.col(value) > 0)
+        row_labels, rows = dictionary_encode(frame[row].cast(pl.String))
+        column_labels, columns = dictionary_encode(frame[column].cast(pl.String))
+        return cls(row_labels, column_labels, rows, columns, frame[value].cast(pl.Int64).to_numpy())
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return len(self.row_labels), len(self.column_labels)
+
+    def row_totals(self) -> np.ndarray:
+        return np.bincount(self.rows, weights=self.counts, minlength=self.shape[0]).astype(np.int64)
+
+    def column_totals(self) -> np.ndarray:
+        return np.bincount(self.columns, weights=self.counts, minlength=self.shape[1]).astype(np.int64)
+
+    def select(self, keep: np.ndarray, row_ids: np.ndarray, column_ids: np.ndarray) -> SparseCounts:
+        """The cells in `keep` (a boolean mask), relabelled to the rows and columns listed, in that order"""
+        row_position = np.full(self.shape[0], -1, dtype=np.int64)
+        row_position[row_ids] = np.arange(len(row_ids))
+        column_position = np.full(self.shape[1], -1, dtype=np.int64)
+        column_position[column_ids] = np.arange(len(column_ids))
+        keep = keep & (row_position[self.rows] >= 0) & (column_position[self.columns] >= 0)
+        return SparseCounts(
+            [self.row_labels[i] for i in row_ids], [self.column_labels[i] for i in column_ids],
+            row_position[self.rows[keep]], column_position[self.columns[keep]], self.counts[keep],
+        )
+
+    def prune(self, max_rows: int | None = None, max_columns: int | None = None, min_count: int = 1) -> SparseCounts:
+        """Drop cells below `min_count`, then keep the `max_rows` rows and `max_columns` columns with the largest totals
+
+        Rows and columns left without any cell are dropped; the kept ones stay in label order.
+        """
+        keep = self.counts >= min_count
+        pruned = self.select(keep, np.arange(self.shape[0]), np.arange(self.shape[1]))
+        row_totals, column_totals = pruned.row_totals(), pruned.column_totals()
+        row_ids = top_ids(row_totals, max_rows)
+        column_ids = top_ids(column_totals, max_columns)
+        return pruned.select(np.ones(len(pruned.counts), dtype=bool), row_ids, column_ids)
+
+    def similarity_order(self) -> SparseCounts:
+        """Reorder rows and columns so similar ones sit together, by correspondence analysis
+
+        Rows and columns are sorted by their scores on the first non-trivial axis of the scaled
+        count matrix (the reciprocal averaging seriation), which pulls publishers and topics that
+        co-occur into blocks along the diagonal.
+        """
+        if min(self.shape) < 3:
+            return self
+        matrix = self.dense().astype(np.float64)
+        row_totals, column_totals = matrix.sum(axis=1), matrix.sum(axis=0)
+        scaled = matrix / np.sqrt(np.outer(row_totals, column_totals))
+        left, _, right = np.linalg.svd(scaled, full_matrices=False)
+        row_scores = left[:, 1] / np.sqrt(row_totals)
+        column_scores = right[1] / np.sqrt(column_totals)
+        # The axis has no inherent sign, fix it so the order is stable between reruns
+        if row_scores[np.argmax(np.abs(row_scores))] < 0:
+            row_scores, column_scores = -row_scores, -column_scores
+        return self.select(
+            np.ones(len(self.counts), dtype=bool), np.argsort(row_scores, kind='stable'), np.argsort(column_scores, kind='stable')
+        )
+
+    def dense(self) -> np.ndarray:
+        matrix = np.zeros(self.shape, dtype=np.int64)
+        matrix[self.rows, self.columns] = self.counts
+        return matrix
+
+    def to_frame(self, row: str = 'Topics') -> pl.DataFrame:
+        """Dense labelled frame, one column per column label, as the pivot of the long counts gives"""
+        matrix = self.dense()
+        return pl.DataFrame(
+            [pl.Series(row, self.row_labels, dtype=pl.String)]
+            + [pl.Series(str(label), matrix[:, index]) for index, label in enumerate(self.column_labels)]
+        )
+
+
+def top_ids(totals: np.ndarray, limit: int | None) -> np.ndarray:
+    """Ids with a non-zero total, cut to the `limit` largest (ties to the lower id), in id order"""
+    ids = np.flatnonzero(totals)
+    if limit is not None and len(ids) > limit:
+        ids = np.sort(ids[np.argsort(-totals[ids], kind='stable')[:limit]])
+    return ids
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import json
+import time
+import logging
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING
+from . import utils
+from .registry import Registry
+
+if TYPE_CHECKING:
+    import requests
+
+logger = logging.getLogger(__name__)
+
+
+def make_session(retries: int = 3, backoff_factor: float = 1.0) -> requests.Session:
+    """Pooled HTTP session that retries transient failures with exponential backoff"""
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    retry = Retry(total=retries, backoff_factor=backoff_factor, status_forcelist=(429, 500, 502, 503, 504), allowed_methods=('GET',))
+    session = requests.Session()
+    session.mount('https://', HTTPAdapter(max_retries=retry, pool_maxsize=4))
+    session.mount('http://', HTTPAdapter(max_retries=retry, pool_maxsize=4))
+    return session
+
+
+class MemberCountRefresher:
+    """Serves the last good Meetup member count instantly and refreshes it on a background thread
+
+    The value is kept in memory and in a small JSON file, so a fresh process starts with the
+    previous count instead of waiting on Meetup. Failed refreshes back off exponentially, capped
+    at the normal refresh interval, and the stale value keeps being served in the meantime; an
+    unexpected error is logged and backed off the same way, so it never ends the thread.
+    """
+
+    def __init__(self, url: str, cache_path: str | Path, element_id: str = 'member-count-link', default: int = 6000,
+                 interval: float = 3 * 60 * 60, timeout: float = 5, session: requests.Session | None = None):
+        self.url = url
+        self.cache_path = Path(cache_path)
+        self.element_id = element_id
+        self.default = default
+        self.interval = interval
+        self.timeout = timeout
+        # Created on first refresh, so requests is only imported on the background thread
+        self.session = session
+        self.members = None
+        self.updated_at = None
+        self._first_refresh = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self) -> None:
+        try:
+            cached = json.loads(self.cache_path.read_text())
+        except (OSError, ValueError):
+            return
+        if cached.get('url') == self.url:
+            self.members = cached['members']
+            self.updated_at = cached['updated_at']
+
+    def save(self) -> None:
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.cache_path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps({'url': self.url, 'members': self.members, 'updated_at': self.updated_at}))
+        tmp_path.replace(self.cache_path)
+
+    def refresh(self) -> bool:
+        if self.session is None:
+            self.session = make_session()
+        text = utils.get_text_from_html_element(self.url, self.element_id, timeout=self.timeout, session=self.session)
+        members = utils.get_number_of_members(text, None)
+        if members is None:
+            return False
+        self.members = members
+        self.updated_at = time.time()
+        self.save()
+        return True
+
+    def run(self) -> None:
+        failures = 0
+        if self.updated_at is not None:
+            # A value restored from disk is only refreshed once it is due
+            self._stop.wait(max(self.interval - (time.time() - self.updated_at), 0))
+        while not self._stop.is_set():
+            try:
+                ok = self.refresh()
+            except Exception:
+                logger.exception('Refreshing the Meetup member count from %s failed', self.url)
+                ok = False
+            self._first_refresh.set()
+            failures = 0 if ok else failures + 1
+            delay = self.interval if ok else min(self.timeout * 2 ** failures, self.interval)
+            self._stop.wait(delay)
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.run, name='meetup-refresher', daemon=True)
+                self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def get(self, wait: float = 0) -> int:
+        """Current member count; with no value yet, waits up to `wait` seconds for the first refresh"""
+        self.start()
+        if self.members is None and wait:
+            self._first_refresh.wait(wait)
+        return self.members if self.members is not None else self.default
+
+
+REFRESHERS = Registry()
+
+def get_refresher(url: str, cache_path: str | Path, **kwargs) -> MemberCountRefresher:
+    """The refresher for a Meetup page and cache file, created on first use"""
+    key = (url, str(Path(cache_path).resolve()))
+    return REFRESHERS.get(key, lambda: MemberCountRefresher(url, cache_path, **kwargs))
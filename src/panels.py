@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import calendar
+import polars as pl
+from typing import TYPE_CHECKING
+from . import utils, tracing
+from .aggregates import YearAggregates
+from .heatmap import SparseCounts
+
+if TYPE_CHECKING:
+    from .engine import DuckDBEngine
+
+MONTH_NUM_FROM_NAME = {name: num for num, name in enumerate(calendar.month_name) if num}
+SCATTER_COLUMNS = ['Title', 'Author', 'Month', 'Year', 'Score', 'Pages', 'Our score conversion', 'Goodreads score']
+
+
+@tracing.traced()
+def prepare_main(main_df: pl.DataFrame) -> pl.DataFrame:
+    """Add month number and date columns and drop unscored or untitled rows"""
+    return (
+        main_df
+        .with_columns(pl.col('Month').replace_strict(MONTH_NUM_FROM_NAME).alias("Month Num"))
+        .with_columns(pl.date(pl.col('Year'), pl.col('Month Num'), 1).alias("Date"))
+        .filter(pl.col("Score") > 0.0)
+        .filter(~pl.col("Title").is_null())
+    )
+
+
+# Panels that change with the year selection, and those over all the books
+SELECTION = (
+    'publisher_stats', 'topic_publisher_counts', 'topic_counts', 'heatmap', 'gender_counts', 'debut_counts',
+    'pages_histogram', 'score_histogram', 'score_fit', 'pages_fit', 'scatter', 'selected_books',
+)
+ALL_TIME = ('top_scorers', 'metrics')
+SCOPES = {'selection': SELECTION, 'all_time': ALL_TIME}
+
+
+def dashboard_plan(main_df: pl.DataFrame, year_aggregates: YearAggregates, years: list | None,
+                   scopes: tuple = ('selection', 'all_time')) -> dict[str, pl.LazyFrame]:
+    """One lazy query per dashboard panel in `scopes`, meant to be collected together with `pl.collect_all`"""
+    main = main_df.lazy()
+    plan = {}
+    if 'selection' in scopes:
+        selected = main.filter(pl.col('Year').is_in(years))
+        plan.update({
+            'publisher_stats': year_aggregates.publisher_stats_plan(years),
+            'gender_counts': year_aggregates.counts_plan('Author gender', years),
+            'debut_counts': year_aggregates.counts_plan('Debut?', years),
+            'pages_histogram': year_aggregates.histogram_plan('Pages', years),
+            'score_histogram': year_aggregates.histogram_plan('Score', years),
+            'score_fit': year_aggregates.fit_plan('Our score conversion', 'Goodreads score', years),
+            'pages_fit': year_aggregates.fit_plan('Score', 'Pages', years),
+            'scatter': selected.select(SCATTER_COLUMNS),
+            'selected_books': selected.sort("Date", descending=True).select(pl.col("Title"), pl.col('Date'), pl.col("Score")),
+        })
+    if 'all_time' in scopes:
+        plan.update({
+            'top_scorers': main.select(pl.col("Title"), pl.col('Date'), pl.col("Score"), pl.col('Author')).top_k(2, by='Score'),
+            'metrics': main.select(
+                pl.col('Pages').sum().alias('total_pages'),
+                pl.col('Pages').top_k_by('Date', 1).first().alias('latest_pages'),
+                pl.col('Title').count().alias('books'),
+                pl.col('Author').n_unique().alias('authors'),
+                pl.col('Publisher').n_unique().alias('publishers'),
+            ),
+        })
+    return plan
+
+
+@tracing.traced()
+def collect_panels(main_df: pl.DataFrame, year_aggregates: YearAggregates, years: list | None, engine: DuckDBEngine | None = None,
+                   scopes: tuple = ('selection', 'all_time')) -> dict:
+    """Run every panel query in `scopes` in one `pl.collect_all` call and shape the results for the charts
+
+    With an `engine`, the panels it covers are queried there instead. `years` is only read by
+    the 'selection' panels, so the 'all_time' ones alone can be collected without it.
+    """
+    plan = dashboard_plan(main_df, year_aggregates, years, scopes)
+    wanted = {name for scope in scopes for name in SCOPES[scope]}
+    if engine is not None:
+        plan = {name: query for name, query in plan.items() if name not in engine.PANELS}
+    panels = dict(zip(plan, pl.collect_all(list(plan.values()))))
+    if engine is not None:
+        panels.update(engine.panels(years, [name for name in engine.PANELS if name in wanted]))
+    elif 'selection' in scopes:
+        # Read off the topic index rather than queried
+        panels['topic_publisher_counts'] = year_aggregates.topic_publisher_counts(years)
+        panels['topic_counts'] = year_aggregates.topic_counts(years)
+    if 'selection' in scopes:
+        panels['heatmap'] = SparseCounts.from_long(panels['topic_publisher_counts'])
+        panels['pages_histogram'] = year_aggregates.histogram_from_counts('Pages', panels['pages_histogram'])
+        panels['score_histogram'] = year_aggregates.histogram_from_counts('Score', panels['score_histogram'])
+        panels['score_fit'] = utils.fit_from_accumulators(panels['score_fit'].row(0, named=True))
+        panels['pages_fit'] = utils.fit_from_accumulators(panels['pages_fit'].row(0, named=True))
+    if 'all_time' in scopes:
+        panels['metrics'] = panels['metrics'].row(0, named=True)
+    return panels
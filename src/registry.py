@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import threading
+from typing import Callable, Hashable, TypeVar
+
+T = TypeVar('T')
+
+
+class Registry:
+    """Objects shared by every session of the process, keyed and built on first use
+
+    Each key is built under a lock of its own, so concurrent sessions asking for the same key get
+    one object while a slow build (e.g. one club's aggregates) never holds up the other keys.
+    `stale` lets an entry be rebuilt, e.g. when the frame it was computed from changes.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def get(self, key: Hashable, build: Callable[[], T], stale: Callable[[T], bool] | None = None) -> T:
+        with self._lock:
+            if key in self._entries and (stale is None or not stale(self._entries[key])):
+                return self._entries[key]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                if key in self._entries and (stale is None or not stale(self._entries[key])):
+                    return self._entries[key]
+            entry = build()
+            with self._lock:
+                self._entries[key] = entry
+            return entry
+
+    def pop(self, key: Hashable, default=None):
+        with self._lock:
+            return self._entries.pop(key, default)
+
+    def items(self) -> list[tuple]:
+        with self._lock:
+            return list(self._entries.items())
@@ -1,23 +1,55 @@
+import calendar
 import polars as pl
+from typing import Callable, NamedTuple
+
+
+class Constrained(NamedTuple):
+    """A column type plus a rule its values must meet, checked in the same pass as the cast
+
+    Values breaking the rule are set to null and reported like values that can't be cast.
+    """
+    dtype: pl.DataType
+    check: Callable[[pl.Expr], pl.Expr]
+    description: str
+
+    def __str__(self) -> str:
+        return f'{self.dtype} {self.description}'
+
+
+def column_dtype(column_type) -> pl.DataType:
+    return column_type.dtype if isinstance(column_type, Constrained) else column_type
+
+
+def dtypes(schema: dict) -> dict:
+    """The plain polars types of a schema, e.g. to build an empty frame"""
+    return {name: column_dtype(column_type) for name, column_type in schema.items()}
+
+
+MONTH = pl.Enum(calendar.month_name[1:])
+YES_NO = pl.Enum(['Yes', 'No'])
+
+def between(low, high) -> Callable[[pl.Expr], pl.Expr]:
+    return lambda column: column.is_between(low, high)
 
 def get_main_schema() -> dict:
     main_schema = {
-        'Number': pl.Int64,
-        'ISBN': str,
-        'Month': str,
-        'Year': pl.Int64,
+        'Number': Constrained(pl.UInt32, lambda column: column >= 1, 'of at least 1'),
+        # One regex allowing hyphens between digits, rather than stripping them first
+        'ISBN': Constrained(pl.String, lambda column: column.str.contains(r'^(?:97[89]-?)?(?:\d-?){9}[\dX]$'), 'ISBN-10 or ISBN-13'),
+        'Month': MONTH,
+        'Year': Constrained(pl.Int16, between(1900, 2100), 'between 1900 and 2100'),
         'Title': str,
-        'Score': pl.Float64,
+        'Score': Constrained(pl.Float64, between(0, 10), 'between 0 and 10'),
         'Author': str,
-        'Publisher': str,
-        'Pages': pl.Int64,
-        'Author gender': str,
-        'Pub year': pl.Int64,
-        'Goodreads score': pl.Float64,
-        'Our score conversion': pl.Float64,
+        'Publisher': pl.Categorical,
+        'Pages': Constrained(pl.Int16, lambda column: column >= 1, 'of at least 1'),
+        'Author gender': pl.Categorical,
+        'Pub year': pl.Int16,
+        'Goodreads score': Constrained(pl.Float64, between(0, 5), 'between 0 and 5'),
+        'Our score conversion': Constrained(pl.Float64, between(0, 5), 'between 0 and 5'),
         'variance': pl.Float64,
-        'Debut?': str,
-        'Translated?': str,
+        'Debut?': YES_NO,
+        'Translated?': YES_NO,
         'Topics': str
     }
     return main_schema
@@ -35,11 +67,12 @@ def get_author_schema() -> dict:
         'Forename': str,
         'Surname': str,
         'Author Name': str,
-        'Gender': str,
+        'Gender': pl.Categorical,
+        # Kept as text, countries.CountryTable normalises it to find the country code
         'Country of Birth': str,
-        'Year of Birth': str,
-        'Year of death': str,
-        'Books since last bookclub pick': str,
+        'Year of Birth': pl.Int16,
+        'Year of death': pl.Int16,
+        'Books since last bookclub pick': pl.UInt16,
         'Book title': str
     }
     return author_schema
@@ -48,10 +81,10 @@ def get_data_schema() -> dict:
     data_schema = {
         'column_0': str,
         'column_1': str,
-        'column_2': str,
+        'column_2': Constrained(pl.String, lambda column: column.str.contains(r'^[A-Z]{3}$'), 'ISO alpha-3 code'),
         'column_3': str,
         'column_4': str,
         'column_5': str,
         'column_6': str
     }
-    return data_schema
\ No newline at end of file
+    return data_schema
@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import os
+import json
+import time
+import hashlib
+import polars as pl
+from pathlib import Path
+from typing import TYPE_CHECKING
+from . import utils, tracing
+
+if TYPE_CHECKING:
+    import gspread
+
+
+def rows_checksum(rows: list[list]) -> str:
+    return hashlib.sha256(json.dumps(rows, default=str).encode('utf-8')).hexdigest()
+
+
+def parse_key(value) -> int | None:
+    try:
+        return int(str(value).replace(',', ''))
+    except ValueError:
+        return None
+
+
+def schema_key(schema: dict) -> list[list[str]]:
+    """JSON-able description of a sheet schema, so snapshots typed by an older schema are not reused"""
+    return [[name, str(column_type)] for name, column_type in schema.items()]
+
+
+def column_letter(column_number: int) -> str:
+    """A1 column name for a 1-based column number, e.g. 1 -> 'A', 28 -> 'AB'"""
+    letters = ''
+    while column_number:
+        column_number, remainder = divmod(column_number - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+
+class SnapshotStore:
+    """Local Parquet copy of each worksheet, synced incrementally from Google Sheets
+
+    Sheets listed in `incremental` are append-only: only rows after the last synced row are
+    downloaded, together with an overlap window of already-seen rows whose checksum must still
+    match. A changed header, a checksum mismatch, shrinking row count or a non-increasing key
+    falls back to a full refresh. Edits older than the overlap window are picked up by the
+    periodic full refresh every `full_refresh_after` seconds.
+    """
+
+    def __init__(self, directory: str | Path = '.snapshots', max_age: float = 600, incremental: dict[str, str] | None = None,
+                 overlap: int = 5, full_refresh_after: float = 24 * 60 * 60):
+        self.directory = Path(directory)
+        self.max_age = max_age
+        self.incremental = incremental or {}
+        self.overlap = overlap
+        self.full_refresh_after = full_refresh_after
+
+    def parquet_path(self, sheet_name: str) -> Path:
+        return self.directory / f'{sheet_name}.parquet'
+
+    def meta_path(self, sheet_name: str) -> Path:
+        return self.directory / f'{sheet_name}.json'
+
+    def read_meta(self, sheet_name: str, schema: dict) -> dict | None:
+        """Metadata of the sheet's snapshot, or None when there is none or it was typed by another schema"""
+        meta_path = self.meta_path(sheet_name)
+        if not meta_path.exists() or not self.parquet_path(sheet_name).exists():
+            return None
+        try:
+            meta = json.loads(meta_path.read_text())
+        except ValueError:
+            return None
+        return meta if meta.get('schema') == schema_key(schema) else None
+
+    def read(self, sheet_name: str) -> pl.DataFrame:
+        return pl.read_parquet(self.parquet_path(sheet_name), memory_map=True)
+
+    def read_many(self, sheets: dict[str, dict]) -> dict[str, pl.DataFrame] | None:
+        """Last synced snapshots regardless of age, or None unless every sheet has one"""
+        if not all(self.read_meta(sheet_name, schema) for sheet_name, schema in sheets.items()):
+            return None
+        return {sheet_name: self.read(sheet_name) for sheet_name in sheets}
+
+    def write(self, sheet_name: str, frame: pl.DataFrame, meta: dict) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        parquet_path = self.parquet_path(sheet_name)
+        meta_path = self.meta_path(sheet_name)
+        tmp_parquet = parquet_path.with_suffix('.parquet.tmp')
+        tmp_meta = meta_path.with_suffix('.json.tmp')
+        frame.write_parquet(tmp_parquet)
+        tmp_meta.write_text(json.dumps(meta))
+        os.replace(tmp_parquet, parquet_path)
+        os.replace(tmp_meta, meta_path)
+
+    def is_fresh(self, meta: dict | None, now: float) -> bool:
+        return meta is not None and now - meta['synced_at'] < self.max_age
+
+    def tail_start(self, meta: dict) -> int:
+        """Zero-based index of the first data row fetched by an incremental sync"""
+        return max(meta['rows'] - self.overlap, 0)
+
+    def make_meta(self, sheet_name: str, schema: dict, values: list[list], now: float, full_sync_at: float) -> dict:
+        header = values[0] if values else []
+        rows = values[1:]
+        key_column = self.incremental.get(sheet_name)
+        last_key = None
+        if key_column in header and rows:
+            key_index = header.index(key_column)
+            keys = [parse_key(row[key_index]) for row in rows if len(row) > key_index]
+            keys = [key for key in keys if key is not None]
+            last_key = max(keys) if keys else None
+        return {
+            'header': header,
+            'schema': schema_key(schema),
+            'rows': len(rows),
+            'tail_checksum': rows_checksum(rows[max(len(rows) - self.overlap, 0):]),
+            'last_key': last_key,
+            'synced_at': now,
+            'full_sync_at': full_sync_at,
+        }
+
+    def apply_tail(self, sheet_name: str, schema: dict, meta: dict, header: list, tail: list[list], now: float) -> pl.DataFrame | None:
+        """Append the rows past the last sync, or return None when a full refresh is needed"""
+        if header != meta['header']:
+            return None
+        seen = meta['rows'] - self.tail_start(meta)
+        if len(tail) < seen or rows_checksum(tail[:seen]) != meta['tail_checksum']:
+            return None
+        new_rows = tail[seen:]
+        key_column = self.incremental[sheet_name]
+        if new_rows and key_column in header:
+            key_index = header.index(key_column)
+            keys = [parse_key(row[key_index]) if len(row) > key_index else None for row in new_rows]
+            previous = meta['last_key']
+            for key in keys:
+                if key is None or (previous is not None and key <= previous):
+                    return None
+                previous = key
+
+        snapshot = self.read(sheet_name)
+        if new_rows:
+            snapshot = pl.concat([snapshot, utils.frame_from_values([header] + new_rows, schema)])
+        # The stored tail checksum always covers the last `overlap` rows, recompute it over old and new rows
+        all_tail = tail[max(len(tail) - self.overlap, 0):]
+        new_meta = dict(meta, rows=meta['rows'] + len(new_rows), tail_checksum=rows_checksum(all_tail), synced_at=now)
+        if new_rows and key_column in header:
+            new_meta['last_key'] = previous
+        self.write(sheet_name, snapshot, new_meta)
+        return snapshot
+
+    @tracing.traced('snapshots.load_many')
+    def load_many(self, workbook: gspread.spreadsheet.Spreadsheet, sheets: dict[str, dict]) -> dict[str, pl.DataFrame]:
+        """Serve fresh snapshots from disk, syncing stale ones with a single batched request"""
+        now = time.time()
+        frames = {}
+        full, tails = [], {}
+        for sheet_name, schema in sheets.items():
+            meta = self.read_meta(sheet_name, schema)
+            if self.is_fresh(meta, now):
+                frames[sheet_name] = self.read(sheet_name)
+            elif meta is not None and sheet_name in self.incremental and now - meta['full_sync_at'] < self.full_refresh_after:
+                tails[sheet_name] = meta
+            else:
+                full.append(sheet_name)
+
+        ranges = [utils.sheet_range(name) for name in full]
+        for sheet_name, meta in tails.items():
+            last_column = column_letter(max(len(meta['header']), 1))
+            ranges.append(f"{utils.sheet_range(sheet_name)}!1:1")
+            ranges.append(f"{utils.sheet_range(sheet_name)}!A{self.tail_start(meta) + 2}:{last_column}")
+        if not ranges:
+            return {sheet_name: frames[sheet_name] for sheet_name in sheets}
+        value_ranges = iter(workbook.values_batch_get(ranges).get('valueRanges', []))
+
+        for sheet_name in full:
+            values = next(value_ranges).get('values', [])
+            frames[sheet_name] = utils.frame_from_values(values, sheets[sheet_name])
+            tracing.TRACER.add('rows_loaded', frames[sheet_name].height, sheet=sheet_name)
+            self.write(sheet_name, frames[sheet_name], self.make_meta(sheet_name, sheets[sheet_name], values, now, now))
+
+        refresh = []
+        for sheet_name, meta in tails.items():
+            header = next(value_ranges).get('values', [[]])[0]
+            tail = next(value_ranges).get('values', [])
+            frame = self.apply_tail(sheet_name, sheets[sheet_name], meta, header, tail, now)
+            if frame is None:
+                refresh.append(sheet_name)
+            else:
+                frames[sheet_name] = frame
+                tracing.TRACER.add('rows_loaded', max(len(tail) - (meta['rows'] - self.tail_start(meta)), 0), sheet=sheet_name)
+
+        if refresh:
+            value_ranges = workbook.values_batch_get([utils.sheet_range(name) for name in refresh]).get('valueRanges', [])
+            for sheet_name, value_range in zip(refresh, value_ranges):
+                values = value_range.get('values', [])
+                frames[sheet_name] = utils.frame_from_values(values, sheets[sheet_name])
+                tracing.TRACER.add('rows_loaded', frames[sheet_name].height, sheet=sheet_name)
+                self.write(sheet_name, frames[sheet_name], self.make_meta(sheet_name, sheets[sheet_name], values, now, now))
+
+        return {sheet_name: frames[sheet_name] for sheet_name in sheets}
@@ -0,0 +1,270 @@
+from __future__ import annotations
+
+import re
+import time
+import random
+import threading
+import collections
+import polars as pl
+from pathlib import Path
+from . import utils
+from .registry import Registry
+
+# duckdb is imported by DuckDBSource when it first reads, so the other backends never load it
+
+A1_RANGE = re.compile(r"^(?:'(?P<quoted>(?:[^']|'')+)'|(?P<plain>[^!]+))(?:!(?P<cells>.+))?$")
+ROW_NUMBER = re.compile(r'(\d+)')
+
+
+def parse_range(a1: str) -> tuple[str, int, int | None]:
+    """Sheet name and 1-based first and last row of an A1 range; columns are not narrowed
+
+    'Main' -> ('Main', 1, None), "'Main'!1:1" -> ('Main', 1, 1), "'Main'!A95:Q" -> ('Main', 95, None)
+    """
+    match = A1_RANGE.match(a1)
+    if match is None:
+        raise ValueError(f'Not an A1 range: {a1!r}')
+    sheet_name = match['quoted'].replace("''", "'") if match['quoted'] else match['plain']
+    if not match['cells']:
+        return sheet_name, 1, None
+    first, _, last = match['cells'].partition(':')
+    first_row = ROW_NUMBER.search(first)
+    last_row = ROW_NUMBER.search(last or first)
+    return sheet_name, int(first_row[1]) if first_row else 1, int(last_row[1]) if last_row else None
+
+
+def values_from_frame(frame: pl.DataFrame) -> list[list]:
+    """Header + rows grid of strings, the shape the Sheets values API returns"""
+    strings = frame.select(pl.all().cast(pl.String).fill_null(''))
+    return [strings.columns] + [list(row) for row in strings.iter_rows()]
+
+
+class DataSource:
+    """Where the dashboard's sheets come from
+
+    A source answers the Sheets values API, `values_batch_get` with A1 ranges, so everything
+    built on it (batched loading, the sheet cache, incremental snapshots) works unchanged against
+    any backend. Sources that hold typed tables also provide `load_frames`, which `utils.load_many`
+    prefers. `remote` marks sources slow enough to be worth snapshotting locally.
+    """
+
+    id = 'source'
+    remote = False
+
+    def sheet_values(self, sheet_name: str) -> list[list]:
+        raise NotImplementedError
+
+    def values_batch_get(self, ranges: list[str], params: dict | None = None) -> dict:
+        value_ranges = []
+        for a1 in ranges:
+            sheet_name, first_row, last_row = parse_range(a1)
+            values = self.sheet_values(sheet_name)[first_row - 1:last_row]
+            value_ranges.append({'range': a1, 'values': values})
+        return {'valueRanges': value_ranges}
+
+    def worksheet(self, sheet_name: str):
+        raise NotImplementedError(f'{type(self).__name__} is read-only')
+
+
+class TableSource(DataSource):
+    """A source that stores each sheet as a table and reads it straight into a typed frame"""
+
+    def read_frame(self, sheet_name: str) -> pl.DataFrame:
+        raise NotImplementedError
+
+    def write_frames(self, frames: dict[str, pl.DataFrame]) -> None:
+        raise NotImplementedError
+
+    def load_frames(self, sheets: dict[str, dict]) -> dict[str, pl.DataFrame]:
+        return {sheet_name: utils.cast_frame(self.read_frame(sheet_name), schema) for sheet_name, schema in sheets.items()}
+
+    def sheet_values(self, sheet_name: str) -> list[list]:
+        return values_from_frame(self.read_frame(sheet_name))
+
+
+class LocalSource(TableSource):
+    """Sheets stored as `<directory>/<sheet name>.parquet` (or `.csv`), e.g. an export of the workbook"""
+
+    def __init__(self, directory: str | Path, file_format: str = 'parquet'):
+        if file_format not in ('parquet', 'csv'):
+            raise ValueError(f"file_format must be 'parquet' or 'csv', not {file_format!r}")
+        self.directory = Path(directory)
+        self.file_format = file_format
+
+    @property
+    def id(self) -> str:
+        return f'{self.file_format}:{self.directory}'
+
+    def path(self, sheet_name: str) -> Path:
+        return self.directory / f'{sheet_name}.{self.file_format}'
+
+    def read_frame(self, sheet_name: str) -> pl.DataFrame:
+        if self.file_format == 'csv':
+            # Read as text like the Sheets API, the schema decides the types
+            return pl.read_csv(self.path(sheet_name), infer_schema=False)
+        return pl.read_parquet(self.path(sheet_name), memory_map=True)
+
+    def write_frames(self, frames: dict[str, pl.DataFrame]) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for sheet_name, frame in frames.items():
+            tmp_path = self.path(sheet_name).with_suffix(f'.{self.file_format}.tmp')
+            if self.file_format == 'csv':
+                frame.write_csv(tmp_path)
+            else:
+                frame.write_parquet(tmp_path)
+            tmp_path.replace(self.path(sheet_name))
+
+
+class DuckDBSource(TableSource):
+    """Sheets stored as tables of the same name in a DuckDB database file"""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+
+    @property
+    def id(self) -> str:
+        return f'duckdb:{self.path}'
+
+    def connect(self, read_only: bool = True):
+        import duckdb
+
+        return duckdb.connect(str(self.path), read_only=read_only)
+
+    @staticmethod
+    def quote(identifier: str) -> str:
+        return '"' + identifier.replace('"', '""') + '"'
+
+    def read_frame(self, sheet_name: str) -> pl.DataFrame:
+        with self.connect() as connection:
+            return connection.execute(f'SELECT * FROM {self.quote(sheet_name)}').pl()
+
+    def write_frames(self, frames: dict[str, pl.DataFrame]) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.connect(read_only=False) as connection:
+            for sheet_name, frame in frames.items():
+                connection.register('incoming', frame.to_arrow())
+                connection.execute(f'CREATE OR REPLACE TABLE {self.quote(sheet_name)} AS SELECT * FROM incoming')
+                connection.unregister('incoming')
+
+
+class QuotaExceededError(Exception):
+    """Raised by FakeSheetsSource the way the Sheets API answers with HTTP 429"""
+
+    status_code = 429
+
+
+class FakeSheetsSource(DataSource):
+    """In-process stand-in for a Google Sheets workbook, for offline development and load tests
+
+    Serves header + rows grids through the same calls the app makes on a real workbook, after
+    `latency` seconds (plus up to `jitter`). Requests past `quota_per_minute` in a sliding
+    minute, and a random `error_rate` share of the rest, fail with QuotaExceededError.
+    """
+
+    remote = True
+
+    def __init__(self, sheets: dict[str, list[list]], latency: float = 0.0, jitter: float = 0.0, quota_per_minute: int | None = None,
+                 error_rate: float = 0.0, seed: int | None = None, workbook_id: str = 'fake', timer=time.monotonic, sleep=time.sleep):
+        self.sheets = dict(sheets)
+        self.latency = latency
+        self.jitter = jitter
+        self.quota_per_minute = quota_per_minute
+        self.error_rate = error_rate
+        self.id = workbook_id
+        self.timer = timer
+        self.sleep = sleep
+        self.requests = collections.deque()
+        self.request_count = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_directory(cls, directory: str | Path, **kwargs) -> FakeSheetsSource:
+        """Seed the fake workbook from the Parquet or CSV files written by a LocalSource"""
+        sheets = {}
+        for path in sorted(Path(directory).iterdir()):
+            if path.suffix in ('.parquet', '.csv'):
+                sheets[path.stem] = values_from_frame(LocalSource(path.parent, path.suffix[1:]).read_frame(path.stem))
+        return cls(sheets, **kwargs)
+
+    def request(self) -> None:
+        """Account for one API request, sleeping for the simulated latency or raising a quota error"""
+        with self._lock:
+            now = self.timer()
+            while self.requests and now - self.requests[0] >= 60:
+                self.requests.popleft()
+            self.request_count += 1
+            over_quota = self.quota_per_minute is not None and len(self.requests) >= self.quota_per_minute
+            if not over_quota:
+                self.requests.append(now)
+            failed = over_quota or self._random.random() < self.error_rate
+            delay = self.latency + self._random.uniform(0, self.jitter)
+        if delay:
+            self.sleep(delay)
+        if failed:
+            raise QuotaExceededError('Quota exceeded for quota metric Read requests per minute per user')
+
+    def sheet_values(self, sheet_name: str) -> list[list]:
+        return self.sheets[sheet_name]
+
+    def values_batch_get(self, ranges: list[str], params: dict | None = None) -> dict:
+        self.request()
+        return super().values_batch_get(ranges, params)
+
+    def worksheet(self, sheet_name: str) -> FakeWorksheet:
+        self.request()
+        self.sheets.setdefault(sheet_name, [])
+        return FakeWorksheet(self, sheet_name)
+
+
+class FakeWorksheet:
+    """The worksheet calls the app makes, against a FakeSheetsSource"""
+
+    def __init__(self, source: FakeSheetsSource, sheet_name: str):
+        self.source = source
+        self.sheet_name = sheet_name
+
+    def get(self) -> list[list]:
+        self.source.request()
+        return self.source.sheets[self.sheet_name]
+
+    def col_values(self, column: int) -> list:
+        self.source.request()
+        return [row[column - 1] for row in self.source.sheets[self.sheet_name] if len(row) >= column]
+
+    def append_rows(self, rows: list[list], value_input_option: str | None = None) -> None:
+        self.source.request()
+        with self.source._lock:
+            self.source.sheets[self.sheet_name].extend([str(value) for value in row] for row in rows)
+
+    def append_row(self, row: list, value_input_option: str | None = None) -> None:
+        self.append_rows([row], value_input_option)
+
+
+SOURCES = Registry()
+
+def make_source(backend: str, config: dict) -> DataSource:
+    if backend in ('parquet', 'csv'):
+        return LocalSource(config['path'], backend)
+    if backend == 'duckdb':
+        return DuckDBSource(config['path'])
+    if backend == 'fake':
+        options = {name: config[name] for name in ('latency', 'jitter', 'quota_per_minute', 'error_rate', 'seed') if name in config}
+        return FakeSheetsSource.from_directory(config['path'], **options)
+    raise ValueError(f'Unknown data source backend {backend!r}')
+
+def from_config(env: dict, workbook_name: str) -> DataSource:
+    """The data source chosen by the [source] section of the secrets, one per backend and path
+
+    backend is 'gsheets' (the default), 'parquet' or 'csv' (a directory of sheet files),
+    'duckdb' (a database file) or 'fake' (a FakeSheetsSource seeded from a directory of sheet
+    files, with optional latency, jitter, quota_per_minute and error_rate).
+    """
+    config = env.get('source', {})
+    backend = config.get('backend', 'gsheets')
+    if backend == 'gsheets':
+        from . import client
+
+        return client.get_shared_workbook(env['connections']['gsheets'], env['scopes']['scope'], workbook_name)
+
+    return SOURCES.get((backend, config.get('path')), lambda: make_source(backend, config))
@@ -0,0 +1,313 @@
+from __future__ import annotations
+
+import html
+import json
+import hashlib
+import itertools
+import datetime as dt
+import polars as pl
+import plotly
+import plotly.colors
+from plotly.offline import get_plotlyjs
+from pathlib import Path
+from typing import NamedTuple
+from . import utils, aggregates, panels, countries, tracing, chart_functions as chart
+
+# Bump when the shape of the exported files changes, so every view is written again
+EXPORT_VERSION = 1
+DEFAULT_VIEW = 'all'
+
+
+class ExportResult(NamedTuple):
+    written: list[str]
+    unchanged: int
+    removed: list[str]
+
+
+def chart_options(charts: dict) -> dict:
+    """Chart settings from the [charts] section, with the dashboard's defaults"""
+    return {
+        'max_points': charts.get('max_scatter_points', 5000),
+        'heatmap': {
+            'max_rows': charts.get('heatmap_max_topics', 40),
+            'max_columns': charts.get('heatmap_max_publishers', 30),
+            'min_count': charts.get('heatmap_min_count', 1),
+            'order': charts.get('heatmap_order', 'label'),
+        },
+    }
+
+
+def view_id(years: list, all_years: list) -> str:
+    return DEFAULT_VIEW if list(years) == list(all_years) else '-'.join(map(str, years))
+
+
+def year_selections(years: list, combinations: bool = False, max_views: int = 256) -> list[list]:
+    """The default all-years selection, then with `combinations` every smaller one, fewest years first, up to `max_views` in all"""
+    selections = [list(years)]
+    if combinations:
+        for size in range(1, len(years)):
+            for subset in itertools.combinations(years, size):
+                if len(selections) >= max_views:
+                    return selections
+                selections.append(list(subset))
+    return selections
+
+
+def digest(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, default=str, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def year_fingerprints(main_df: pl.DataFrame) -> dict:
+    """Row count and row-hash sum per year, so a view only changes with the years it shows"""
+    hashed = main_df.select('Year', pl.Series('hash', main_df.hash_rows(seed=0)))
+    per_year = hashed.group_by('Year').agg(pl.len(), pl.col('hash').sum())
+    return {year: [rows, int(total)] for year, rows, total in per_year.iter_rows()}
+
+
+def figure_data(figure) -> dict:
+    figure.update_layout(dragmode='pan')
+    return json.loads(figure.to_json())
+
+
+def fit_text(fit: utils.LinearFit) -> str | None:
+    if fit.r is None:
+        return None
+    r = round(fit.r, 3)
+    return f'r = {r} {utils.describe_pearsons_r(r)}'
+
+
+def selection_view(main_df: pl.DataFrame, year_aggregates: aggregates.YearAggregates, years: list, options: dict) -> dict:
+    """The selection-dependent panels of the dashboard for one year selection, with the same figures"""
+    dashboard = panels.collect_panels(main_df, year_aggregates, years, scopes=('selection',))
+    tooltip = ['Title', 'Author', 'Month', 'Year']
+    return {
+        'years': years,
+        'figures': {
+            'publisher_stats': figure_data(chart.make_bar_group(dashboard['publisher_stats'], 'Publisher', 'Score', 'Title', 'Score', 'Book Count')),
+            'heatmap': figure_data(chart.make_heatmap(dashboard['heatmap'], **options['heatmap'])),
+            'score_scatter': figure_data(chart.make_scatter(
+                dashboard['scatter'], 'Our score conversion', 'Goodreads score', trend=dashboard['score_fit'], tooltip=tooltip,
+                reference_line=([0,5], [0,5], "Equal Score"), max_points=options['max_points'],
+            )),
+            'pages_scatter': figure_data(chart.make_scatter(
+                dashboard['scatter'], 'Score', 'Pages', trend=dashboard['pages_fit'], tooltip=tooltip, max_points=options['max_points'],
+            )),
+            'gender': figure_data(chart.make_pie(dashboard['gender_counts'], 'Author gender', 'count', plotly.colors.qualitative.Pastel2)),
+            'debut': figure_data(chart.make_pie(dashboard['debut_counts'], 'Debut?', 'count', plotly.colors.qualitative.Pastel2[2:])),
+            'distributions': figure_data(chart.make_histograms({
+                "Number of Pages Distribution": (*dashboard['pages_histogram'], "Pages"),
+                "Score Distribution": (*dashboard['score_histogram'], "Score"),
+            })),
+        },
+        'fits': {'score_fit': fit_text(dashboard['score_fit']), 'pages_fit': fit_text(dashboard['pages_fit'])},
+        'selected_books': dashboard['selected_books'].with_columns(pl.col('Date').dt.strftime('%Y-%m')).to_dicts(),
+    }
+
+
+def all_time_view(main_df: pl.DataFrame, author_df: pl.DataFrame, year_aggregates: aggregates.YearAggregates) -> dict:
+    """The panels over all the books: the all-time stats and the country-of-birth map"""
+    all_time = panels.collect_panels(main_df, year_aggregates, None, scopes=('all_time',))
+    map_group = countries.CountryCounts(author_df, countries.get_country_table()).frame
+    return {
+        'metrics': all_time['metrics'],
+        'top_scorers': all_time['top_scorers'].with_columns(pl.col('Date').dt.strftime('%d-%m-%Y')).to_dicts(),
+        'figures': {'countries': figure_data(chart.make_choropleth(map_group, "Alpha3Code", "Count", "Country of Birth"))},
+    }
+
+
+def write_if_changed(path: Path, content: str | bytes) -> bool:
+    """Atomically replace `path` unless it already holds `content`, so unchanged files keep their mtime for CDN syncs"""
+    data = content.encode('utf-8') if isinstance(content, str) else content
+    if path.exists() and path.read_bytes() == data:
+        return False
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + '.tmp')
+    tmp_path.write_bytes(data)
+    tmp_path.replace(path)
+    return True
+
+
+def read_manifest(path: Path) -> dict:
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+@tracing.traced()
+def export_bundle(directory: str | Path, main_df: pl.DataFrame, author_df: pl.DataFrame, title: str = "London's Friendly Bookclub",
+                  charts: dict | None = None, combinations: bool = False, max_views: int = 256, members: int | None = None,
+                  meetup_url: str | None = None) -> ExportResult:
+    """Write the dashboard as a static bundle a CDN can serve: index.html, plotly.min.js, manifest.json,
+    all_time.json and views/<years>.json per year selection
+
+    Every view records a digest of what it was built from: the rows of its own years, the histogram
+    edges (shared by all views), the chart settings and the exporter and Plotly versions. Views whose
+    digest is unchanged since the last export are skipped, files whose content is unchanged are not
+    rewritten, and views no longer exported are removed. `main_df` is the prepared 'Main' sheet.
+    """
+    directory = Path(directory)
+    previous = read_manifest(directory / 'manifest.json').get('views', {})
+    year_aggregates = aggregates.YearAggregates(main_df)
+    options = chart_options(charts or {})
+    edges = {column: histogram[0].tolist() for column, histogram in year_aggregates.histograms.items()}
+    base = [EXPORT_VERSION, plotly.__version__, options, edges]
+    fingerprints = year_fingerprints(main_df)
+    written, unchanged = [], 0
+
+    views = {}
+    for years in year_selections(year_aggregates.years, combinations, max_views):
+        name = view_id(years, year_aggregates.years)
+        path = f'views/{name}.json'
+        views[name] = {'years': years, 'path': path, 'digest': digest(base, years, [fingerprints[year] for year in years])}
+        if previous.get(name, {}).get('digest') == views[name]['digest'] and (directory / path).exists():
+            unchanged += 1
+            continue
+        if write_if_changed(directory / path, json.dumps(selection_view(main_df, year_aggregates, years, options))):
+            written.append(path)
+
+    all_time = {'path': 'all_time.json', 'digest': digest(
+        base, aggregates.frame_fingerprint(main_df), aggregates.frame_fingerprint(author_df), title, members, meetup_url,
+    )}
+    if previous.get('all_time', {}).get('digest') == all_time['digest'] and (directory / all_time['path']).exists():
+        unchanged += 1
+    else:
+        content = {'title': title, 'members': members, 'meetup_url': meetup_url, **all_time_view(main_df, author_df, year_aggregates)}
+        if write_if_changed(directory / all_time['path'], json.dumps(content, default=str)):
+            written.append(all_time['path'])
+
+    for path, content in (('index.html', index_html(title)), ('plotly.min.js', get_plotlyjs())):
+        if write_if_changed(directory / path, content):
+            written.append(path)
+
+    removed = []
+    for name, view in previous.items():
+        if name not in views and name != 'all_time' and (directory / view['path']).exists():
+            (directory / view['path']).unlink()
+            removed.append(view['path'])
+
+    entries = {**views, 'all_time': all_time}
+    if written or removed or entries != previous:
+        manifest = {
+            'version': EXPORT_VERSION,
+            'generated_at': dt.datetime.now(dt.timezone.utc).isoformat(timespec='seconds'),
+            'years': year_aggregates.years,
+            'default_view': DEFAULT_VIEW,
+            'views': entries,
+        }
+        write_if_changed(directory / 'manifest.json', json.dumps(manifest, indent=1))
+    return ExportResult(written, unchanged, removed)
+
+
+def index_html(title: str) -> str:
+    """The bundle's page: reads manifest.json, draws the year picker and loads the pre-rendered views"""
+    return INDEX_TEMPLATE.replace('{{title}}', html.escape(title))
+
+
+INDEX_TEMPLATE = '''<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{{title}}</title>
+<script src="plotly.min.js"></script>
+<style>
+body { font-family: sans-serif; margin: 0; display: flex; background: #0e1117; color: #fafafa; }
+aside { width: 260px; padding: 1.5rem; background: #262730; min-height: 100vh; box-sizing: border-box; }
+main { flex: 1; padding: 1.5rem; display: grid; grid-template-columns: repeat(2, minmax(0, 1fr)); gap: 1.5rem; }
+section.wide { grid-column: 1 / -1; }
+table { border-collapse: collapse; width: 100%; font-size: 0.9rem; }
+td, th { padding: 0.2rem 0.5rem; border-bottom: 1px solid #333; text-align: left; }
+.metric { margin-bottom: 1rem; } .metric b { font-size: 1.6rem; display: block; }
+#message { color: #ff4b4b; }
+a { color: #ff4b4b; }
+</style>
+</head>
+<body>
+<aside>
+<h2>{{title}}</h2>
+<p id="about"></p>
+<fieldset id="years"><legend>Select Year(s)</legend></fieldset>
+<p id="message"></p>
+<p><a id="meetup" href="#">Meetup</a></p>
+</aside>
+<main>
+<section><h3>Selected Books</h3><div style="max-height:525px;overflow:auto"><table id="selected_books"></table></div></section>
+<section><h3>Mean Score &amp; Book Count by Publisher</h3><div id="publisher_stats"></div></section>
+<section><h3>London Bookclub Score vs Goodreads</h3><div id="score_scatter"></div><p id="score_fit"></p>
+<h3>Score vs Number of Pages</h3><div id="pages_scatter"></div><p id="pages_fit"></p></section>
+<section><h3>Heatmap - Publisher &amp; Topics</h3><div id="heatmap"></div></section>
+<section><h3>Author Gender</h3><div id="gender"></div><h3>Debut Novel?</h3><div id="debut"></div></section>
+<section><h3>Distributions</h3><div id="distributions"></div></section>
+<section class="wide"><h3>All-time stats</h3><div id="metrics"></div></section>
+<section class="wide"><h3>Author Country of Birth</h3><div id="countries"></div></section>
+</main>
+<script>
+const config = {responsive: true, displaylogo: false};
+let manifest;
+
+function plot(id, figure) { Plotly.react(id, figure.data, figure.layout, config); }
+function text(id, value) { document.getElementById(id).textContent = value || ''; }
+async function load(view) { return (await fetch(view.path + '?v=' + view.digest.slice(0, 16))).json(); }
+
+function showSelection(view) {
+  for (const [id, figure] of Object.entries(view.figures)) plot(id, figure);
+  text('score_fit', view.fits.score_fit);
+  text('pages_fit', view.fits.pages_fit);
+  const table = document.getElementById('selected_books');
+  table.replaceChildren();
+  table.insertRow().innerHTML = '<th>Title</th><th>Date</th><th>Score</th>';
+  for (const book of view.selected_books) {
+    const row = table.insertRow();
+    for (const column of ['Title', 'Date', 'Score']) row.insertCell().textContent = book[column];
+  }
+}
+
+function showAllTime(allTime) {
+  text('about', 'This is a dashboard presenting some data on books chosen to read, and subsquently discussed and scored by '
+    + allTime.title + (allTime.members ? ' which has ' + allTime.members + ' members' : ''));
+  if (allTime.meetup_url) document.getElementById('meetup').href = allTime.meetup_url;
+  const [top, second] = allTime.top_scorers;
+  const metrics = [
+    ['Highest Score: ' + top.Title + ' by ' + top.Author + ', read ' + top.Date, top.Score + (second ? ' (+' + (top.Score - second.Score).toFixed(4) + ')' : '')],
+    ['Total pages read', allTime.metrics.total_pages.toLocaleString()],
+    ['Total books read', allTime.metrics.books],
+    ['Total Authors', allTime.metrics.authors],
+    ['Total Publishers', allTime.metrics.publishers],
+  ];
+  const container = document.getElementById('metrics');
+  container.replaceChildren(...metrics.map(([label, value]) => {
+    const metric = document.createElement('div');
+    metric.className = 'metric';
+    metric.append(label, Object.assign(document.createElement('b'), {textContent: value}));
+    return metric;
+  }));
+  plot('countries', allTime.figures.countries);
+}
+
+async function selectionChanged() {
+  const years = manifest.years.filter(year => document.getElementById('year-' + year).checked);
+  const name = years.length === manifest.years.length ? manifest.default_view : years.join('-');
+  if (!years.length) return text('message', 'Select at least one year');
+  if (!manifest.views[name]) return text('message', 'This selection is not pre-rendered, use the live dashboard for it');
+  text('message', '');
+  showSelection(await load(manifest.views[name]));
+}
+
+(async () => {
+  manifest = await (await fetch('manifest.json', {cache: 'no-cache'})).json();
+  const picker = document.getElementById('years');
+  for (const year of manifest.years) {
+    const label = document.createElement('label');
+    const box = Object.assign(document.createElement('input'), {type: 'checkbox', id: 'year-' + year, checked: true});
+    box.addEventListener('change', selectionChanged);
+    label.append(box, ' ' + year, document.createElement('br'));
+    picker.append(label);
+  }
+  showAllTime(await load(manifest.views.all_time));
+  await selectionChanged();
+})();
+</script>
+</body>
+</html>
+'''
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from contextlib import closing
+from . import utils
+from .client import SharedWorkbook
+from .registry import Registry
+
+
+def submission_key(row: list) -> str:
+    """Idempotency key for a suggestion, so resubmitting the same form does not queue it twice"""
+    return hashlib.sha256(json.dumps(row, default=str).encode('utf-8')).hexdigest()[:32]
+
+
+class SuggestionSpool:
+    """Durable local queue of suggestions, flushed to the sheet in batches on a background thread
+
+    Submissions are written to a SQLite file and the form returns immediately. The worker sends
+    pending rows with a single `append_rows` call per batch, each row carrying its idempotency key
+    in the column after the data. Rows are counted as attempted before they are sent, and on any
+    later try the keys already present in the sheet are read back first, so a batch that landed but
+    was never acknowledged (a lost response, or a crash before it was marked sent) is not sent
+    again. Values are appended RAW, so form input is never evaluated as a formula. After each batch
+    the sheet is dropped from `cache`, the club's sheet cache, so its pages read the new rows. Failures back off exponentially up to `max_backoff` seconds; rows stay in the spool,
+    across restarts, until the sheet has them.
+    """
+
+    def __init__(self, path: str | Path, workbook: SharedWorkbook, cache: utils.SheetCache | None = None,
+                 sheet_name: str = 'Suggestions', key_column: int = 9, batch_size: int = 50, interval: float = 1,
+                 max_backoff: float = 300):
+        self.path = Path(path)
+        self.workbook = workbook
+        self.cache = cache
+        self.sheet_name = sheet_name
+        self.key_column = key_column
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self._pending = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS suggestions ('
+                'key TEXT PRIMARY KEY, row TEXT NOT NULL, created_at REAL NOT NULL, '
+                'attempts INTEGER NOT NULL DEFAULT 0, sent_at REAL)'
+            )
+
+    def connect(self) -> sqlite3.Connection:
+        return closing(sqlite3.connect(self.path, timeout=10, isolation_level=None))
+
+    def enqueue(self, row: list, key: str | None = None) -> str:
+        """Store a suggestion durably and wake the worker; returns its idempotency key"""
+        key = key or submission_key(row)
+        with self.connect() as conn:
+            conn.execute(
+                'INSERT OR IGNORE INTO suggestions (key, row, created_at) VALUES (?, ?, ?)',
+                (key, json.dumps(row, default=str), time.time()),
+            )
+        self.start()
+        self._pending.set()
+        return key
+
+    def pending(self, limit: int | None = None) -> list[tuple[str, list, int]]:
+        with self.connect() as conn:
+            rows = conn.execute(
+                'SELECT key, row, attempts FROM suggestions WHERE sent_at IS NULL ORDER BY created_at, key LIMIT ?',
+                (limit if limit is not None else -1,),
+            ).fetchall()
+        return [(key, json.loads(row), attempts) for key, row, attempts in rows]
+
+    def mark_sent(self, keys: list[str]) -> None:
+        with self.connect() as conn:
+            conn.executemany('UPDATE suggestions SET sent_at = ? WHERE key = ?', [(time.time(), key) for key in keys])
+
+    def mark_attempted(self, keys: list[str]) -> None:
+        with self.connect() as conn:
+            conn.executemany('UPDATE suggestions SET attempts = attempts + 1 WHERE key = ?', [(key,) for key in keys])
+
+    def keys_in_sheet(self) -> set[str]:
+        return set(self.workbook.worksheet(self.sheet_name).col_values(self.key_column))
+
+    def flush(self) -> int:
+        """Send one batch of pending rows, returning how many were confirmed in the sheet"""
+        with self._flush_lock:
+            batch = self.pending(self.batch_size)
+            if not batch:
+                return 0
+            confirmed = 0
+            if any(attempts for _, _, attempts in batch):
+                in_sheet = self.keys_in_sheet()
+                landed = [key for key, _, _ in batch if key in in_sheet]
+                self.mark_sent(landed)
+                confirmed += len(landed)
+                batch = [item for item in batch if item[0] not in in_sheet]
+            if batch:
+                keys = [key for key, _, _ in batch]
+                # Pad to the key column so the key always lands in the same place
+                rows = [row[:self.key_column - 1] + [''] * (self.key_column - 1 - len(row)) + [key] for key, row, _ in batch]
+                # Counted before sending, so a crash before mark_sent still makes the next try check the sheet
+                self.mark_attempted(keys)
+                # RAW so public form input is stored as typed, never evaluated as a formula
+                self.workbook.worksheet(self.sheet_name).append_rows(rows, value_input_option='RAW')
+                self.mark_sent(keys)
+                confirmed += len(keys)
+            if self.cache is not None:
+                self.cache.invalidate(self.sheet_name)
+            return confirmed
+
+    def run(self) -> None:
+        failures = 0
+        while not self._stop.is_set():
+            try:
+                while self.flush():
+                    pass
+                failures = 0
+            except Exception:
+                failures += 1
+            self._pending.clear()
+            if failures:
+                self._stop.wait(min(self.interval * 2 ** failures, self.max_backoff))
+            elif self.pending(1):
+                self._stop.wait(self.interval)
+            else:
+                self._pending.wait(self.max_backoff)
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.run, name='suggestion-spool', daemon=True)
+                self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._pending.set()
+
+
+SPOOLS = Registry()
+
+def get_spool(path: str | Path, workbook: SharedWorkbook, **kwargs) -> SuggestionSpool:
+    """The spool for a SQLite file, with its worker started"""
+    spool = SPOOLS.get(str(Path(path).resolve()), lambda: SuggestionSpool(path, workbook, **kwargs))
+    spool.start()
+    return spool
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+from pathlib import Path
+from . import utils, sources, tracing
+from .registry import Registry
+
+DEFAULT_CLUB = {'title': "London's Friendly Bookclub", 'workbook': 'NLFB'}
+# Sections of the secrets a club can override for itself
+CLUB_SECTIONS = ('source', 'cache', 'timeouts', 'charts', 'engine')
+
+
+def clubs_from_config(env: dict) -> tuple[str, dict[str, dict]]:
+    """Default club name and each club's settings from the [clubs] section of the secrets
+
+    Without a [clubs] section the deployment serves the one club it always has, keeping its
+    snapshots where they were.
+    """
+    config = env.get('clubs', {})
+    clubs = {name: club for name, club in config.items() if isinstance(club, dict)}
+    if not clubs:
+        return 'nlfb', {'nlfb': {**DEFAULT_CLUB, 'shared_directory': True}}
+    return config.get('default', next(iter(clubs))), clubs
+
+
+def club_env(env: dict, name: str, club: dict) -> dict:
+    """The secrets as one club sees them: its spreadsheet, its own sections and directories"""
+    club_env = dict(env)
+    if club.get('spreadsheet'):
+        connections = env.get('connections', {})
+        club_env['connections'] = {**connections, 'gsheets': {**connections.get('gsheets', {}), 'spreadsheet': club['spreadsheet']}}
+    for section in CLUB_SECTIONS:
+        if section in club:
+            club_env[section] = {**env.get(section, {}), **club[section]}
+    if not club.get('shared_directory'):
+        directory = Path(club.get('directory', Path(env.get('snapshots', {}).get('directory', '.snapshots')) / name))
+        club_env['snapshots'] = {**env.get('snapshots', {}), 'directory': str(directory)}
+        engine_path = club.get('engine', {}).get('path', str(directory / 'engine.duckdb'))
+        club_env['engine'] = {**club_env.get('engine', {}), 'path': engine_path}
+    return club_env
+
+
+class Tenant:
+    """One book club served by the deployment
+
+    Everything kept per club hangs off its Tenant: the secrets as the club sees them, a sheet
+    cache of its own bounded by [cache] max_mb, and the directory for its snapshots, Meetup
+    count, suggestions spool and DuckDB engine. Workbooks come from the process-wide pool, so
+    clubs on one service account share an authorised client, and every club shares the process
+    and its IO pool.
+    """
+
+    def __init__(self, name: str, env: dict, club: dict):
+        self.name = name
+        self.title = club.get('title', name)
+        self.workbook_name = club.get('workbook', name)
+        self.env = club_env(env, name, club)
+        self.directory = Path(self.env.get('snapshots', {}).get('directory', '.snapshots'))
+        cache = self.env.get('cache', {})
+        self.cache = utils.SheetCache(ttl=cache.get('ttl', 600), max_bytes=int(cache.get('max_mb', 256) * 2 ** 20))
+        tracing.TRACER.register('cache', {'cache': 'sheets', 'club': name}, self.cache.stats)
+
+    @property
+    def workbook(self) -> sources.DataSource:
+        return sources.from_config(self.env, self.workbook_name)
+
+    def scoped(self, name: str) -> str:
+        """Name for the club's entry in a process-wide registry, e.g. aggregates.get_year_aggregates"""
+        return f'{self.name}/{name}'
+
+
+TENANTS = Registry()
+
+def make_tenant(env: dict, name: str, club: dict) -> Tenant:
+    if 'max_workbooks' in env.get('clubs', {}):
+        from . import client
+
+        client.WORKBOOKS.resize(env['clubs']['max_workbooks'])
+    return Tenant(name, env, club)
+
+def get_tenant(env: dict, name: str | None = None) -> Tenant:
+    """The Tenant for a club, the default one when `name` is None; unknown names raise KeyError"""
+    default, clubs = clubs_from_config(env)
+    name = name or default
+    if name not in clubs:
+        raise KeyError(name)
+    return TENANTS.get(name, lambda: make_tenant(env, name, clubs[name]))
+
+
+def from_query_params(env: dict) -> Tenant:
+    """The club picked by the page's ?club= parameter, remembered for the session's other pages
+
+    An unknown club stops the page with an error.
+    """
+    import streamlit as st
+
+    name = st.query_params.get('club') or st.session_state.get('club')
+    try:
+        tenant = get_tenant(env, name)
+    except KeyError:
+        st.error(f'There is no book club called {name!r} here')
+        st.stop()
+    st.session_state['club'] = tenant.name
+    if name:
+        st.query_params['club'] = tenant.name
+    return tenant
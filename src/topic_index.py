@@ -0,0 +1,115 @@
+import numpy as np
+import polars as pl
+
+
+def dictionary_encode(column: pl.Series) -> tuple[list, np.ndarray]:
+    """Sorted distinct values (null first, if present) and each value's integer id"""
+    values = column.unique().sort(nulls_last=False)
+    ids = (
+        column.to_frame('value')
+        .join(pl.DataFrame({'value': values, 'id': np.arange(len(values), dtype=np.int32)}), on='value', how='left',
+              nulls_equal=True, maintain_order='left')
+    )['id']
+    return values.to_list(), ids.to_numpy()
+
+
+class TopicIndex:
+    """Inverted index of the comma-joined 'Topics' column, built once per load
+
+    Topics, publishers and years are dictionary-encoded to integer ids. Rows are numbered in year
+    order, so every year is one contiguous range of row positions, and each topic keeps a sorted
+    posting list of the positions of its books. Count panels read the non-zero (publisher, topic,
+    count) cells of each year, stored sorted by year so a selection only gathers a few ranges, and
+    memory follows the pairs that occur rather than years x publishers x topics; row filters
+    intersect the posting lists with the selected year ranges. Books without topics are indexed under a null
+    topic and untitled rows are left out, matching a split, explode and count of 'Title'.
+    """
+
+    def __init__(self, main_df: pl.DataFrame):
+        titled = main_df.select(
+            pl.int_range(pl.len(), dtype=pl.Int64).alias('row'), 'Year', 'Publisher', pl.col('Topics').str.split(', ')
+        ).filter(main_df['Title'].is_not_null())
+        self.years, year_ids = dictionary_encode(titled['Year'])
+        # Stable, so rows within a year keep their sheet order
+        self.order = titled['row'].to_numpy()[np.argsort(year_ids, kind='stable')]
+        self.year_bounds = np.searchsorted(np.sort(year_ids), np.arange(len(self.years) + 1))
+        position_of_row = np.empty(len(main_df), dtype=np.int64)
+        position_of_row[self.order] = np.arange(len(self.order))
+
+        exploded = titled.explode('Topics', empty_as_null=True)
+        self.topics, topic_ids = dictionary_encode(exploded['Topics'])
+        self.publishers, publisher_ids = dictionary_encode(exploded['Publisher'])
+        exploded_years = dictionary_encode(exploded['Year'])[1]
+        positions = position_of_row[exploded['row'].to_numpy()]
+
+        by_topic = np.lexsort((positions, topic_ids))
+        splits = np.searchsorted(topic_ids[by_topic], np.arange(1, len(self.topics)))
+        self.postings = np.split(positions[by_topic].astype(np.int32 if len(positions) < 2 ** 31 else np.int64), splits)
+
+        # One sorted key per (year, publisher, topic), so the cells of each year are one range
+        flat = (exploded_years.astype(np.int64) * len(self.publishers) + publisher_ids) * len(self.topics) + topic_ids
+        cells, self.cell_counts = np.unique(flat, return_counts=True)
+        self.cell_year_bounds = np.searchsorted(cells // (len(self.publishers) * len(self.topics)), np.arange(len(self.years) + 1))
+        self.cell_publishers = (cells // len(self.topics) % len(self.publishers)).astype(np.int32)
+        self.cell_topics = (cells % len(self.topics)).astype(np.int32)
+
+    def year_ids(self, years: list) -> np.ndarray:
+        selected = set(years)
+        return np.array([year_id for year_id, year in enumerate(self.years) if year in selected], dtype=np.int64)
+
+    def cells(self, years: list) -> np.ndarray:
+        """Positions of the selected years' cells in the cell arrays"""
+        year_ids = self.year_ids(years)
+        return np.concatenate(
+            [np.arange(self.cell_year_bounds[year_id], self.cell_year_bounds[year_id + 1]) for year_id in year_ids]
+            or [np.array([], dtype=np.int64)]
+        )
+
+    def publisher_topic_cells(self, years: list) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Publisher ids, topic ids and book counts of the non-zero pairs over the selected years
+
+        The years' cells are merged by sorting their pair keys, so nothing the size of
+        publishers x topics is ever allocated.
+        """
+        cells = self.cells(years)
+        keys = self.cell_publishers[cells].astype(np.int64) * len(self.topics) + self.cell_topics[cells]
+        pairs, inverse = np.unique(keys, return_inverse=True)
+        counts = np.bincount(inverse, weights=self.cell_counts[cells], minlength=len(pairs)).astype(np.int64)
+        return pairs // len(self.topics), pairs % len(self.topics), counts
+
+    def topic_publisher_counts(self, years: list) -> pl.DataFrame:
+        """Long Publisher, Topics, count frame of the non-zero cells, as a group_by of the exploded rows gives"""
+        publisher_ids, topic_ids, counts = self.publisher_topic_cells(years)
+        return pl.DataFrame({
+            'Publisher': pl.Series([self.publishers[i] for i in publisher_ids], dtype=pl.String),
+            'Topics': pl.Series([self.topics[i] for i in topic_ids], dtype=pl.String),
+            'count': pl.Series(counts, dtype=pl.UInt32),
+        })
+
+    def topic_counts(self, years: list) -> pl.DataFrame:
+        """Books per topic over the selected years, least common first"""
+        cells = self.cells(years)
+        totals = np.bincount(self.cell_topics[cells], weights=self.cell_counts[cells], minlength=len(self.topics)).astype(np.int64)
+        topic_ids = np.nonzero(totals)[0]
+        return pl.DataFrame({
+            'Topics': pl.Series([self.topics[i] for i in topic_ids], dtype=pl.String),
+            'Title': pl.Series(totals[topic_ids], dtype=pl.UInt32),
+        }).sort('Title', 'Topics')
+
+    def rows(self, topics: list[str], years: list | None = None, match: str = 'all') -> np.ndarray:
+        """Sorted row numbers of the books tagged with all (or, with match='any', any) of `topics`"""
+        ids = [self.topics.index(topic) for topic in topics if topic in self.topics]
+        if len(ids) < len(topics) and match == 'all':
+            return np.array([], dtype=np.int64)
+        postings = [self.postings[topic_id] for topic_id in ids]
+        if not postings:
+            return np.array([], dtype=np.int64)
+        positions = postings[0]
+        for posting in postings[1:]:
+            positions = np.intersect1d(positions, posting, assume_unique=True) if match == 'all' else np.union1d(positions, posting)
+        if years is not None:
+            year_ids = self.year_ids(years)
+            starts = np.searchsorted(positions, self.year_bounds[year_ids])
+            stops = np.searchsorted(positions, self.year_bounds[year_ids + 1])
+            positions = np.concatenate([positions[start:stop] for start, stop in zip(starts, stops)] or [positions[:0]])
+        return np.sort(self.order[positions])
@@ -0,0 +1,267 @@
+from __future__ import annotations
+
+import time
+import logging
+import bisect
+import functools
+import threading
+import contextlib
+from typing import Any, Callable, Iterable, Iterator
+from .registry import Registry
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds, in seconds, of the span duration histogram
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+NULL_SPAN = contextlib.nullcontext()
+
+
+def label_key(labels: dict) -> tuple:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def format_labels(labels: tuple) -> str:
+    if not labels:
+        return ''
+    escaped = (
+        (name, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+class SpanStats:
+    """Call count, durations and errors of one span name and label set"""
+
+    __slots__ = ('count', 'total', 'max', 'errors', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.errors = 0
+        self.buckets = [0] * len(BUCKETS)
+
+    def add(self, seconds: float, error: bool) -> None:
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.errors += error
+        index = bisect.bisect_left(BUCKETS, seconds)
+        if index < len(BUCKETS):
+            self.buckets[index] += 1
+
+
+class Span:
+    def __init__(self, tracer: Tracer, name: str, labels: tuple):
+        self.tracer = tracer
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self) -> Span:
+        self.start = self.tracer.timer()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.tracer.record(self.name, self.tracer.timer() - self.start, self.labels, error=exc_type is not None)
+
+
+class Tracer:
+    """Process-wide timings and counters of the dashboard's hot paths, off unless enabled
+
+    Spans keep a call count, total and max duration, error count and duration histogram per
+    name and label set; counters add up quantities such as bytes fetched. Collectors registered
+    with `register` (e.g. cache stats) are read when exporting. While disabled, `span` returns a
+    shared no-op context manager and `traced` functions call straight through, so the
+    instrumentation stays in place at the cost of an attribute check.
+    """
+
+    def __init__(self, enabled: bool = False, timer: Callable[[], float] = time.perf_counter, prefix: str = 'nlfb'):
+        self.enabled = enabled
+        self.timer = timer
+        self.prefix = prefix
+        self.spans = {}
+        self.counters = {}
+        self.collectors = {}
+        self._lock = threading.Lock()
+
+    def enable(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+
+    def span(self, name: str, **labels) -> contextlib.AbstractContextManager:
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, label_key(labels))
+
+    def record(self, name: str, seconds: float, labels: tuple = (), error: bool = False) -> None:
+        with self._lock:
+            stats = self.spans.get((name, labels))
+            if stats is None:
+                stats = self.spans[(name, labels)] = SpanStats()
+            stats.add(seconds, error)
+
+    def add(self, name: str, value: float = 1, **labels) -> None:
+        if not self.enabled:
+            return
+        key = (name, label_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def counted(self, chunks: Iterable[bytes], name: str = 'bytes_fetched', **labels) -> Iterator[bytes]:
+        """Pass chunks through, adding their length to a counter as they are consumed"""
+        for chunk in chunks:
+            self.add(name, len(chunk), **labels)
+            yield chunk
+
+    def register(self, family: str, labels: dict, collect: Callable[[], dict]) -> None:
+        """Export the numeric values of `collect()` as `<prefix>_<family>_<key>` gauges, e.g. a cache's stats"""
+        self.collectors[(family, label_key(labels))] = collect
+
+    def reset(self) -> None:
+        with self._lock:
+            self.spans.clear()
+            self.counters.clear()
+
+    def span_rows(self) -> list[dict]:
+        """One row per span, slowest in total first, for the debug sidebar"""
+        with self._lock:
+            rows = [
+                {'span': name, 'labels': ', '.join(f'{key}={value}' for key, value in labels), 'calls': stats.count,
+                 'total_ms': stats.total * 1000, 'mean_ms': stats.total / stats.count * 1000, 'max_ms': stats.max * 1000,
+                 'errors': stats.errors}
+                for (name, labels), stats in self.spans.items()
+            ]
+        return sorted(rows, key=lambda row: -row['total_ms'])
+
+    def counter_rows(self) -> list[dict]:
+        with self._lock:
+            return [
+                {'counter': name, 'labels': ', '.join(f'{key}={value}' for key, value in labels), 'value': value}
+                for (name, labels), value in sorted(self.counters.items())
+            ]
+
+    def collected(self) -> dict[tuple, dict]:
+        return {key: collect() for key, collect in list(self.collectors.items())}
+
+    def prometheus_text(self) -> str:
+        """Everything recorded so far in the Prometheus text exposition format"""
+        prefix = self.prefix
+        lines = []
+        with self._lock:
+            spans = sorted(self.spans.items())
+            counters = sorted(self.counters.items())
+        if spans:
+            lines += [f'# HELP {prefix}_span_seconds Duration of instrumented calls', f'# TYPE {prefix}_span_seconds histogram']
+            for (name, labels), stats in spans:
+                span_labels = (('span', name),) + labels
+                cumulative = 0
+                for bound, count in zip(BUCKETS, stats.buckets):
+                    cumulative += count
+                    lines.append(f'{prefix}_span_seconds_bucket{format_labels(span_labels + (("le", str(bound)),))} {cumulative}')
+                lines.append(f'{prefix}_span_seconds_bucket{format_labels(span_labels + (("le", "+Inf"),))} {stats.count}')
+                lines.append(f'{prefix}_span_seconds_sum{format_labels(span_labels)} {stats.total!r}')
+                lines.append(f'{prefix}_span_seconds_count{format_labels(span_labels)} {stats.count}')
+            lines += [f'# HELP {prefix}_span_errors_total Instrumented calls that raised', f'# TYPE {prefix}_span_errors_total counter']
+            lines += [f'{prefix}_span_errors_total{format_labels((("span", name),) + labels)} {stats.errors}' for (name, labels), stats in spans]
+        for name in sorted({counter for (counter, _), _ in counters}):
+            lines.append(f'# TYPE {prefix}_{name}_total counter')
+            lines += [f'{prefix}_{name}_total{format_labels(labels)} {value}' for (counter, labels), value in counters if counter == name]
+        gauges = {}
+        for (family, labels), values in sorted(self.collected().items()):
+            for key, value in values.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    gauges.setdefault(f'{prefix}_{family}_{key}', []).append((labels, value))
+        for name, samples in gauges.items():
+            lines.append(f'# TYPE {name} gauge')
+            lines += [f'{name}{format_labels(labels)} {value}' for labels, value in samples]
+        return '\n'.join(lines) + '\n'
+
+
+TRACER = Tracer()
+
+
+def traced(name: str | None = None, tracer: Tracer | None = None) -> Callable:
+    """Decorator timing every call of a function as a span, by default named `<module>.<function>`"""
+    def decorate(function: Callable) -> Callable:
+        span_name = name or f"{function.__module__.rsplit('.', 1)[-1]}.{function.__qualname__}"
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs) -> Any:
+            active = tracer or TRACER
+            if not active.enabled:
+                return function(*args, **kwargs)
+            with Span(active, span_name, ()):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def metrics_handler(tracer: Tracer):
+    """Request handler class serving `tracer.prometheus_text()` on GET /metrics"""
+    from http.server import BaseHTTPRequestHandler
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = tracer.prometheus_text().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return MetricsHandler
+
+
+SERVERS = Registry()
+
+def start_metrics_server(port: int, host: str = '127.0.0.1', tracer: Tracer = TRACER):
+    """HTTP server exposing the tracer on http://<host>:<port>/metrics, started once per address
+
+    When the address can't be bound, e.g. the port is taken, a warning is logged once and None is
+    returned; tracing carries on without the endpoint.
+    """
+    from http.server import ThreadingHTTPServer
+
+    def serve():
+        try:
+            server = ThreadingHTTPServer((host, port), metrics_handler(tracer))
+        except OSError as error:
+            logger.warning('Metrics endpoint not started on %s:%s: %s', host, port, error)
+            return None
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+        return server
+
+    return SERVERS.get((host, port), serve)
+
+
+def from_config(config: dict, tracer: Tracer = TRACER) -> Tracer:
+    """Apply the [tracing] section of the secrets: enabled, and an optional port for the /metrics endpoint"""
+    tracer.enable(config.get('enabled', False))
+    if tracer.enabled and config.get('port'):
+        start_metrics_server(config['port'], config.get('host', '127.0.0.1'), tracer)
+    return tracer
+
+
+def debug_sidebar(tracer: Tracer = TRACER) -> None:
+    """Span timings, counters and cache stats in a sidebar expander, with the Prometheus text as a download"""
+    import streamlit as st
+
+    with st.sidebar.expander('Tracing'):
+        st.dataframe(tracer.span_rows(), hide_index=True, column_config={
+            column: st.column_config.NumberColumn(format='%.1f') for column in ('total_ms', 'mean_ms', 'max_ms')
+        })
+        counters = tracer.counter_rows()
+        if counters:
+            st.dataframe(counters, hide_index=True)
+        for (family, labels), values in tracer.collected().items():
+            st.caption(f"{family} {format_labels(labels)}: " + ', '.join(
+                f'{key}={value:.2f}' if isinstance(value, float) else f'{key}={value}' for key, value in values.items()
+            ))
+        st.download_button('Prometheus metrics', tracer.prometheus_text(), file_name='metrics.txt', mime='text/plain')
@@ -1,27 +1,45 @@
-import toml
-import json
-import millify
-import gspread
-import requests
-import calendar
-import numpy as np
-import pandas as pd
+from __future__ import annotations
+
+import os
+import time
+import warnings
+import itertools
+import contextlib
+import threading
+import cachetools
 import polars as pl
-import datetime as dt
-import streamlit as st
 from numbers import Number
-from millify import prettify
-from lxml.html import fromstring
-from streamlit_gsheets import GSheetsConnection
-from google.oauth2.service_account import Credentials
-from oauth2client.service_account import ServiceAccountCredentials
-
-def authenticate(connection_values: dict, scope: list, workbook_name: str) -> gspread.spreadsheet.Spreadsheet:
-    credentials_file = json.loads(str(connection_values).replace("'", '"').replace('\r\n', '\\r\\n'))
-    credentials = ServiceAccountCredentials.from_json_keyfile_dict(credentials_file, scopes=scope)
+from . import schemas, tracing
+from typing import TYPE_CHECKING, Any, Callable, Iterable, NamedTuple
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# gspread, oauth2client, requests and lxml are imported inside the functions that use them,
+# so importing this module (and rendering from cached data) doesn't pay for them at startup
+if TYPE_CHECKING:
+    import gspread
+    import requests
+    from . import sources
+
+def load_config(path: str = '.streamlit/secrets.toml') -> dict:
+    """App settings and credentials; NLFB_SECRETS points at an alternative file, e.g. for benchmarks"""
+    import toml
+
+    return toml.load(os.environ.get('NLFB_SECRETS', path))
+
+def count_response_bytes(response: requests.Response, *args, **kwargs) -> None:
+    if tracing.TRACER.enabled:
+        tracing.TRACER.add('bytes_fetched', len(response.content), source='sheets')
+
+@tracing.traced()
+def make_client(connection_values: dict, scope: list) -> gspread.Client:
+    """Authorised gspread client for the service account described by the [connections.gsheets] secrets"""
+    import gspread
+    from google.oauth2.service_account import Credentials
+
+    credentials = Credentials.from_service_account_info(dict(connection_values), scopes=scope)
     client = gspread.authorize(credentials)
-    wb = client.open(workbook_name)
-    return wb
+    client.session.hooks['response'].append(count_response_bytes)
+    return client
 
 def pad_data(data: list, length: int) -> list[list]:
     padded_data = [
@@ -30,15 +48,221 @@ def pad_data(data: list, length: int) -> list[list]:
     ]
     return padded_data
 
-def load_data(sheet_name: str, schema: dict, workbook: gspread.spreadsheet.Spreadsheet) -> pl.DataFrame:
-    sheet = workbook.worksheet(sheet_name)
-    data = sheet.get()
-    headers = data[0]
-    padded_data = pad_data(data[1:], len(headers))
-    loaded_dataframe = pl.DataFrame(padded_data, schema=schema, orient='row', strict=False)
+class CoercionWarning(UserWarning):
+    pass
+
+class CoercionError(ValueError):
+    pass
+
+def columns_from_values(rows: list[list], width: int) -> list[tuple]:
+    """Transpose a ragged row grid into `width` columns, padding short rows with None"""
+    if not rows:
+        return [()] * width
+    columns = list(itertools.zip_longest(*rows, fillvalue=None))[:width]
+    columns += [(None,) * len(rows)] * (width - len(columns))
+    return columns
+
+def frame_from_values(data: list[list], schema: dict, on_error: str = 'warn') -> pl.DataFrame:
+    """Build a typed frame from a header + rows grid, column by column
+
+    Empty strings become null and every column is cast, and checked against its constraint
+    (see `schemas.Constrained`), in one pass. Non-empty cells that can't be cast to their schema
+    type or break its constraint are set to null and reported according to `on_error`, which is
+    one of 'warn', 'raise' or 'ignore'.
+    """
+    if not data:
+        return pl.DataFrame(schema=schemas.dtypes(schema))
+    names = list(schema)
+    raw = pl.DataFrame(
+        [pl.Series(name, column, dtype=pl.String, strict=False) for name, column in zip(names, columns_from_values(data[1:], len(names)))]
+    )
+    return cast_frame(raw, schema, on_error)
+
+def typed_column(name: str, column_type) -> pl.Expr:
+    """Cast of one raw column to its schema type, null where the cast fails or the constraint is broken"""
+    cast = pl.col(name).cast(schemas.column_dtype(column_type), strict=False)
+    if isinstance(column_type, schemas.Constrained):
+        return pl.when(column_type.check(cast)).then(cast).alias(name)
+    return cast
+
+def cast_frame(frame: pl.DataFrame, schema: dict, on_error: str = 'warn') -> pl.DataFrame:
+    """Select and cast the schema's columns of an already tabular frame, e.g. read from CSV or Parquet
+
+    Missing columns come back as nulls and empty strings become null, as with `frame_from_values`.
+    """
+    raw = frame.select(
+        (pl.when(pl.col(name) != '').then(pl.col(name)) if frame.schema[name] == pl.String else pl.col(name)).alias(name)
+        if name in frame.schema else pl.lit(None, dtype=pl.String).alias(name)
+        for name in schema
+    )
+    loaded_dataframe = raw.select(typed_column(name, column_type) for name, column_type in schema.items())
+    if on_error != 'ignore':
+        # Compared against the typed frame, so every cast and check runs once
+        failure_counts = {name: (raw[name].is_not_null() & loaded_dataframe[name].is_null()).sum() for name in schema}
+        report_coercion_failures(raw.lazy(), schema, failure_counts, on_error)
     return loaded_dataframe
 
+def report_coercion_failures(raw: pl.LazyFrame, schema: dict, failure_counts: dict[str, int], on_error: str) -> None:
+    failed = {name: count for name, count in failure_counts.items() if count}
+    if not failed:
+        return
+    details = []
+    for name, count in failed.items():
+        samples = (
+            raw.select(pl.col(name))
+            .filter(pl.col(name).is_not_null() & typed_column(name, schema[name]).is_null())
+            .head(3).collect()[name].to_list()
+        )
+        details.append(f"{name!r} ({count} not {schema[name]}, e.g. {samples})")
+    message = "Values could not be converted and were set to null: " + ", ".join(details)
+    if on_error == 'raise':
+        raise CoercionError(message)
+    warnings.warn(message, CoercionWarning, stacklevel=3)
+
+@tracing.traced()
+def load_data(sheet_name: str, schema: dict, workbook: sources.DataSource) -> pl.DataFrame:
+    return load_many(workbook, {sheet_name: schema})[sheet_name]
+
+def sheet_range(sheet_name: str) -> str:
+    """A1 range covering a whole worksheet, quoted so names with spaces or apostrophes are safe"""
+    return "'" + sheet_name.replace("'", "''") + "'"
+
+@tracing.traced()
+def load_many(workbook: sources.DataSource, sheets: dict[str, dict]) -> dict[str, pl.DataFrame]:
+    """Load several worksheets with a single batched values request
+
+    Sources that store typed tables (see `sources.TableSource`) hand back frames directly instead.
+    """
+    if not sheets:
+        return {}
+    load_frames = getattr(workbook, 'load_frames', None)
+    if load_frames is not None:
+        frames = load_frames(sheets)
+    else:
+        sheet_names = list(sheets)
+        response = workbook.values_batch_get([sheet_range(name) for name in sheet_names])
+        value_ranges = response.get('valueRanges', [])
+        frames = {
+            name: frame_from_values(value_range.get('values', []), sheets[name])
+            for name, value_range in zip(sheet_names, value_ranges)
+        }
+    for name, frame in frames.items():
+        tracing.TRACER.add('rows_loaded', frame.height, sheet=name)
+    return frames
+
+def frame_size(frame: pl.DataFrame) -> int:
+    return frame.estimated_size()
+
+class SheetCache:
+    """TTL cache of parsed worksheets, shared by every session and page of a club
+
+    Bounded to `maxsize` entries or, with `max_bytes`, to the estimated size of the frames held;
+    the least recently used entries are evicted first, and a frame larger than the whole budget
+    is served without being cached.
+    """
+
+    def __init__(self, ttl: float = 600, maxsize: int = 64, timer=time.monotonic, max_bytes: int | None = None):
+        self._maxsize = max_bytes or maxsize
+        self._getsizeof = frame_size if max_bytes else None
+        self._entries = cachetools.TTLCache(maxsize=self._maxsize, ttl=ttl, timer=timer, getsizeof=self._getsizeof)
+        self._lock = threading.RLock()
+        self._key_locks = {}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def ttl(self) -> float:
+        return self._entries.ttl
+
+    def store(self, key: tuple, value: pl.DataFrame) -> None:
+        try:
+            self._entries[key] = value
+        except ValueError:
+            # Larger than the whole budget
+            pass
+
+    @staticmethod
+    def make_key(sheet_name: str, schema: dict, workbook) -> tuple:
+        workbook_id = getattr(workbook, 'id', None) or id(workbook)
+        schema_key = tuple((column, str(column_type)) for column, column_type in schema.items())
+        return (workbook_id, sheet_name, schema_key)
+
+    def get_or_load(self, key: tuple, loader: Callable[[], pl.DataFrame]) -> pl.DataFrame:
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                return self._entries[key]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        # One loader per key at a time, so concurrent sessions on a cold cache share a single fetch
+        with key_lock:
+            with self._lock:
+                if key in self._entries:
+                    self.hits += 1
+                    return self._entries[key]
+                self.misses += 1
+            value = loader()
+            with self._lock:
+                self.store(key, value)
+        return value
+
+    def get_or_load_many(self, keys: dict[str, tuple], loader: Callable[[list[str]], dict[str, pl.DataFrame]]) -> dict:
+        """Serve every name from the cache, handing all misses to one loader call"""
+        with self._lock:
+            found = {name: self._entries[key] for name, key in keys.items() if key in self._entries}
+            if len(found) == len(keys):
+                self.hits += len(found)
+                return found
+            missing = sorted((name for name in keys if name not in found), key=lambda name: repr(keys[name]))
+            key_locks = [self._key_locks.setdefault(keys[name], threading.Lock()) for name in missing]
+        # Lock only the missing keys (in a fixed order), so unrelated batches still load concurrently
+        with contextlib.ExitStack() as stack:
+            for key_lock in key_locks:
+                stack.enter_context(key_lock)
+            with self._lock:
+                found = {name: self._entries[key] for name, key in keys.items() if key in self._entries}
+                missing = [name for name in keys if name not in found]
+                self.hits += len(found)
+                self.misses += len(missing)
+            if missing:
+                loaded = loader(missing)
+                with self._lock:
+                    for name in missing:
+                        self.store(keys[name], loaded[name])
+                found.update(loaded)
+        return {name: found[name] for name in keys}
+
+    def invalidate(self, sheet_name: str | None = None) -> None:
+        """Drop cached entries for one sheet, or every sheet when no name is given"""
+        with self._lock:
+            if sheet_name is None:
+                self._entries.clear()
+                return
+            for key in [key for key in self._entries.keys() if key[1] == sheet_name]:
+                del self._entries[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._entries.expire()
+            requests_made = self.hits + self.misses
+            stats = {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / requests_made if requests_made else 0.0,
+                'entries': len(self._entries),
+                'ttl': self._entries.ttl,
+            }
+            if self._getsizeof:
+                stats.update(bytes=self._entries.currsize, max_bytes=self._maxsize)
+            return stats
+
+def load_many_cached(workbook: sources.DataSource, sheets: dict[str, dict], cache: SheetCache,
+                     loader: Callable[..., dict[str, pl.DataFrame]] = load_many) -> dict[str, pl.DataFrame]:
+    """Cached `load_many`; `loader` can be swapped for another batch loader such as SnapshotStore.load_many"""
+    keys = {name: cache.make_key(name, schema, workbook) for name, schema in sheets.items()}
+    return cache.get_or_load_many(keys, lambda missing: loader(workbook, {name: sheets[name] for name in missing}))
+
 def get_number_of_members(text: str, default: int) -> int:    
+    members = default
     if text:
         try:
             members = int(text.split(' ')[0].replace(',', ''))
@@ -46,16 +270,96 @@ def get_number_of_members(text: str, default: int) -> int:
             members = default
     return members
 
-def get_text_from_html_element(url: str, element_id: str) -> str:
-    response = requests.get(url)
-    soup = fromstring(response.text)
+def find_element_text(chunks: Iterable[bytes], element_id: str) -> str:
+    """Incrementally parse HTML chunks, stopping as soon as the element with `element_id` is complete"""
+    from lxml import etree
+
+    parser = etree.HTMLPullParser(events=('start', 'end'))
+    target = None
+    for chunk in chunks:
+        parser.feed(chunk)
+        for event, element in parser.read_events():
+            if event == 'start' and target is None and element.get('id') == element_id:
+                target = element
+            elif event == 'end' and element is target:
+                return ''.join(target.itertext())
+            elif event == 'end' and target is None:
+                element.clear()
+    return ""
+
+@tracing.traced()
+def get_text_from_html_element(url: str, element_id: str, timeout: float = 10, session: requests.Session | None = None) -> str:
+    import requests
+
     try:
-        element = soup.get_element_by_id(element_id)
-        text = str(element.text_content())
-    except KeyError:
+        with (session or requests).get(url, timeout=timeout, stream=True) as response:
+            response.raise_for_status()
+            chunks = response.iter_content(chunk_size=16 * 1024)
+            if tracing.TRACER.enabled:
+                chunks = tracing.TRACER.counted(chunks, source='meetup')
+            text = find_element_text(chunks, element_id)
+    except requests.RequestException:
         text = ""
     return text
 
+IO_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix='nlfb-io')
+
+def result_or_default(future: Future, timeout: float, default: Callable[[], Any]) -> Any:
+    """Wait up to `timeout` seconds for a background fetch, falling back to `default()` if it is late or fails"""
+    try:
+        return future.result(timeout=timeout)
+    except Exception:
+        return default()
+
+ACCUMULATOR_COLUMNS = ['n', 'sum_x', 'sum_y', 'sum_xx', 'sum_yy', 'sum_xy']
+
+class LinearFit(NamedTuple):
+    n: int
+    slope: float | None
+    intercept: float | None
+    r: float | None
+
+def pair_accumulators(df: pl.DataFrame | pl.LazyFrame, x_col: str, y_col: str, by: str = 'Year') -> pl.DataFrame | pl.LazyFrame:
+    """Running sums n, Σx, Σy, Σx², Σy², Σxy per `by` group over rows where both columns are set"""
+    x, y = pl.col('x'), pl.col('y')
+    return (
+        df.select(by, pl.col(x_col).cast(pl.Float64).alias('x'), pl.col(y_col).cast(pl.Float64).alias('y'))
+        .drop_nulls(['x', 'y'])
+        .filter(x.is_finite() & y.is_finite())
+        .group_by(by)
+        .agg(
+            pl.len().alias('n'),
+            x.sum().alias('sum_x'),
+            y.sum().alias('sum_y'),
+            (x * x).sum().alias('sum_xx'),
+            (y * y).sum().alias('sum_yy'),
+            (x * y).sum().alias('sum_xy'),
+        )
+    )
+
+def merge_accumulators(accumulators: pl.DataFrame | pl.LazyFrame, groups: list, by: str = 'Year') -> pl.DataFrame | pl.LazyFrame:
+    """Sum the per-group accumulators of the selected groups into a single row"""
+    return accumulators.filter(pl.col(by).is_in(groups)).select(pl.col(ACCUMULATOR_COLUMNS).sum())
+
+def fit_from_accumulators(sums: dict) -> LinearFit:
+    """Closed-form least-squares line and Pearson r from merged accumulators"""
+    n = sums['n'] or 0
+    if n < 2:
+        return LinearFit(n, None, None, None)
+    sxx = sums['sum_xx'] - sums['sum_x'] ** 2 / n
+    syy = sums['sum_yy'] - sums['sum_y'] ** 2 / n
+    sxy = sums['sum_xy'] - sums['sum_x'] * sums['sum_y'] / n
+    if sxx <= 0:
+        return LinearFit(n, None, None, None)
+    slope = sxy / sxx
+    intercept = (sums['sum_y'] - slope * sums['sum_x']) / n
+    r = min(max(sxy / (sxx * syy) ** 0.5, -1.0), 1.0) if syy > 0 else None
+    return LinearFit(n, slope, intercept, r)
+
+def fit_line(df: pl.DataFrame, x_col: str, y_col: str) -> LinearFit:
+    accumulators = pair_accumulators(df.with_columns(pl.lit(0).alias('_all')), x_col, y_col, by='_all')
+    return fit_from_accumulators(merge_accumulators(accumulators, [0], by='_all').row(0, named=True))
+
 def describe_pearsons_r(value: Number) -> str:
     """Provide a short text description for a given Pearsoons correlation coefficient value"""
     message = ""
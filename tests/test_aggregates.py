@@ -0,0 +1,52 @@
+from NLFB.src import aggregates
+import pytest
+import numpy as np
+import polars as pl
+
+# command to run: pytest tests
+
+MAIN = pl.DataFrame({
+    'Year': [2020, 2020, 2021, 2022],
+    'Title': ['a', 'b', 'c', 'd'],
+    'Publisher': ['P1', 'P2', 'P1', 'P1'],
+    'Score': [6.0, 8.0, 7.0, 9.0],
+    'Pages': [100, 200, 300, 400],
+    'Our score conversion': [3.0, 4.0, 3.5, 4.5],
+    'Goodreads score': [3.5, 4.1, 3.9, 4.2],
+    'Author gender': ['Female', 'Male', 'Female', None],
+    'Debut?': ['Yes', 'No', 'No', 'No'],
+    'Topics': ['Crime, Love', 'Love', None, 'War'],
+})
+
+
+@pytest.mark.parametrize('years', [[2020], [2020, 2021], [2020, 2021, 2022], []])
+def test_publisher_stats_match_eager(years):
+    selected = MAIN.filter(pl.col('Year').is_in(years))
+    expected = selected.group_by('Publisher').agg(pl.col('Score').mean(), pl.col('Title').count()).sort('Publisher')
+    merged = aggregates.YearAggregates(MAIN).publisher_stats(years).select('Publisher', 'Score', 'Title').sort('Publisher')
+    assert merged.to_dicts() == expected.to_dicts()
+
+
+def test_topics_counts_and_histogram():
+    year_aggregates = aggregates.YearAggregates(MAIN, bins=4)
+    assert dict(year_aggregates.topic_counts([2020]).iter_rows()) == {'Crime': 1, 'Love': 2}
+    assert year_aggregates.counts('Author gender', [2020, 2022]).to_dicts() == [
+        {'Author gender': 'Female', 'count': 1}, {'Author gender': 'Male', 'count': 1}
+    ]
+    assert year_aggregates.histogram('Pages', [2020, 2021])[1].tolist() == [1, 1, 1, 0]
+
+
+def test_aggregates_rebuilt_only_on_change():
+    first = aggregates.get_year_aggregates(MAIN, name='test')
+    assert aggregates.get_year_aggregates(MAIN.clone(), name='test') is first
+    assert aggregates.get_year_aggregates(MAIN.head(3), name='test') is not first
+
+
+@pytest.mark.parametrize('years', [[2020, 2021], [2020, 2021, 2022]])
+def test_fit_matches_numpy(years):
+    selected = MAIN.filter(pl.col('Year').is_in(years))
+    fit = aggregates.YearAggregates(MAIN).fit('Score', 'Pages', years)
+    slope, intercept = np.polyfit(selected['Score'].to_numpy(), selected['Pages'].to_numpy(), 1)
+    assert fit.slope == pytest.approx(slope)
+    assert fit.intercept == pytest.approx(intercept)
+    assert fit.r == pytest.approx(np.corrcoef(selected['Score'].to_numpy(), selected['Pages'].to_numpy())[0, 1])
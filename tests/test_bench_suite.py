@@ -0,0 +1,13 @@
+from NLFB.benchmarks import bench_suite
+import pytest
+
+# command to run: pytest tests
+
+
+@pytest.mark.parametrize('max_grid_rows', [1_000, 10])
+def test_every_case_runs(max_grid_rows):
+    # Sizes above max_grid_rows skip ingestion from the list-of-lists form and cast the frames directly
+    benchmarks = bench_suite.cases(200, seed=0, max_grid_rows=max_grid_rows)
+    assert ('ingest.load_data' in benchmarks) == (max_grid_rows >= 200)
+    for function in benchmarks.values():
+        function()
@@ -0,0 +1,51 @@
+from NLFB.src import chart_functions as chart
+import polars as pl
+
+# command to run: pytest tests
+
+FRAME = pl.DataFrame({'Publisher': ['P1', 'P2'], 'Score': [7.5, 6.0], 'Title': [3, 1]})
+
+
+def test_cached_figure_reuses_identical_inputs():
+    cache = chart.FigureCache()
+    first = chart.cached_figure(chart.make_bar_group, FRAME, 'Publisher', 'Score', 'Title', 'Score', 'Book Count', cache=cache)
+    second = chart.cached_figure(chart.make_bar_group, FRAME.clone(), 'Publisher', 'Score', 'Title', 'Score', 'Book Count', cache=cache)
+    changed = chart.cached_figure(chart.make_bar_group, FRAME.reverse(), 'Publisher', 'Score', 'Title', 'Score', 'Book Count', cache=cache)
+    assert first is second
+    assert changed is not first
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 2
+
+
+def test_cached_figure_is_never_encoded(monkeypatch):
+    cache = chart.FigureCache()
+    encoded = []
+    monkeypatch.setattr(chart.go.Figure, 'to_json', lambda self, *args, **kwargs: encoded.append(self))
+    for _ in range(2):
+        chart.cached_figure(chart.make_pie, FRAME, 'Publisher', 'Title', ['red'], cache=cache)
+    assert cache.stats()['hits'] == 1
+    assert encoded == []
+
+
+def test_figure_cache_evicts_least_recently_used():
+    cache = chart.FigureCache(max_bytes=1)
+    chart.cached_figure(chart.make_pie, FRAME, 'Publisher', 'Title', ['red'], cache=cache)
+    chart.cached_figure(chart.make_pie, FRAME.head(1), 'Publisher', 'Title', ['red'], cache=cache)
+    assert cache.stats()['entries'] == 1
+    assert cache.stats()['bytes'] > 0
+
+
+def test_downsample_points_keeps_isolated_points():
+    dense = pl.DataFrame({'x': [1.0] * 1000 + [100.0], 'y': [1.0] * 1000 + [100.0]})
+    sampled = chart.downsample_points(dense, 'x', 'y', max_points=100)
+    assert sampled.height <= 102
+    assert sampled.filter(pl.col('x') == 100.0).height == 1
+    assert chart.downsample_points(dense, 'x', 'y', max_points=5000).height == dense.height
+
+
+def test_scatter_switches_to_webgl():
+    small = pl.DataFrame({'x': [1.0, 2.0], 'y': [2.0, 3.0]})
+    large = pl.DataFrame({'x': list(range(2000)), 'y': list(range(2000))})
+    assert chart.make_scatter(small, 'x', 'y').data[0].type == 'scatter'
+    assert chart.make_scatter(large, 'x', 'y').data[0].type == 'scattergl'
+    assert len(chart.make_scatter(large, 'x', 'y', max_points=500).data[0].x) <= 520
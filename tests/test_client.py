@@ -0,0 +1,78 @@
+from NLFB.src import client, utils
+import pytest
+
+# command to run: pytest tests
+
+
+@pytest.mark.parametrize(
+        'args,kwargs,expected',
+        [
+            (['https://docs.google.com/spreadsheets/d/1AbC-d_9/edit#gid=0'], dict(), '1AbC-d_9'),
+            (['1AbC-d_9'], dict(), '1AbC-d_9'),
+            ([''], dict(), None),
+            ([None], dict(), None),
+        ]
+)
+def test_spreadsheet_key(args, kwargs, expected):
+    assert client.spreadsheet_key(*args, **kwargs) == expected
+
+
+class FakeAuth:
+    valid = True
+    expiry = None
+
+
+class FakeSpreadsheet:
+    def __init__(self):
+        self.worksheet_calls = 0
+
+    def worksheet(self, name):
+        self.worksheet_calls += 1
+        return name
+
+
+class FakeClient:
+    def __init__(self):
+        self.auth = FakeAuth()
+        self.opened = []
+
+    def open_by_key(self, key):
+        self.opened.append(('key', key))
+        return FakeSpreadsheet()
+
+    def open(self, name):
+        self.opened.append(('name', name))
+        return FakeSpreadsheet()
+
+
+def test_shared_workbook_connects_lazily_by_key(monkeypatch):
+    clients = []
+    monkeypatch.setattr(utils, 'make_client', lambda *args: clients.append(FakeClient()) or clients[-1])
+    workbook = client.SharedWorkbook({'spreadsheet': 'https://docs.google.com/spreadsheets/d/abc/edit'}, [], 'NLFB')
+    assert workbook.id == 'abc'
+    assert clients == []
+    assert workbook.worksheet('Suggestions') == workbook.worksheet('Suggestions')
+    assert clients[0].opened == [('key', 'abc')]
+    assert workbook.spreadsheet.worksheet_calls == 1
+
+
+def test_get_shared_workbook_is_process_wide():
+    values = {'client_email': 'bot@example.com', 'spreadsheet': 'abc'}
+    assert client.get_shared_workbook(values, [], 'NLFB') is client.get_shared_workbook(dict(values), [], 'NLFB')
+
+
+def test_workbook_pool_shares_clients_and_evicts_least_recent(monkeypatch):
+    clients = []
+    monkeypatch.setattr(utils, 'make_client', lambda *args: clients.append(FakeClient()) or clients[-1])
+    pool = client.WorkbookPool(max_workbooks=2)
+    first, second = (pool.get({'client_email': 'bot@example.com', 'spreadsheet': key}, [], 'NLFB') for key in ('a', 'b'))
+    first.worksheet('Main')
+    second.worksheet('Main')
+    assert len(clients) == 1 and clients[0].opened == [('key', 'a'), ('key', 'b')]
+    assert pool.get({'client_email': 'bot@example.com', 'spreadsheet': 'a'}, [], 'NLFB') is first
+    pool.get({'client_email': 'bot@example.com', 'spreadsheet': 'c'}, [], 'NLFB')
+    assert list(pool.workbooks) == [('bot@example.com', 'a'), ('bot@example.com', 'c')]
+    assert pool.stats()['evictions'] == 1
+    # An evicted workbook still works, it reopens on the next request
+    assert second.worksheet('Main') == 'Main'
+    assert clients[0].opened[-1] == ('key', 'b')
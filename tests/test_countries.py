@@ -0,0 +1,68 @@
+from NLFB.src import countries
+import pytest
+import polars as pl
+
+# command to run: pytest tests
+
+
+@pytest.mark.parametrize(
+        'name,expected',
+        [
+            ('  The Gambia ', 'gambia'),
+            ("Côte d'Ivoire", 'cote divoire'),
+            ('U.S.A.', 'usa'),
+            ('St. Lucia', 'saint lucia'),
+            ('Antigua & Barbuda', 'antigua and barbuda'),
+        ]
+)
+def test_normalize_name(name, expected):
+    assert countries.normalize_name(name) == expected
+
+
+def test_bundled_table():
+    table = countries.get_country_table()
+    assert table.frame.height == 249
+    assert table.frame['alpha3'].n_unique() == 249
+    assert table.frame.schema['alpha3'] == table.alpha3_type
+    assert countries.get_country_table() is table
+
+
+@pytest.mark.parametrize(
+        'name,expected',
+        [
+            ('United Kingdom', 'GBR'),
+            ('england', 'GBR'),
+            ('U.S.', 'USA'),
+            ('Korea, Republic of', 'KOR'),
+            ('Ivory Coast', 'CIV'),
+            ('Turkey', 'TUR'),
+            ('DEU', 'DEU'),
+            ('Atlantis', None),
+            (None, None),
+        ]
+)
+def test_alpha3_lookup(name, expected):
+    assert countries.get_country_table().alpha3(name) == expected
+
+
+def test_country_counts_merge_aliases():
+    author_df = pl.DataFrame({
+        'Author Name': ['a', 'b', 'c', 'd', 'e', None],
+        'Country of Birth': ['UK', 'United Kingdom', 'Japan', 'Atlantis', None, 'Japan'],
+    })
+    counts = countries.CountryCounts(author_df, countries.get_country_table())
+    assert counts.frame.to_dicts() == [
+        {'Country of Birth': None, 'Alpha3Code': None, 'Count': 1},
+        {'Country of Birth': 'Atlantis', 'Alpha3Code': None, 'Count': 1},
+        {'Country of Birth': 'Japan', 'Alpha3Code': 'JPN', 'Count': 1},
+        {'Country of Birth': 'United Kingdom', 'Alpha3Code': 'GBR', 'Count': 2},
+    ]
+
+
+def test_get_country_counts_recounts_on_change():
+    author_df = pl.DataFrame({'Author Name': ['a'], 'Country of Birth': ['France']})
+    counts = countries.get_country_counts(author_df, name='test')
+    assert countries.get_country_counts(author_df.clone(), name='test') is counts
+    changed = countries.get_country_counts(author_df.with_columns(pl.lit('Japan').alias('Country of Birth')), name='test')
+    assert changed is not counts
+    assert changed.frame['Alpha3Code'].to_list() == ['JPN']
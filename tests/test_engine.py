@@ -0,0 +1,39 @@
+from NLFB.src import aggregates, engine, panels, schemas
+from polars.testing import assert_frame_equal
+import polars as pl
+
+# command to run: pytest tests
+
+# Typed as the loaders type the sheet; P0 and P2 tie on Score in 2020
+MAIN = panels.prepare_main(pl.DataFrame({
+    'Year': pl.Series([2020, 2020, 2020, 2021, 2022], dtype=pl.Int16),
+    'Month': ['January', 'February', 'March', 'May', 'July'],
+    'Title': ['a', 'e', 'b', 'c', None],
+    'Author': ['x', 'w', 'y', 'x', 'z'],
+    'Publisher': pl.Series(['P1', 'P0', 'P2', 'P1', 'P1'], dtype=pl.Categorical),
+    'Score': [6.0, 8.0, 8.0, 7.0, 9.0],
+    'Pages': [100, 150, 200, 300, 400],
+    'Our score conversion': [3.0, 4.0, 4.0, 3.5, 4.5],
+    'Goodreads score': [3.5, 4.0, 4.1, 3.9, 4.2],
+    'Author gender': pl.Series(['Female', 'Male', 'Male', 'Female', 'Male'], dtype=pl.Categorical),
+    'Debut?': pl.Series(['Yes', 'No', 'No', 'No', 'No'], dtype=schemas.YES_NO),
+    'Topics': ['Crime, Love', 'War', 'Love', None, 'War'],
+}))
+
+
+def test_engine_panels_match_polars(tmp_path):
+    main_df = MAIN
+    year_aggregates = aggregates.YearAggregates(main_df)
+    duckdb_engine = engine.DuckDBEngine(tmp_path / 'engine.duckdb')
+    sheets = {'Main': main_df}
+    assert duckdb_engine.sync(sheets)
+    assert not duckdb_engine.sync(sheets)
+
+    for years in (year_aggregates.years, year_aggregates.years[:1]):
+        expected = panels.collect_panels(main_df, year_aggregates, years)
+        actual = panels.collect_panels(main_df, year_aggregates, years, engine=duckdb_engine)
+        for name in ('publisher_stats', 'topic_publisher_counts', 'topic_counts', 'gender_counts', 'debut_counts'):
+            assert_frame_equal(actual[name], expected[name])
+        assert_frame_equal(actual['heatmap'].to_frame(), expected['heatmap'].to_frame())
+        assert actual['metrics'] == expected['metrics']
+    duckdb_engine.close()
@@ -0,0 +1,62 @@
+from NLFB.src import heatmap
+from NLFB.src.topic_index import TopicIndex
+import numpy as np
+import polars as pl
+
+# command to run: pytest tests
+
+COUNTS = pl.DataFrame({
+    'Publisher': ['P1', 'P1', 'P2', 'P2', 'P3', None],
+    'Topics': ['Love', 'Crime', 'Love', 'War', 'War', 'Love'],
+    'count': [5, 1, 2, 3, 4, 0],
+})
+
+
+def test_from_long():
+    counts = heatmap.SparseCounts.from_long(COUNTS)
+    assert counts.row_labels == ['Crime', 'Love', 'War']
+    assert counts.column_labels == ['P1', 'P2', 'P3']
+    assert counts.dense().tolist() == [[1, 0, 0], [5, 2, 0], [0, 3, 4]]
+    assert counts.to_frame().to_dicts()[0] == {'Topics': 'Crime', 'P1': 1, 'P2': 0, 'P3': 0}
+
+
+def test_prune_keeps_largest_totals():
+    counts = heatmap.SparseCounts.from_long(COUNTS)
+    top = counts.prune(max_rows=2, max_columns=2)
+    assert top.row_labels == ['Love', 'War'] and top.column_labels == ['P1', 'P2']
+    assert top.dense().tolist() == [[5, 2], [0, 3]]
+    # Crime only has a count of 1, so nothing is left of its row
+    assert counts.prune(min_count=2).row_labels == ['Love', 'War']
+
+
+def test_similarity_order_groups_blocks():
+    rng = np.random.default_rng(0)
+    blocks = np.kron(np.eye(3, dtype=np.int64), np.full((2, 2), 5)) + 1
+    row_order, column_order = rng.permutation(6), rng.permutation(6)
+    shuffled = blocks[row_order][:, column_order]
+    rows, columns = np.nonzero(shuffled)
+    counts = heatmap.SparseCounts(
+        [f't{i}' for i in row_order], [f'p{i}' for i in column_order], rows, columns, shuffled[rows, columns]
+    )
+    ordered = counts.similarity_order()
+    # Each block's rows and columns end up next to each other
+    row_blocks = [int(label[1:]) // 2 for label in ordered.row_labels]
+    column_blocks = [int(label[1:]) // 2 for label in ordered.column_labels]
+    assert all(row_blocks[i] == row_blocks[i + 1] for i in (0, 2, 4))
+    assert all(column_blocks[i] == column_blocks[i + 1] for i in (0, 2, 4))
+    assert ordered.dense().sum() == blocks.sum()
+
+
+def test_from_topic_index_without_dense_matrix():
+    # 20,000 publishers x 20,000 topics would take 3.2 GB as a dense int64 matrix
+    books = 20_000
+    wide = pl.DataFrame({
+        'Title': [f'Book {i}' for i in range(books)],
+        'Year': [2020 + i % 2 for i in range(books)],
+        'Publisher': [f'Publisher {i:05}' for i in range(books)],
+        'Topics': [f'Topic {i:05}' if i else 'Topic 00001' for i in range(books)],
+    })
+    counts = heatmap.SparseCounts.from_long(TopicIndex(wide).topic_publisher_counts([2020, 2021]))
+    assert counts.shape == (books - 1, books) and counts.counts.sum() == books
+    top = counts.prune(max_rows=1, max_columns=2)
+    assert top.row_labels == ['Topic 00001'] and top.dense().tolist() == [[1, 1]]
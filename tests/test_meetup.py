@@ -0,0 +1,79 @@
+from NLFB.src import meetup
+import time
+
+# command to run: pytest tests
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self.body = body
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        yield self.body
+
+
+class FakeSession:
+    def __init__(self, body):
+        self.body = body
+        self.calls = 0
+
+    def get(self, url, timeout, stream):
+        self.calls += 1
+        return FakeResponse(self.body)
+
+
+def test_refresher_persists_last_good_value(tmp_path):
+    session = FakeSession(b'<a id="member-count-link">6,500 members</a>')
+    refresher = meetup.MemberCountRefresher('https://meetup', tmp_path / 'members.json', session=session)
+    assert refresher.refresh()
+    assert refresher.get() == 6500
+    refresher.stop()
+
+    restored = meetup.MemberCountRefresher('https://meetup', tmp_path / 'members.json', session=FakeSession(b''))
+    assert restored.members == 6500
+    assert not restored.refresh()
+    assert restored.members == 6500
+
+
+def test_refresher_default_without_value(tmp_path):
+    refresher = meetup.MemberCountRefresher('https://meetup', tmp_path / 'members.json', session=FakeSession(b''), default=42)
+    refresher.stop()
+    assert refresher.get() == 42
+
+
+class BrokenParserSession(FakeSession):
+    def get(self, url, timeout, stream):
+        self.calls += 1
+        if self.calls == 1:
+            raise RuntimeError('parser blew up')
+        return FakeResponse(self.body)
+
+
+def test_refresher_survives_unexpected_errors(tmp_path):
+    session = BrokenParserSession(b'<a id="member-count-link">6,500 members</a>')
+    refresher = meetup.MemberCountRefresher('https://meetup', tmp_path / 'members.json', session=session, timeout=0.01)
+    refresher.start()
+    deadline = time.monotonic() + 5
+    while refresher.members is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    refresher.stop()
+    assert session.calls == 2
+    assert refresher.get() == 6500
+
+
+def test_refreshers_are_kept_per_cache_file(tmp_path):
+    session = FakeSession(b'')
+    first = meetup.get_refresher('https://meetup/keyed', tmp_path / 'a.json', session=session)
+    second = meetup.get_refresher('https://meetup/keyed', tmp_path / 'b.json', session=session)
+    first.stop(), second.stop()
+    assert first is not second
+    assert meetup.get_refresher('https://meetup/keyed', tmp_path / 'a.json') is first
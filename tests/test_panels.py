@@ -0,0 +1,39 @@
+from NLFB.src import aggregates, panels
+import polars as pl
+
+# command to run: pytest tests
+
+MAIN = panels.prepare_main(pl.DataFrame({
+    'Year': [2020, 2020, 2021, 2022],
+    'Month': ['January', 'March', 'May', 'July'],
+    'Title': ['a', 'b', 'c', None],
+    'Author': ['x', 'y', 'x', 'z'],
+    'Publisher': ['P1', 'P2', 'P1', 'P1'],
+    'Score': [6.0, 8.0, 7.0, 9.0],
+    'Pages': [100, 200, 300, 400],
+    'Our score conversion': [3.0, 4.0, 3.5, 4.5],
+    'Goodreads score': [3.5, 4.1, 3.9, 4.2],
+    'Author gender': ['Female', 'Male', 'Female', 'Male'],
+    'Debut?': ['Yes', 'No', 'No', 'No'],
+    'Topics': ['Crime, Love', 'Love', None, 'War'],
+}))
+
+
+def test_collect_panels():
+    dashboard = panels.collect_panels(MAIN, aggregates.YearAggregates(MAIN), [2020])
+    assert dashboard['publisher_stats']['Publisher'].to_list() == ['P2', 'P1']
+    assert dashboard['selected_books']['Title'].to_list() == ['b', 'a']
+    assert dashboard['heatmap'].to_frame().to_dicts() == [
+        {'Topics': 'Crime', 'P1': 1, 'P2': 0}, {'Topics': 'Love', 'P1': 1, 'P2': 1}
+    ]
+    assert dashboard['pages_histogram'][1].sum() == 2
+    assert dashboard['metrics'] == {'total_pages': 600, 'latest_pages': 300, 'books': 3, 'authors': 2, 'publishers': 2}
+
+
+def test_collect_panels_by_scope():
+    year_aggregates = aggregates.YearAggregates(MAIN)
+    all_time = panels.collect_panels(MAIN, year_aggregates, None, scopes=('all_time',))
+    assert set(all_time) == set(panels.ALL_TIME)
+    assert all_time['metrics'] == panels.collect_panels(MAIN, year_aggregates, [2020])['metrics']
+    selection = panels.collect_panels(MAIN, year_aggregates, [2020], scopes=('selection',))
+    assert set(selection) == set(panels.SELECTION)
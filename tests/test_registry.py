@@ -0,0 +1,47 @@
+from NLFB.src.registry import Registry
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+# command to run: pytest tests
+
+
+def test_registry_builds_each_key_once():
+    registry = Registry()
+    built = []
+
+    def build():
+        built.append(1)
+        return object()
+
+    with ThreadPoolExecutor(8) as pool:
+        entries = list(pool.map(lambda _: registry.get('key', build), range(32)))
+    assert len(built) == 1
+    assert all(entry is entries[0] for entry in entries)
+    assert registry.get('other', dict) is not entries[0]
+
+
+def test_registry_rebuilds_stale_entries():
+    registry = Registry()
+    assert registry.get('Main', lambda: 1) == 1
+    assert registry.get('Main', lambda: 2, stale=lambda entry: entry == 2) == 1
+    assert registry.get('Main', lambda: 2, stale=lambda entry: entry == 1) == 2
+    assert registry.pop('Main') == 2
+    assert registry.items() == []
+
+
+def test_registry_builds_other_keys_during_a_slow_build():
+    registry = Registry()
+    started, release = threading.Event(), threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return 'slow'
+
+    with ThreadPoolExecutor(2) as pool:
+        slow_entry = pool.submit(registry.get, 'London', slow)
+        assert started.wait(5)
+        # Built while London's build is still running
+        assert pool.submit(registry.get, 'Leeds', lambda: 'fast').result(timeout=1) == 'fast'
+        release.set()
+        assert slow_entry.result() == 'slow'
@@ -0,0 +1,72 @@
+from NLFB.src import snapshots
+import re
+import polars as pl
+
+# command to run: pytest tests
+
+SCHEMA = {'Number': pl.Int64, 'Title': str}
+
+
+class FakeRangeWorkbook:
+    id = 'fake'
+
+    def __init__(self, values):
+        self.values = values
+        self.requests = []
+
+    def values_batch_get(self, ranges, params=None):
+        self.requests.append(ranges)
+        value_ranges = []
+        for a1 in ranges:
+            if a1.endswith('!1:1'):
+                values = self.values[:1]
+            elif '!A' in a1:
+                start = int(re.search(r'!A(\d+):', a1).group(1))
+                values = self.values[start - 1:]
+            else:
+                values = self.values
+            value_ranges.append({'range': a1, 'values': values})
+        return {'valueRanges': value_ranges}
+
+
+def make_store(tmp_path):
+    return snapshots.SnapshotStore(tmp_path, max_age=0, incremental={'Main': 'Number'}, overlap=2)
+
+
+def test_incremental_sync_fetches_only_tail(tmp_path):
+    workbook = FakeRangeWorkbook([['Number', 'Title'], ['1', 'a'], ['2', 'b'], ['3', 'c']])
+    store = make_store(tmp_path)
+    store.load_many(workbook, {'Main': SCHEMA})
+    workbook.values.append(['4', 'd'])
+    frame = store.load_many(workbook, {'Main': SCHEMA})['Main']
+    assert workbook.requests[-1] == ["'Main'!1:1", "'Main'!A3:B"]
+    assert frame['Number'].to_list() == [1, 2, 3, 4]
+    assert store.read_meta('Main', SCHEMA)['last_key'] == 4
+
+
+def test_edited_overlap_triggers_full_refresh(tmp_path):
+    workbook = FakeRangeWorkbook([['Number', 'Title'], ['1', 'a'], ['2', 'b'], ['3', 'c']])
+    store = make_store(tmp_path)
+    store.load_many(workbook, {'Main': SCHEMA})
+    workbook.values[3] = ['3', 'edited']
+    frame = store.load_many(workbook, {'Main': SCHEMA})['Main']
+    assert workbook.requests[-1] == ["'Main'"]
+    assert frame['Title'].to_list() == ['a', 'b', 'edited']
+
+
+def test_fresh_snapshot_skips_network(tmp_path):
+    workbook = FakeRangeWorkbook([['Number', 'Title'], ['1', 'a']])
+    store = snapshots.SnapshotStore(tmp_path, max_age=600)
+    store.load_many(workbook, {'Main': SCHEMA})
+    frame = store.load_many(workbook, {'Main': SCHEMA})['Main']
+    assert len(workbook.requests) == 1
+    assert frame['Title'].to_list() == ['a']
+
+
+def test_schema_change_triggers_full_refresh(tmp_path):
+    workbook = FakeRangeWorkbook([['Number', 'Title'], ['1', 'a'], ['2', 'b']])
+    store = make_store(tmp_path)
+    store.load_many(workbook, {'Main': SCHEMA})
+    frame = store.load_many(workbook, {'Main': {'Number': pl.Int16, 'Title': str}})['Main']
+    assert workbook.requests[-1] == ["'Main'"]
+    assert frame.schema['Number'] == pl.Int16
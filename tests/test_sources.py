@@ -0,0 +1,58 @@
+from NLFB.src import sources, utils
+import polars as pl
+import pytest
+
+# command to run: pytest tests
+
+VALUES = [['Name', 'Count'], ['a', '1'], ['b', ''], ['c', '3']]
+SCHEMA = {'Name': str, 'Count': pl.Int64}
+
+
+@pytest.mark.parametrize(
+        'args,kwargs,expected',
+        [
+            (['Main'], dict(), ('Main', 1, None)),
+            (["'Main'!1:1"], dict(), ('Main', 1, 1)),
+            (["'Main'!A95:Q"], dict(), ('Main', 95, None)),
+            (["'Bob''s sheet'!A2:B10"], dict(), ("Bob's sheet", 2, 10)),
+        ]
+)
+def test_parse_range(args, kwargs, expected):
+    assert sources.parse_range(*args, **kwargs) == expected
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_fake_sheets_quota_and_latency():
+    timer = FakeTimer()
+    slept = []
+    source = sources.FakeSheetsSource({'Sheet': VALUES}, latency=0.25, quota_per_minute=2, timer=timer, sleep=slept.append)
+    assert source.values_batch_get(["'Sheet'!1:1"])['valueRanges'][0]['values'] == [['Name', 'Count']]
+    assert utils.load_data('Sheet', SCHEMA, source)['Count'].to_list() == [1, None, 3]
+    with pytest.raises(sources.QuotaExceededError):
+        source.values_batch_get(['Sheet'])
+    timer.now = 60
+    assert source.values_batch_get(["'Sheet'!A3:B"])['valueRanges'][0]['values'] == VALUES[2:]
+    assert slept == [0.25] * 4
+
+
+@pytest.mark.parametrize('file_format', ['parquet', 'csv'])
+def test_local_source_round_trip(tmp_path, file_format):
+    source = sources.LocalSource(tmp_path, file_format)
+    source.write_frames({'Sheet': pl.DataFrame({'Name': ['a', 'b'], 'Count': ['1', '']})})
+    assert utils.load_many(source, {'Sheet': SCHEMA})['Sheet'].to_dict(as_series=False) == {'Name': ['a', 'b'], 'Count': [1, None]}
+    assert source.values_batch_get(['Sheet'])['valueRanges'][0]['values'] == [['Name', 'Count'], ['a', '1'], ['b', '']]
+
+
+def test_duckdb_source_round_trip(tmp_path):
+    source = sources.DuckDBSource(tmp_path / 'sheets.duckdb')
+    source.write_frames({'Sheet': pl.DataFrame({'Name': ['a', 'b'], 'Count': [1, 2]})})
+    frame = utils.load_many(source, {'Sheet': SCHEMA})['Sheet']
+    assert frame.schema == pl.Schema(SCHEMA)
+    assert frame['Count'].to_list() == [1, 2]
@@ -0,0 +1,36 @@
+from NLFB.src import static_export
+from NLFB.tests.test_panels import MAIN
+import json
+import polars as pl
+
+# command to run: pytest tests
+
+AUTHORS = pl.DataFrame({'Author Name': ['x', 'y', 'z'], 'Country of Birth': ['UK', 'France', 'UK']})
+
+
+def test_year_selections():
+    assert static_export.year_selections([2020, 2021, 2022]) == [[2020, 2021, 2022]]
+    assert static_export.year_selections([2020, 2021, 2022], combinations=True, max_views=5) == [
+        [2020, 2021, 2022], [2020], [2021], [2022], [2020, 2021]
+    ]
+    assert static_export.view_id([2020, 2021], [2020, 2021, 2022]) == '2020-2021'
+
+
+def test_export_bundle_is_incremental(tmp_path):
+    result = static_export.export_bundle(tmp_path, MAIN, AUTHORS, combinations=True)
+    manifest = json.loads((tmp_path / 'manifest.json').read_text())
+    assert set(manifest['views']) == {'all', '2020', '2021', 'all_time'}
+    assert {'index.html', 'plotly.min.js', 'all_time.json', 'views/all.json'} <= set(result.written)
+    view = json.loads((tmp_path / 'views' / '2020.json').read_text())
+    assert [book['Title'] for book in view['selected_books']] == ['b', 'a']
+    assert set(view['figures']) == {'publisher_stats', 'heatmap', 'score_scatter', 'pages_scatter', 'gender', 'debut', 'distributions'}
+
+    assert static_export.export_bundle(tmp_path, MAIN, AUTHORS, combinations=True) == static_export.ExportResult([], 4, [])
+
+    # Only the views showing 2021 depend on its rows, and the all-time panels don't show this column
+    changed = MAIN.with_columns(pl.when(pl.col('Year') == 2021).then(4.4).otherwise(pl.col('Goodreads score')).alias('Goodreads score'))
+    result = static_export.export_bundle(tmp_path, changed, AUTHORS, combinations=True)
+    assert sorted(result.written) == ['views/2021.json', 'views/all.json']
+
+    result = static_export.export_bundle(tmp_path, changed, AUTHORS)
+    assert sorted(result.removed) == ['views/2020.json', 'views/2021.json'] and not (tmp_path / 'views' / '2021.json').exists()
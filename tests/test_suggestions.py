@@ -0,0 +1,114 @@
+from NLFB.src import suggestions, utils
+import pytest
+
+# command to run: pytest tests
+
+
+class FakeWorksheet:
+    def __init__(self, fail_after_append=0):
+        self.rows = []
+        self.append_calls = 0
+        self.fail_after_append = fail_after_append
+
+    def append_rows(self, rows, value_input_option):
+        assert value_input_option == 'RAW'
+        self.append_calls += 1
+        self.rows.extend(rows)
+        if self.fail_after_append:
+            # The rows land but the response is lost
+            self.fail_after_append -= 1
+            raise ConnectionError('connection reset')
+
+    def col_values(self, column):
+        return [row[column - 1] for row in self.rows]
+
+
+class FakeWorkbook:
+    id = 'fake'
+
+    def __init__(self, worksheet):
+        self.sheet = worksheet
+
+    def worksheet(self, sheet_name):
+        return self.sheet
+
+
+def make_spool(tmp_path, worksheet, **kwargs):
+    spool = suggestions.SuggestionSpool(tmp_path / 'spool.sqlite3', FakeWorkbook(worksheet), **kwargs)
+    # Stopped before the worker starts, so the tests drive flush() themselves
+    spool.stop()
+    return spool
+
+
+def test_spool_batches_and_dedupes(tmp_path):
+    worksheet = FakeWorksheet()
+    spool = make_spool(tmp_path, worksheet)
+    spool.enqueue(['Title', 'Author'])
+    spool.enqueue(['Title', 'Author'])
+    spool.enqueue(['Other', 'Author'])
+    assert spool.flush() == 2
+    assert worksheet.append_calls == 1
+    assert [row[:2] for row in worksheet.rows] == [['Title', 'Author'], ['Other', 'Author']]
+    assert worksheet.rows[0][8] == suggestions.submission_key(['Title', 'Author'])
+    assert spool.flush() == 0
+
+
+def test_spool_does_not_resend_unacknowledged_batch(tmp_path):
+    worksheet = FakeWorksheet(fail_after_append=1)
+    spool = make_spool(tmp_path, worksheet)
+    spool.enqueue(['Title', 'Author'])
+    with pytest.raises(ConnectionError):
+        spool.flush()
+    assert spool.flush() == 1
+    assert worksheet.append_calls == 1
+    assert len(worksheet.rows) == 1
+    assert spool.pending() == []
+
+
+def test_spool_survives_restart(tmp_path):
+    spool = make_spool(tmp_path, FakeWorksheet())
+    spool.enqueue(['Title', 'Author'])
+
+    worksheet = FakeWorksheet()
+    restarted = make_spool(tmp_path, worksheet)
+    assert restarted.flush() == 1
+    assert worksheet.rows[0][:2] == ['Title', 'Author']
+
+
+def test_spool_does_not_resend_after_crash_before_mark_sent(tmp_path, monkeypatch):
+    worksheet = FakeWorksheet()
+    spool = make_spool(tmp_path, worksheet)
+    spool.enqueue(['Title', 'Author'])
+
+    def crash(keys):
+        raise SystemExit('killed')
+
+    # The append lands, then the process dies before the rows are marked sent
+    monkeypatch.setattr(spool, 'mark_sent', crash)
+    with pytest.raises(SystemExit):
+        spool.flush()
+    assert worksheet.append_calls == 1
+
+    restarted = make_spool(tmp_path, worksheet)
+    assert restarted.flush() == 1
+    assert worksheet.append_calls == 1
+    assert len(worksheet.rows) == 1
+    assert restarted.pending() == []
+
+
+def test_spool_appends_formulas_as_text(tmp_path):
+    worksheet = FakeWorksheet()
+    spool = make_spool(tmp_path, worksheet)
+    spool.enqueue(['=IMPORTXML("http://example.com", "//a")', 'Author'])
+    assert spool.flush() == 1
+    assert worksheet.rows[0][0] == '=IMPORTXML("http://example.com", "//a")'
+
+
+def test_spool_invalidates_the_clubs_cache(tmp_path):
+    cache = utils.SheetCache(ttl=60)
+    cache.get_or_load(('fake', 'Suggestions', ()), lambda: 'old')
+    cache.get_or_load(('fake', 'Main', ()), lambda: 'main')
+    spool = make_spool(tmp_path, FakeWorksheet(), cache=cache)
+    spool.enqueue(['Title', 'Author'])
+    assert spool.flush() == 1
+    assert cache.stats()['entries'] == 1
@@ -0,0 +1,43 @@
+from NLFB.src import tenants
+from pathlib import Path
+import pytest
+
+# command to run: pytest tests
+
+ENV = {
+    'connections': {'gsheets': {'client_email': 'bot@example.com', 'spreadsheet': 'nlfb-key'}},
+    'snapshots': {'directory': '.snapshots'},
+    'engine': {'backend': 'duckdb', 'path': '.snapshots/engine.duckdb'},
+    'cache': {'ttl': 600},
+}
+
+
+def test_single_club_without_clubs_section():
+    default, clubs = tenants.clubs_from_config(ENV)
+    assert default == 'nlfb'
+    env = tenants.club_env(ENV, default, clubs[default])
+    assert env['snapshots']['directory'] == '.snapshots'
+    assert env['engine']['path'] == '.snapshots/engine.duckdb'
+
+
+def test_club_env():
+    club = {'spreadsheet': 'leeds-key', 'cache': {'max_mb': 64}}
+    env = tenants.club_env(ENV, 'leeds', club)
+    assert env['connections']['gsheets'] == {'client_email': 'bot@example.com', 'spreadsheet': 'leeds-key'}
+    assert env['cache'] == {'ttl': 600, 'max_mb': 64}
+    assert Path(env['snapshots']['directory']) == Path('.snapshots/leeds')
+    assert Path(env['engine']['path']) == Path('.snapshots/leeds/engine.duckdb')
+    assert ENV['connections']['gsheets']['spreadsheet'] == 'nlfb-key'
+
+
+def test_get_tenant(tmp_path):
+    env = {**ENV, 'snapshots': {'directory': str(tmp_path)}, 'clubs': {
+        'default': 'leeds', 'leeds': {'title': 'Leeds Readers'}, 'york': {'cache': {'max_mb': 1}},
+    }}
+    leeds = tenants.get_tenant(env)
+    assert leeds is tenants.get_tenant(env, 'leeds')
+    assert leeds.title == 'Leeds Readers' and leeds.directory == tmp_path / 'leeds'
+    assert tenants.get_tenant(env, 'york').cache.stats()['max_bytes'] == 2 ** 20
+    assert leeds.scoped('Main') == 'leeds/Main'
+    with pytest.raises(KeyError):
+        tenants.get_tenant(env, 'hull')
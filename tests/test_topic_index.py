@@ -0,0 +1,46 @@
+from NLFB.src.topic_index import TopicIndex
+from NLFB.tests.test_aggregates import MAIN
+from polars.testing import assert_frame_equal
+import polars as pl
+import pytest
+
+# command to run: pytest tests
+
+
+@pytest.mark.parametrize('years', [[2020], [2020, 2021], [2020, 2021, 2022], []])
+def test_topic_counts_match_explode(years):
+    exploded = MAIN.filter(pl.col('Year').is_in(years)).with_columns(pl.col('Topics').str.split(', ')).explode('Topics', empty_as_null=True)
+    index = TopicIndex(MAIN)
+    assert_frame_equal(
+        index.topic_counts(years),
+        exploded.group_by('Topics').agg(pl.col('Title').count()).sort('Title', 'Topics'),
+    )
+    assert_frame_equal(
+        index.topic_publisher_counts(years).sort('Publisher', 'Topics'),
+        exploded.group_by('Publisher', 'Topics').agg(pl.col('Title').count().alias('count')).sort('Publisher', 'Topics'),
+    )
+
+
+def test_topic_rows():
+    index = TopicIndex(MAIN)
+    assert index.rows(['Love']).tolist() == [0, 1]
+    assert index.rows(['Love', 'Crime']).tolist() == [0]
+    assert index.rows(['Crime', 'War'], match='any').tolist() == [0, 3]
+    assert index.rows(['War', 'Love'], years=[2020], match='any').tolist() == [0, 1]
+    assert index.rows(['Unknown']).tolist() == []
+
+
+def test_counts_are_kept_per_pair():
+    # 30 years x 3,000 publishers x 3,000 topics would be 270M cells if stored densely
+    books = 3_000
+    wide = pl.DataFrame({
+        'Title': [f'Book {i}' for i in range(books)],
+        'Year': pl.Series([2000 + i % 30 for i in range(books)], dtype=pl.Int16),
+        'Publisher': [f'Publisher {i}' for i in range(books)],
+        'Topics': [f'Topic {i}, Shared' for i in range(books)],
+    })
+    index = TopicIndex(wide)
+    assert len(index.cell_counts) == 2 * books
+    counts = dict(index.topic_counts([2000, 2001]).iter_rows())
+    assert counts['Shared'] == 200
+    assert counts['Topic 31'] == 1
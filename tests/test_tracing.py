@@ -0,0 +1,102 @@
+from NLFB.src import tracing
+import pytest
+import itertools
+
+# command to run: pytest tests
+
+
+def make_tracer():
+    ticks = itertools.count()
+    return tracing.Tracer(enabled=True, timer=lambda: next(ticks) * 0.02)
+
+
+def test_disabled_tracer_records_nothing():
+    tracer = tracing.Tracer()
+    assert tracer.span('load') is tracing.NULL_SPAN
+    with tracer.span('load'):
+        pass
+    tracer.add('bytes_fetched', 100)
+    assert tracer.spans == {} and tracer.counters == {}
+
+
+def test_span_records_calls_and_errors():
+    tracer = make_tracer()
+    with tracer.span('load', sheet='Main'):
+        pass
+    with pytest.raises(ValueError):
+        with tracer.span('load', sheet='Main'):
+            raise ValueError
+    [row] = tracer.span_rows()
+    assert row['span'] == 'load' and row['labels'] == 'sheet=Main'
+    assert row['calls'] == 2 and row['errors'] == 1
+    assert row['total_ms'] == pytest.approx(40)
+
+
+def test_traced_decorator_only_times_when_enabled():
+    tracer = make_tracer()
+
+    @tracing.traced('double', tracer=tracer)
+    def double(value):
+        return value * 2
+
+    tracer.enable(False)
+    assert double(2) == 4
+    assert tracer.spans == {}
+    tracer.enable()
+    assert double(3) == 6
+    assert tracer.span_rows()[0]['calls'] == 1
+    assert double.__name__ == 'double'
+
+
+def test_counted_chunks():
+    tracer = make_tracer()
+    assert b''.join(tracer.counted([b'abc', b'de'], source='meetup')) == b'abcde'
+    assert tracer.counter_rows() == [{'counter': 'bytes_fetched', 'labels': 'source=meetup', 'value': 5}]
+
+
+def test_prometheus_text():
+    tracer = make_tracer()
+    with tracer.span('load', sheet='Main "A"'):
+        pass
+    tracer.add('bytes_fetched', 2048, source='sheets')
+    tracer.register('cache', {'cache': 'sheets'}, lambda: {'hits': 3, 'hit_ratio': 0.75, 'ttl': 600})
+    lines = tracer.prometheus_text().splitlines()
+    assert '# TYPE nlfb_span_seconds histogram' in lines
+    assert 'nlfb_span_seconds_bucket{span="load",sheet="Main \\"A\\"",le="0.01"} 0' in lines
+    assert 'nlfb_span_seconds_bucket{span="load",sheet="Main \\"A\\"",le="0.05"} 1' in lines
+    assert 'nlfb_span_seconds_count{span="load",sheet="Main \\"A\\""} 1' in lines
+    assert 'nlfb_bytes_fetched_total{source="sheets"} 2048' in lines
+    assert 'nlfb_cache_hit_ratio{cache="sheets"} 0.75' in lines
+
+
+def test_metrics_server():
+    import urllib.request
+
+    tracer = make_tracer()
+    tracer.add('rows_loaded', 10, sheet='Main')
+    server = tracing.start_metrics_server(0, tracer=tracer)
+    try:
+        url = f'http://127.0.0.1:{server.server_address[1]}/metrics'
+        with urllib.request.urlopen(url, timeout=5) as response:
+            body = response.read().decode()
+        assert 'nlfb_rows_loaded_total{sheet="Main"} 10' in body
+    finally:
+        server.shutdown()
+        tracing.SERVERS.pop(('127.0.0.1', 0), None)
+
+
+def test_metrics_server_port_in_use(caplog):
+    import socket
+
+    tracer = make_tracer()
+    with socket.socket() as taken:
+        taken.bind(('127.0.0.1', 0))
+        taken.listen()
+        port = taken.getsockname()[1]
+        try:
+            assert tracing.from_config({'enabled': True, 'port': port}, tracer) is tracer
+            assert tracer.enabled
+            assert tracing.start_metrics_server(port, tracer=tracer) is None
+        finally:
+            tracing.SERVERS.pop(('127.0.0.1', port), None)
+    assert len([record for record in caplog.records if 'Metrics endpoint not started' in record.message]) == 1
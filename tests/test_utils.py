@@ -1,6 +1,7 @@
-from NLFB.src import utils
+from NLFB.src import utils, schemas
 import pytest
 import numpy as np
+import polars as pl
 
 # command to run: pytest tests
 
@@ -50,3 +51,167 @@ def test_pearsons_error(args, kwargs, expected):
     with pytest.raises(TypeError) as e:  
         utils.describe_pearsons_r(*args, **kwargs)  
     assert str(e.value) == expected
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_sheet_cache_hits_misses_and_expiry():
+    timer = FakeTimer()
+    cache = utils.SheetCache(ttl=10, timer=timer)
+    calls = []
+    loader = lambda: calls.append(1) or len(calls)
+
+    assert cache.get_or_load(('wb', 'Main', ()), loader) == 1
+    assert cache.get_or_load(('wb', 'Main', ()), loader) == 1
+    timer.now = 11
+    assert cache.get_or_load(('wb', 'Main', ()), loader) == 2
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 2
+
+
+def test_sheet_cache_invalidate():
+    cache = utils.SheetCache(ttl=10)
+    cache.get_or_load(('wb', 'Main', ()), lambda: 'main')
+    cache.get_or_load(('wb', 'Authors', ()), lambda: 'authors')
+    cache.invalidate('Main')
+    assert cache.stats()['entries'] == 1
+    assert cache.get_or_load(('wb', 'Main', ()), lambda: 'reloaded') == 'reloaded'
+    cache.invalidate()
+    assert cache.stats()['entries'] == 0
+
+
+class FakeBatchWorkbook:
+    id = 'fake'
+
+    def __init__(self, sheets):
+        self.sheets = sheets
+        self.requests = []
+
+    def values_batch_get(self, ranges, params=None):
+        self.requests.append(ranges)
+        return {'valueRanges': [{'range': r, 'values': self.sheets[r.strip("'")]} for r in ranges]}
+
+
+def test_load_many_single_request():
+    workbook = FakeBatchWorkbook({
+        'Main': [['Number', 'Title'], ['1', 'Book'], ['2']],
+        'Resources': [['Resource'], ['Meetup Page']],
+    })
+    frames = utils.load_many(workbook, {'Main': {'Number': pl.Int64, 'Title': str}, 'Resources': {'Resource': str}})
+    assert len(workbook.requests) == 1
+    assert frames['Main'].to_dicts() == [{'Number': 1, 'Title': 'Book'}, {'Number': 2, 'Title': None}]
+    assert frames['Resources']['Resource'].to_list() == ['Meetup Page']
+
+
+def test_load_many_cached_only_fetches_misses():
+    workbook = FakeBatchWorkbook({'Main': [['Number'], ['1']], 'Resources': [['Resource'], ['Meetup Page']]})
+    cache = utils.SheetCache(ttl=10)
+    utils.load_many_cached(workbook, {'Main': {'Number': pl.Int64}}, cache=cache)
+    utils.load_many_cached(workbook, {'Main': {'Number': pl.Int64}, 'Resources': {'Resource': str}}, cache=cache)
+    assert workbook.requests == [["'Main'"], ["'Resources'"]]
+    assert cache.stats()['hits'] == 1
+
+
+@pytest.mark.parametrize(
+        'args,kwargs,expected', 
+        [
+            (['6,123 members', 6000], dict(), 6123),
+            (['', 6000], dict(), 6000),
+            (['many members', 6000], dict(), 6000),
+        ]
+)
+def test_get_number_of_members(args, kwargs, expected):
+    assert utils.get_number_of_members(*args, **kwargs) == expected
+
+
+def test_result_or_default_on_timeout():
+    import threading
+    release = threading.Event()
+    future = utils.IO_POOL.submit(release.wait)
+    assert utils.result_or_default(future, 0.01, lambda: 'fallback') == 'fallback'
+    release.set()
+
+
+def test_find_element_text_stops_early():
+    html = b'<html><body><a id="member-count-link">6,123 <span>members</span></a><p>' + b'x' * 10000 + b'</p></body></html>'
+    consumed = []
+
+    def chunks():
+        for start in range(0, len(html), 16):
+            consumed.append(start)
+            yield html[start:start + 16]
+
+    assert utils.find_element_text(chunks(), 'member-count-link') == '6,123 members'
+    assert len(consumed) < 10
+    assert utils.find_element_text(iter([html]), 'missing') == ''
+
+
+def test_frame_from_values_ragged_rows():
+    data = [['Number', 'Title', 'Score'], ['1', 'Book', '4.5'], ['2', ''], ['3']]
+    frame = utils.frame_from_values(data, {'Number': pl.Int64, 'Title': str, 'Score': pl.Float64})
+    assert frame.to_dicts() == [
+        {'Number': 1, 'Title': 'Book', 'Score': 4.5},
+        {'Number': 2, 'Title': None, 'Score': None},
+        {'Number': 3, 'Title': None, 'Score': None},
+    ]
+
+
+def test_frame_from_values_reports_coercion_failures():
+    data = [['Number', 'Pages'], ['1', '1,024'], ['2', '300']]
+    schema = {'Number': pl.Int64, 'Pages': pl.Int64}
+    with pytest.warns(utils.CoercionWarning, match="'Pages'"):
+        frame = utils.frame_from_values(data, schema)
+    assert frame['Pages'].to_list() == [None, 300]
+    with pytest.raises(utils.CoercionError):
+        utils.frame_from_values(data, schema, on_error='raise')
+
+
+def test_frame_from_values_checks_constraints():
+    data = [['Year', 'Month', 'Debut?'], ['2023', 'March', 'Yes'], ['1066', 'Marchh', 'No']]
+    schema = {'Year': schemas.Constrained(pl.Int16, schemas.between(1900, 2100), 'between 1900 and 2100'),
+              'Month': schemas.MONTH, 'Debut?': schemas.YES_NO}
+    with pytest.warns(utils.CoercionWarning, match="'Year' \\(1 not Int16 between 1900 and 2100, e.g. \\['1066'\\]\\)"):
+        frame = utils.frame_from_values(data, schema)
+    assert frame.schema == pl.Schema({'Year': pl.Int16, 'Month': schemas.MONTH, 'Debut?': schemas.YES_NO})
+    assert frame.to_dicts() == [
+        {'Year': 2023, 'Month': 'March', 'Debut?': 'Yes'},
+        {'Year': None, 'Month': None, 'Debut?': 'No'},
+    ]
+
+
+def test_frame_from_values_empty_uses_schema_types():
+    frame = utils.frame_from_values([], schemas.get_main_schema())
+    assert frame.schema['Publisher'] == pl.Categorical
+    assert frame.schema['ISBN'] == pl.String
+
+
+@pytest.mark.parametrize(
+        'x,y,expected',
+        [
+            ([1.0, 2.0, 3.0], [2.0, 4.0, 6.0], (3, 2.0, 0.0, 1.0)),
+            ([1.0, 2.0, 3.0], [3.0, 2.0, 1.0], (3, -1.0, 4.0, -1.0)),
+            ([1.0, 2.0], [5.0, 5.0], (2, 0.0, 5.0, None)),
+            ([1.0], [1.0], (1, None, None, None)),
+            ([1.0, 1.0], [1.0, 2.0], (2, None, None, None)),
+        ]
+)
+def test_fit_line(x, y, expected):
+    fit = utils.fit_line(pl.DataFrame({'x': x, 'y': y}), 'x', 'y')
+    assert tuple(fit) == pytest.approx(expected)
+
+
+def test_sheet_cache_memory_limit():
+    frame = pl.DataFrame({'a': range(1000)})
+    cache = utils.SheetCache(ttl=10, max_bytes=int(frame.estimated_size() * 2.5))
+    for name in ('Main', 'Authors', 'Resources'):
+        cache.get_or_load(('wb', name, ()), lambda: frame)
+    assert cache.stats()['entries'] == 2
+    cache.get_or_load(('wb', 'Big', ()), lambda: pl.DataFrame({'a': range(10000)}))
+    assert cache.stats()['entries'] == 2
+    assert cache.stats()['bytes'] <= cache.stats()['max_bytes']